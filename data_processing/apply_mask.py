@@ -17,7 +17,7 @@ __version__= '$Revision$'
 
 ### Import required modules ###
 
-import sys
+import sys, os
 from optparse import OptionParser
 from datetime import datetime
 
@@ -30,11 +30,26 @@ from cdms2 import MV2
 
 import numpy
 
-import regrid2
-from regrid2 import Regridder
-
 import netCDF4
 
+
+# Import my modules #
+
+cwd = os.getcwd()
+repo_dir = '/'
+for directory in cwd.split('/')[1:]:
+    repo_dir = os.path.join(repo_dir, directory)
+    if directory == 'phd':
+        break
+
+modules_dir = os.path.join(repo_dir, 'modules')
+sys.path.append(modules_dir)
+
+try:
+    import netcdf_io as nio
+except ImportError:
+    raise ImportError('Must run this script from anywhere within the phd git repo')
+
                                              
 ### Define the relevant functions ###
 
@@ -127,6 +142,9 @@ def main(mask_file, mask_var, mask_type, input_file, output_file, hide, threshol
     ## Check that mask and input data are on same grid ##
     
     grid_match = grid_check(mask_lat, mask_lon, in_lat, in_lon)
+    if not grid_match:
+        in_lat = mask_lat
+        in_lon = mask_lon
     
     
     ## Create the output file ##
@@ -181,9 +199,7 @@ def main(mask_file, mask_var, mask_type, input_file, output_file, hide, threshol
 	in_data = fin(v,order=order)
 
 	if grid_match == False:
-	    oldgrid=in_data.getGrid()                                               
-            regridfunc=Regridder(oldgrid, mask_grid)                                
-            in_data=regridfunc(in_data)
+	    in_data = nio.regrid_uniform(in_data, mask_grid)
 	
         in_data=numpy.squeeze(in_data)	
 	mask = numpy.resize(mask,numpy.shape(in_data))
@@ -13,10 +13,9 @@ Output:       Text file
 import sys, os
 import argparse
 import numpy
-from cdo import *
-cdo = Cdo()
 import pdb
-import cdms2, cdutil
+
+import cdms2
 
 # Import my modules #
 
@@ -32,93 +31,143 @@ sys.path.append(modules_dir)
 
 try:
     import netcdf_io as nio
+    import convenient_universal as uconv
 except ImportError:
     raise ImportError('Must run this script from anywhere within the phd git repo')
 
 
 
-def calc_monthly_climatology(base_timeseries, months):
+def calc_monthly_climatology(base_timeseries, base_months):
     """Calcuate the monthly climatology.
     
-    The base_timeseries must have a monthly
-    timescale that begins in January.
+    The base_timeseries must have a monthly timescale
+    (but can begin in any month).
     
     """
 
-    assert (months[0] == 1), 'the base period must start in January'
-
-    ntime_base = len(base_timeseries)
-    monthly_climatology_mean = numpy.ma.zeros(12)
-    monthly_climatology_std = numpy.ma.zeros(12)
-    for i in range(0, 12):
-        monthly_climatology_mean[i] = numpy.ma.mean(base_timeseries[i:ntime_base:12])
-	monthly_climatology_std[i] = numpy.ma.std(base_timeseries[i:ntime_base:12])
+    groups = uconv.get_time_groups(base_months)
+    monthly_climatology_mean, monthly_climatology_std = uconv.calc_group_climatology(base_timeseries, groups, 12)
 
     return monthly_climatology_mean, monthly_climatology_std
 
 
-def calc_monthly_anomaly(complete_timeseries, base_timeseries, months):
-    """Calculate monthly anomaly.""" 
-    
-    monthly_climatology_mean = calc_monthly_climatology(base_timeseries, months)[0]
-    
-    ntime_complete = len(complete_timeseries)
-    monthly_anomaly = numpy.ma.zeros(ntime_complete)
-    for i in range(0, ntime_complete):
-	month_index = months[i]
-	monthly_anomaly[i] = numpy.ma.subtract(complete_timeseries[i], 
-	                                       monthly_climatology_mean[month_index-1])
-    
-    return monthly_anomaly 
+def get_monthly_climatology(name, indata, timeseries, base_period):
+    """Return the base period monthly climatology (mean, std) of 
+    a timeseries calculated from indata.
 
+    Each climatology is only calculated once (and is recorded by
+    name, so that it can be stored in the output file). In append 
+    mode the stored climatologies are used instead (see 
+    read_climatologies), because the new data do not include 
+    the base period.
 
-def monthly_normalisation(complete_timeseries, base_timeseries, months):
-    """Normalise the monthly timeseries: (x - mean) / stdev."""  
-    
-    # Calculate the monthly climatology #
-    
-    monthly_climatology_mean, monthly_climatology_std = calc_monthly_climatology(base_timeseries, months)
+    """
 
-    # Normalise the entire timeseries #
-    
-    ntime_complete = len(complete_timeseries)
-    monthly_normalised = numpy.ma.zeros(ntime_complete)
-    for i in range(0, ntime_complete):
-	month_index = months[i]
-	monthly_normalised[i] = numpy.ma.divide((numpy.ma.subtract(complete_timeseries[i], 
-	                        monthly_climatology_mean[month_index-1])), monthly_climatology_std[month_index-1])
-    
-    return monthly_normalised
+    key = (indata.fname, indata.id, tuple(base_period), name)
+    if not _climatologies.has_key(key):
+        base_indexes = get_base_indexes(indata, base_period)
+        assert len(base_indexes) > 0, \
+        'No data in the base period for %s (append mode requires the climatology stored in the output file)' %(name)
+        months = numpy.array(indata.months())
+        _climatologies[key] = calc_monthly_climatology(timeseries[base_indexes], months[base_indexes])
 
+    return _climatologies[key]
 
-def calc_reg_anomaly_timeseries(data_complete, data_base):
-    """Calculate the monthly anomaly timeseries for a given region.
 
-    Input arguments must be netcdf_io.InputData instances.
+_climatologies = {}
+
+
+def climatology_atts(ifile, var_id, base_period):
+    """Return the output variable attributes that store the 
+    base period climatologies (see read_climatologies).
+
+    Each output variable carries all the climatologies calculated 
+    from the input file, so that any variable can be appended to.
+
+    """
+
+    atts = {'climatology_base_period': '%s %s' %tuple(base_period)}
+    for key, (mean, std) in _climatologies.iteritems():
+        if key[0:3] == (ifile, var_id, tuple(base_period)):
+            atts['climatology_%s_mean' %(key[3])] = numpy.ma.filled(mean, 1.0e20)
+            atts['climatology_%s_std' %(key[3])] = numpy.ma.filled(std, 1.0e20)
+
+    return atts
+
+
+def read_climatologies(outfile, ifile, var_id, base_period):
+    """Read the base period climatologies stored in an
+    existing output file (see climatology_atts)."""
+
+    infile = cdms2.open(outfile)
+    for var in infile.variables.values():
+        atts = var.attributes
+        if not atts.has_key('climatology_base_period'):
+            continue
+        assert atts['climatology_base_period'] == '%s %s' %tuple(base_period), \
+        'The base period of %s (%s) differs from --base' %(outfile, atts['climatology_base_period'])
+
+        for att_name in atts.keys():
+            if att_name[0:12] == 'climatology_' and att_name[-5:] == '_mean':
+                name = att_name[12:-5]
+                mean = numpy.ma.masked_values(atts[att_name], 1.0e20)
+                std = numpy.ma.masked_values(atts['climatology_%s_std' %(name)], 1.0e20)
+                _climatologies[(ifile, var_id, tuple(base_period), name)] = (mean, std)
+    infile.close()
+
+
+def read_input(ifile, var_id, **kwargs):
+    """Read the input data.
+
+    Each file/variable/subset combination is only read once, 
+    so that it can be shared between indices.
 
     """
 
-    assert isinstance(data_complete, nio.InputData), \
-    'input arguments must be nio.InputData instances'
+    key = (ifile, var_id, tuple(sorted(kwargs.items())))
+    if not _input_data.has_key(key):
+        _input_data[key] = nio.InputData(ifile, var_id, **kwargs)
+
+    return _input_data[key]
+
 
-    assert isinstance(data_base, nio.InputData), \
-    'input arguments must be nio.InputData instances'
+_input_data = {}
 
-    ntime_complete, nlats, nlons = numpy.shape(data_complete.data)
-    ntime_base, nlats, nlons = numpy.shape(data_base.data)
 
-    data_complete_flat = numpy.ma.reshape(data_complete.data, (int(ntime_complete), int(nlats * nlons)))    # Flattens the spatial dimension
-    data_base_flat = numpy.ma.reshape(data_base.data, (int(ntime_base), int(nlats * nlons)))
+def get_base_indexes(indata, base_period):
+    """Return the indexes of the time steps within the base 
+    period (start and end date inclusive)."""
 
-    # Calculate the anomalies #
+    times = indata.decoded_time()
+    dates = times['year'] * 10000 + times['month'] * 100 + times['day']
+    start, end = [year * 10000 + month * 100 + day for year, month, day in map(nio.split_dt, base_period)]
 
-    complete_timeseries = numpy.ma.mean(data_complete_flat, axis=1)
-    base_timeseries = numpy.ma.mean(data_base_flat, axis=1)
+    return numpy.where((dates >= start) & (dates <= end))[0]
 
-    anomaly_timeseries = calc_monthly_anomaly(complete_timeseries, 
-                         base_timeseries, data_complete.months())
 
-    return anomaly_timeseries
+def calc_reg_anomaly_timeseries(ifile, var_id, region, base_period, time_period=None):
+    """Calculate the monthly anomaly timeseries for a given region.
+
+    The anomaly timeseries (and the base period climatology it 
+    depends on) is only calculated once for each region, so that
+    it can be shared between indices (e.g. NINO3 and NINOCT).
+
+    """
+
+    key = (ifile, var_id, region, tuple(base_period), time_period)
+    if not _anomaly_timeseries.has_key(key):
+        indata = read_input(ifile, var_id, region=region, time=time_period)
+        ntime = indata.data.shape[0]
+        complete_timeseries = numpy.ma.mean(numpy.ma.reshape(indata.data, (ntime, -1)), axis=1)    # Flattens the spatial dimension
+        
+        monthly_climatology_mean = get_monthly_climatology(region, indata, complete_timeseries, base_period)[0]
+        _anomaly_timeseries[key] = uconv.calc_group_anomaly(complete_timeseries, uconv.get_time_groups(indata.months()),
+                                                            monthly_climatology_mean)
+
+    return _anomaly_timeseries[key]
+
+
+_anomaly_timeseries = {}
     
 
 def map_std(stds, data, timescale):
@@ -140,14 +189,39 @@ def map_std(stds, data, timescale):
    return result
 
 
-def calc_zw3(index, ifile, var_id, base_period):
+def climatology_normalisation(data, decoded_time, timescale):
+    """Normalise data (with time as the first axis) by the daily or 
+    monthly climatology: (x - mean) / stdev.
+
+    Equivalent to the cdo operators ydaydiv/ydaysub/ydayavg/ydaystd 
+    (daily data) or ymondiv/ymonsub/ymonavg/ymonstd (monthly data).
+    The daily climatology is relative to a 366 day year.
+
+    """
+
+    assert timescale in ['daily', 'monthly']
+
+    if timescale == 'daily':
+        groups = uconv.get_time_groups(decoded_time['month'], days=decoded_time['day'])
+        ngroups = 366
+    else:
+        groups = uconv.get_time_groups(decoded_time['month'])
+        ngroups = 12
+
+    climatology_mean, climatology_std = uconv.calc_group_climatology(data, groups, ngroups)
+
+    return uconv.calc_group_anomaly(data, groups, climatology_mean, climatology_std)
+
+
+def calc_zw3(index, ifile, var_id, base_period, time_period=None):
     """Calculate an index of the SH ZW3 pattern
     
     Method as per Raphael (2004)
     
-    This function uses cdo instead of CDAT because the
-    cdutil library doesn't have routines for calculating 
-    the daily climatology or stdev.
+    The daily (or monthly) climatology and standard deviation
+    are calculated in memory, using the same approach as the
+    cdo ydayavg/ydaystd operators (cdutil doesn't have routines
+    for calculating the daily climatology or stdev).
     
     The running mean (and zonal mean too - see below) should 
     have been applied to the input data beforehand. Raphael 
@@ -158,41 +232,40 @@ def calc_zw3(index, ifile, var_id, base_period):
     from 500hPa zonal anomalies which are constructed by 
     removing the zonal mean of the geopotential height from
     each grid point (preferred). 
+
+    The climatology is calculated over the entire record (not 
+    the base period), so the index can't be appended to.
     
     """
 
-    # Determine the timescale
+    assert not time_period, 'The ZW3 index must be calculated from the entire record'
 
-    indata_complete = nio.InputData(ifile, var_id, region='small') 
-    time_axis = indata_complete.data.getTime().asComponentTime()
-    timescale = nio.get_timescale(nio.get_datetime(time_axis[0:2]))
-        
+    # Read the data (the latitude band common to all three regions)
+
+    regions = ['zw31', 'zw32', 'zw33']
+    south_lat = min([nio.regions[region][0][0] for region in regions])
+    north_lat = max([nio.regions[region][0][1] for region in regions])
+
+    indata_complete = read_input(ifile, var_id, latitude=(south_lat, north_lat)) 
+    timescale = nio.get_timescale(indata_complete.datetime_axis()[0:2])
     assert timescale in ['daily', 'monthly']
-    tscale_abbrev = 'day' if timescale == 'daily' else 'mon' 
+
+    data = indata_complete.data
+    lats = data.getLatitude()[:]
+    lons = data.getLongitude()[:]
 
     # Calculate the index
 
     index = {}
-    for region in ['zw31', 'zw32', 'zw33']: 
+    for region in regions: 
         south_lat, north_lat = nio.regions[region][0][0: 2]
         west_lon, east_lon = nio.regions[region][1][0: 2]
-	
-	div_operator_text = 'cdo y%sdiv ' %(tscale_abbrev)
-	div_operator_func = eval(div_operator_text.replace(' ', '.', 1))
-	sub_operator_text = ' -y%ssub ' %(tscale_abbrev)
-	avg_operator_text = ' -y%savg ' %(tscale_abbrev)
-	std_operator_text = ' -y%sstd ' %(tscale_abbrev)
-	
-	selregion = "-sellonlatbox,%d,%d,%d,%d %s " %(west_lon, east_lon, 
-	                                              south_lat, north_lat, 
-						      ifile)
-        fldmean = "-fldmean "+selregion
-        anomaly = sub_operator_text + fldmean + avg_operator_text + fldmean
-        std = std_operator_text + fldmean
-	
-	print div_operator_text + anomaly + std   #e.g. cdo ydaydiv anomaly std
-        result = div_operator_func(input=anomaly + std, returnArray=var_id)
-	index[region] = numpy.squeeze(result)
+
+        region_data, region_lats, region_lons = uconv.select_lonlat_box(data, lats, lons, 
+                                                                        south_lat, north_lat, 
+                                                                        west_lon, east_lon)
+        fldmean = uconv.calc_field_mean(region_data, region_lats)
+        index[region] = climatology_normalisation(fldmean, indata_complete.decoded_time(), timescale)
 
     zw3_timeseries = (index['zw31'] + index['zw32'] + index['zw33']) / 3.0
  
@@ -208,60 +281,50 @@ def calc_zw3(index, ifile, var_id, base_period):
     return zw3_timeseries, var_atts, indata_complete.global_atts, indata_complete.data.getTime()
 
 
-def calc_mex(index, ifile, var_id, base_period):
+def calc_mex(index, ifile, var_id, base_period, time_period=None):
     """Calculate the mid-latitude extreme index (MEX)
     
     Method similar to Coumou (2014). Differences include:
       - They detrend their data first 
     
-    This function uses cdo instead of CDAT because the
-    cdutil library doesn't have routines for calculating 
-    the daily climatology or stdev.
+    The daily (or monthly) climatology and standard deviation
+    are calculated in memory, using the same approach as the
+    cdo ydayavg/ydaystd operators (cdutil doesn't have routines
+    for calculating the daily climatology or stdev).
     
     Any running mean should have been applied to the 
     input data beforehand. 
 
     Possible improvements:
       - A weighted mean?
+
+    The normalisation is relative to the entire record (not 
+    the base period), so the index can't be appended to.
         
     """
 
+    assert not time_period, 'The MEX index must be calculated from the entire record'
+
     west_lon = 0
     east_lon = 360
     south_lat = -75
     north_lat = -40
 
-    # Determine the timescale
+    # Read the data and determine the timescale
 
-    indata_complete = nio.InputData(ifile, var_id, latitude=(south_lat, north_lat)) 
-    time_axis = indata_complete.data.getTime().asComponentTime()
-    timescale = nio.get_timescale(nio.get_datetime(time_axis[0:2]))
-        
+    indata_complete = read_input(ifile, var_id, latitude=(south_lat, north_lat)) 
+    timescale = nio.get_timescale(indata_complete.datetime_axis()[0:2])
     assert timescale in ['daily', 'monthly']
-    tscale_abbrev = 'day' if timescale == 'daily' else 'mon' 
 
     # Calculate the index
-	
-    div_operator_text = 'cdo y%sdiv ' %(tscale_abbrev)
-    div_operator_func = eval(div_operator_text.replace(' ', '.', 1))
-    sub_operator_text = ' -y%ssub ' %(tscale_abbrev)
-    avg_operator_text = ' -y%savg ' %(tscale_abbrev)
-    std_operator_text = ' -y%sstd ' %(tscale_abbrev)
-
-    selregion = "-sellonlatbox,%d,%d,%d,%d %s " %(west_lon, east_lon, 
-	                                          south_lat, north_lat, 
-						  ifile)
 
-    anomaly = sub_operator_text + selregion + avg_operator_text + selregion
-    std = std_operator_text + selregion
+    data = indata_complete.data
+    region_data, region_lats, region_lons = uconv.select_lonlat_box(data, data.getLatitude()[:], data.getLongitude()[:], 
+                                                                    south_lat, north_lat, 
+                                                                    west_lon, east_lon)
 
-    print div_operator_text + anomaly + std   #e.g. cdo ydaydiv anomaly std
-    cdo_result = div_operator_func(input=anomaly + std, returnArray=var_id)
-    square_term = numpy.square(cdo_result)
-    square_term = cdms2.createVariable(square_term, grid=indata_complete.data.getGrid(), axes=indata_complete.data.getAxisList())
-
-    ave_axes = square_term.getOrder().translate(None, 't')  #all but the time axis
-    mex_timeseries_raw = cdutil.averager(square_term, axis=ave_axes, weights=['weighted']*len(ave_axes))
+    normalised_data = climatology_normalisation(region_data, indata_complete.decoded_time(), timescale)
+    mex_timeseries_raw = uconv.calc_field_mean(numpy.ma.power(normalised_data, 2), region_lats)
     
     mex_avg = numpy.mean(mex_timeseries_raw)
     mex_std = numpy.std(mex_timeseries_raw)
@@ -280,7 +343,7 @@ def calc_mex(index, ifile, var_id, base_period):
     return mex_timeseries_normalised, var_atts, indata_complete.global_atts, indata_complete.data.getTime()
 
     
-def calc_sam(index, ifile, var_id, base_period):
+def calc_sam(index, ifile, var_id, base_period, time_period=None):
     """Calculate an index of the Southern Annular Mode.
 
     Method as per Marshall (2003) and Gong & Wang (1999).    
@@ -289,8 +352,8 @@ def calc_sam(index, ifile, var_id, base_period):
     
     # Read data, extract the required latitudes, calculate zonal mean anomalies #
              
-    indata_complete = nio.InputData(ifile, var_id) 
-    indata_base = nio.InputData(ifile, var_id, time=base_period)    
+    indata_complete = read_input(ifile, var_id, time=time_period) 
+    groups = uconv.get_time_groups(indata_complete.months())
     
     latitude = indata_complete.data.getLatitude()
     lats = [-40, -65]
@@ -301,9 +364,11 @@ def calc_sam(index, ifile, var_id, base_period):
 	print 'File latitude for', lat, '=', value
 
 	complete_timeseries = numpy.ma.mean(indata_complete.data[:, index, :], axis=1)
-	base_timeseries = numpy.ma.mean(indata_base.data[:, index, :], axis=1)
 
-        monthly_normalised_timeseries[lat] = monthly_normalisation(complete_timeseries, base_timeseries, indata_complete.months())
+        monthly_climatology_mean, monthly_climatology_std = get_monthly_climatology('sam%iS' %(abs(lat)), indata_complete, 
+                                                                                    complete_timeseries, base_period)
+        monthly_normalised_timeseries[lat] = uconv.calc_group_anomaly(complete_timeseries, groups, 
+                                                                      monthly_climatology_mean, monthly_climatology_std)
 
     sami_timeseries = numpy.ma.subtract(monthly_normalised_timeseries[-40], monthly_normalised_timeseries[-65])
 
@@ -320,7 +385,7 @@ def calc_sam(index, ifile, var_id, base_period):
     return sami_timeseries, var_atts, indata_complete.global_atts, indata_complete.data.getTime()
     
 
-def calc_iemi(index, ifile, var_id, base_period):
+def calc_iemi(index, ifile, var_id, base_period, time_period=None):
     """Calculate the Improved ENSO Modoki Index of Li et al (2010)."""
     
     # Calculate the index #
@@ -328,9 +393,8 @@ def calc_iemi(index, ifile, var_id, base_period):
     regions = ['emia', 'emib', 'emic']
     anomaly_timeseries = {}
     for reg in regions: 
-	indata_complete = nio.InputData(ifile, var_id, region=reg)
-        indata_base = nio.InputData(ifile, var_id, region=reg, time=base_period) 
-        anomaly_timeseries[reg] = calc_reg_anomaly_timeseries(indata_complete, indata_base)
+        anomaly_timeseries[reg] = calc_reg_anomaly_timeseries(ifile, var_id, reg, base_period, time_period=time_period)
+    indata_complete = read_input(ifile, var_id, region=regions[-1], time=time_period)
     
     iemi_timeseries = numpy.ma.subtract(numpy.ma.subtract(numpy.ma.multiply(anomaly_timeseries['emia'], 3.0),
                       numpy.ma.multiply(anomaly_timeseries['emib'],2.0)), anomaly_timeseries['emic'])
@@ -348,17 +412,17 @@ def calc_iemi(index, ifile, var_id, base_period):
     return iemi_timeseries, var_atts, indata_complete.global_atts, indata_complete.data.getTime()
  
 
-def calc_nino(index, ifile, var_id, base_period):
+def calc_nino(index, ifile, var_id, base_period, time_period=None):
     """Calculate a NINO SST index."""
     
     # Read the input data #
     
-    indata_complete = nio.InputData(ifile, var_id, region='nino'+index[4:])
-    indata_base = nio.InputData(ifile, var_id, region='nino'+index[4:], time=base_period)  
+    region = 'nino'+index[4:]
+    indata_complete = read_input(ifile, var_id, region=region, time=time_period)
     
     # Calculate the NINO index #
     
-    nino_timeseries = calc_reg_anomaly_timeseries(indata_complete, indata_base)
+    nino_timeseries = calc_reg_anomaly_timeseries(ifile, var_id, region, base_period, time_period=time_period)
     
     # Determine the attributes #
 
@@ -377,7 +441,7 @@ def calc_nino(index, ifile, var_id, base_period):
     return nino_timeseries, var_atts, indata_complete.global_atts, indata_complete.data.getTime()
     
 
-def calc_nino_new(index, ifile, var_id, base_period):
+def calc_nino_new(index, ifile, var_id, base_period, time_period=None):
     """Calculate a new Nino index of Ren & Jin (2011)"""
     
     # Calculate the traditional NINO3 and NINO4 indices #
@@ -385,24 +449,18 @@ def calc_nino_new(index, ifile, var_id, base_period):
     regions = ['NINO3','NINO4']
     anomaly_timeseries = {}
     for reg in regions: 
-        anomaly_timeseries[reg], temp, indata_complete = calc_nino(reg, ifile, var_id, base_period)       
+        anomaly_timeseries[reg], temp, global_atts, time_axis = calc_nino(reg, ifile, var_id, base_period, time_period=time_period)       
 
     # Calculate the new Ren & Jin index #
 
-    ntime = len(anomaly_timeseries['NINO3'])
-    
-    nino_new_timeseries = numpy.ma.zeros(ntime)
-    for i in range(0, ntime):
-        nino3_val = anomaly_timeseries['NINO3'][i]
-	nino4_val = anomaly_timeseries['NINO4'][i]
-        product = nino3_val * nino4_val
+    nino3_vals = anomaly_timeseries['NINO3']
+    nino4_vals = anomaly_timeseries['NINO4']
+    alpha = numpy.where(nino3_vals * nino4_vals > 0, 0.4, 0.0)
 	
-	alpha = 0.4 if product > 0 else 0.0
-	
-	if index == 'NINOCT':
-	    nino_new_timeseries[i] = numpy.ma.subtract(nino3_val, (numpy.ma.multiply(nino4_val, alpha)))
-	elif index == 'NINOWP':
-	    nino_new_timeseries[i] = numpy.ma.subtract(nino4_val, (numpy.ma.multiply(nino3_val, alpha)))
+    if index == 'NINOCT':
+        nino_new_timeseries = numpy.ma.subtract(nino3_vals, numpy.ma.multiply(nino4_vals, alpha))
+    elif index == 'NINOWP':
+        nino_new_timeseries = numpy.ma.subtract(nino4_vals, numpy.ma.multiply(nino3_vals, alpha))
     
     # Determine the attributes #   
 
@@ -412,20 +470,18 @@ def calc_nino_new(index, ifile, var_id, base_period):
     long_name['NINOCT'] = 'nino_cold_tongue_index'
     long_name['NINOWP'] = 'nino_warm_pool_index'    
 
-    attributes = {'id': 'nino'+index[4:],
-                  'long_name': long_name[index],
-                  'standard_name': long_name[index],
-                  'units': 'Celsius',
-                  'notes': hx}
+    var_atts = {'id': 'nino'+index[4:],
+                'long_name': long_name[index],
+                'standard_name': long_name[index],
+                'units': 'Celsius',
+                'notes': hx}
 
-    return nino_new_timeseries, var_atts, indata_complete.global_atts, indata_complete.data.getTime()
+    return nino_new_timeseries, var_atts, global_atts, time_axis
 
 
-def main(inargs):
-    """Run the program."""
-        
-    # Initialise relevant index function #
-    
+def get_index_function(index):
+    """Return the function for calculating a given index."""
+
     function_for_index = {'NINO': calc_nino,
                           'NINO_new': calc_nino_new,
                           'IEMI': calc_iemi,
@@ -433,32 +489,66 @@ def main(inargs):
 			  'ZW3': calc_zw3,
                           'MEX': calc_mex}   
     
-    if inargs.index[0:4] == 'NINO':
-        if inargs.index == 'NINOCT' or inargs.index == 'NINOWP':
+    if index[0:4] == 'NINO':
+        if index == 'NINOCT' or index == 'NINOWP':
 	    calc_index = function_for_index['NINO_new']
 	else:
 	    calc_index = function_for_index['NINO']
     else:
-        calc_index = function_for_index[inargs.index]
+        calc_index = function_for_index[index]
 
-    # Calculate the index #  
+    return calc_index
 
-    index_data, var_atts, global_atts, time_axis = calc_index(inargs.index, 
-                                                              inargs.infile, 
-                                                              inargs.variable, 
-                                                              inargs.base)
+
+def main(inargs):
+    """Run the program."""
+
+    # Find the new time steps (append mode) #
+
+    time_period = None
+    append = inargs.append and os.path.isfile(inargs.outfile)
+    if append:
+        time_period = nio.new_time_period(inargs.infile, inargs.variable, inargs.outfile)
+        if not time_period:
+            print 'The output file is up to date'
+            return
+        print 'Appending:', time_period[0], 'to', time_period[1]
+        read_climatologies(inargs.outfile, inargs.infile, inargs.variable, inargs.base)
+        
+    # Calculate the indices #  
+
+    outdata_list = []
+    outvar_atts_list = []
+    outvar_axes_list = []
+
+    for index in inargs.index:
+        calc_index = get_index_function(index)
+        index_data, var_atts, global_atts, time_axis = calc_index(index, 
+                                                                  inargs.infile, 
+                                                                  inargs.variable, 
+                                                                  inargs.base,
+                                                                  time_period=time_period)
+        outdata_list.append(index_data)
+        outvar_atts_list.append(var_atts)
+        outvar_axes_list.append((time_axis,))
     
     # Write the outfile #
- 
-    outdata_list = [index_data,]
-    outvar_atts_list = [var_atts,]
-    outvar_axes_list = [(time_axis,),]
 
-    nio.write_netcdf(inargs.outfile, " ".join(sys.argv), 
-                     global_atts,  
-                     outdata_list,
-                     outvar_atts_list, 
-                     outvar_axes_list)
+    if append:
+        nio.append_netcdf(inargs.outfile, outdata_list, 
+                          [var_atts['id'] for var_atts in outvar_atts_list],
+                          outvar_axes_list,
+                          extra_history=" ".join(sys.argv))
+    else:
+        for var_atts in outvar_atts_list:
+            var_atts.update(climatology_atts(inargs.infile, inargs.variable, inargs.base))
+
+        nio.write_netcdf(inargs.outfile, " ".join(sys.argv), 
+                         global_atts,  
+                         outdata_list,
+                         outvar_atts_list, 
+                         outvar_axes_list,
+                         unlimited_time=True)
 
 
 
@@ -471,6 +561,19 @@ example:
   /usr/local/uvcdat/1.2.0rc1/bin/cdat calc_climate_index.py NINO34 
   /work/dbirving/datasets/Merra/data/processed/ts_Merra_surface_monthly_native-ocean.nc ts 
   /work/dbirving/processed/indices/data/ts_Merra_surface_NINO34_monthly_native-ocean.nc
+
+  Multiple indices can be calculated from the same input file, in which case 
+  they are all written to the one output file (and each region is only read once):
+  /usr/local/uvcdat/1.2.0rc1/bin/cdat calc_climate_index.py NINO3 NINO4 NINOCT IEMI 
+  /work/dbirving/datasets/Merra/data/processed/ts_Merra_surface_monthly_native-ocean.nc ts 
+  /work/dbirving/processed/indices/data/ts_Merra_surface_nino-indices_monthly_native-ocean.nc
+
+  When new input data become available, the existing output file can be
+  extended in place (only the new time steps are read, and the base period 
+  climatology stored in the output file is reused):
+  /usr/local/uvcdat/1.2.0rc1/bin/cdat calc_climate_index.py NINO3 NINO4 NINOCT IEMI 
+  /work/dbirving/datasets/Merra/data/processed/ts_Merra_surface_monthly_native-ocean.nc ts 
+  /work/dbirving/processed/indices/data/ts_Merra_surface_nino-indices_monthly_native-ocean.nc --append
 	    
 author:
   Damien Irving, d.irving@student.unimelb.edu.au
@@ -496,7 +599,7 @@ planned enhancements:
                                      argument_default=argparse.SUPPRESS,
                                      formatter_class=argparse.RawDescriptionHelpFormatter)
     
-    parser.add_argument("index", type=str, help="Index to calculate",
+    parser.add_argument("index", type=str, nargs='+', help="Index (or indices) to calculate",
                         choices=['NINO12', 'NINO3', 'NINO4', 'NINO34', 'NINOCT', 'NINOWP', 'IEMI', 'SAM', 'ZW3', 'MEX'])
     parser.add_argument("infile", type=str, help="Input file name")
     parser.add_argument("variable", type=str, help="Input file variable")
@@ -504,6 +607,8 @@ planned enhancements:
     
     parser.add_argument("--base", nargs=2, type=str, default=('1981-01-01', '2010-12-31'), metavar=('START_DATE', 'END_DATE'), 
                         help="Start and end date for base period [default: %(default)s]")
+    parser.add_argument("--append", action="store_true", default=False,
+                        help="Append the new time steps to an existing output file (not available for ZW3 or MEX)")
   
     args = parser.parse_args()
                 
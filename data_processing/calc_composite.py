@@ -54,34 +54,49 @@ def date_offset(date_list, offset):
     return edited_date_list
 
 
-def filter_dates(data, date_file, offset):
-    """Filter the data into a subset that only includes dates in date_file. An
-    offset can be applied to the dates in date_file"""
+def count_dates(date_list):
+    """Count the number of times each (year, month, day) appears in date_list"""
 
-    if not date_file:
-        data_filtered = data
-        date_metadata = None
-        size_filtered = False
-        size_excluded = False
-    else:
-        date_list, date_metadata = gio.read_dates(date_file)
-        if offset:
-            date_list = date_offset(date_list, offset)
-    
-        matching_date_indexes = nio.match_dates(date_list, data.getTime().asComponentTime(), invert_matching=False, return_indexes=True)
+    date_counts = {}
+    for date in map(nio.split_dt, date_list):
+        date_counts[date] = date_counts.get(date, 0) + 1
+
+    return date_counts
+
+
+def event_weights(times, date_counts, matched_dates):
+    """Return the number of times each time step appears in the date list.
+
+    Consistent with nio.match_dates, only the first time step of each
+    day is matched. matched_dates is the set of days already matched 
+    (in previous time chunks) and is updated in place.
+
+    """
+
+    weights = numpy.zeros(len(times['year']))
+    for index, date in enumerate(zip(times['year'], times['month'], times['day'])):
+        date = tuple(map(int, date))
+        if date in date_counts and not date in matched_dates:
+            weights[index] = date_counts[date]
+            matched_dates.add(date)
 
-        data_filtered = nio.temporal_extract(data, matching_date_indexes, indexes=True, tvar_out=False)
+    return weights
 
-        size_filtered = len(matching_date_indexes)
 
-    return data_filtered, date_metadata, size_filtered
+def season_months(season):
+    """Return the months (1-12) in a season (None for annual)"""
 
+    if season == 'annual':
+        return None
 
-def get_composite(data, var, long_name, standard_name, units, season):
-    """Calculate the composite and it's attributes (using the desired var, long_name
-    units and season"""
+    selection = (season,) if season in nio.month_dict.keys() else nio.season_dict[season]
 
-    composite_mean = numpy.mean(data, axis=0)
+    return [nio.month_dict[month] for month in selection]
+
+
+def get_composite_atts(var, standard_name, units, season):
+    """Define the composite attributes (using the desired var, standard_name,
+    units and season)"""
 
     composite_atts = {'id': var+'_'+season,
                       'standard_name': standard_name+'_'+season,
@@ -89,53 +104,98 @@ def get_composite(data, var, long_name, standard_name, units, season):
                       'units': units,
                       'notes': 'Composite mean for %s season' %(season)}
 
-    return composite_mean, composite_atts
+    return composite_atts
+
+
+def accumulate(indata, seasons, date_counts=None):
+    """Accumulate the statistics for each season in a single pass through the data.
+
+    Returns a dictionary of (all data, event subset) uconv.RunningStats pairs 
+    (keyed by season), where the event subset is None if there is no date list.
+    The attributes and axes of the first time chunk are also returned.
+
+    """
+
+    running_stats = {}
+    for season in seasons:
+        running_stats[season] = (uconv.RunningStats(), uconv.RunningStats() if date_counts else None)
+
+    matched_dates = set()
+    first_chunk = None
+    for chunk in indata:
+        assert chunk.getOrder()[0] == 't', "First axis must be time"
+        if first_chunk is None:
+            first_chunk = chunk
+
+        times = nio.decode_time_axis(chunk.getTime())
+        data = numpy.ma.masked_array(chunk, dtype=numpy.float64)
+        if date_counts:
+            events = event_weights(times, date_counts, matched_dates)
+
+        for season in seasons:
+            months = season_months(season)
+            selection = numpy.in1d(times['month'], months) if months else numpy.ones(len(times['month']), dtype=bool)
+            
+            stats_all, stats_events = running_stats[season]
+            stats_all.update(data, selection)
+            if date_counts:
+                stats_events.update(data, selection * events)
+
+    assert first_chunk is not None, "No data in the selected time period"
+
+    return running_stats, first_chunk
 
 
 def main(inargs):
     """Run the program."""
     
-    # Initialise output #
-
-    outdata_list = []
-    outvar_atts_list = []
-    outvar_axes_list = []
+    # Prepare input data #
 
     if inargs.time:
         start_date, end_date = inargs.time
     else:
         start_date = end_date = 'none'
 
-    for season in inargs.seasons:
+    indata = nio.InputDataStream(inargs.infile, inargs.var, chunk_size=inargs.chunk_size,
+                                 time=(start_date, end_date), **nio.dict_filter(vars(inargs), ['region']))
 
-	# Prepate input data #
-        
-        selector = 'none' if season == 'annual' else season
-	indata = nio.InputData(inargs.infile, inargs.var, time=(start_date, end_date, selector),  **nio.dict_filter(vars(inargs), ['region']))
-        assert indata.data.getOrder()[0] == 't', "First axis must be time"
-
-	# Filter data #
+    if inargs.date_file:
+        date_list, date_metadata = gio.read_dates(inargs.date_file)
+        if inargs.offset:
+            date_list = date_offset(date_list, inargs.offset)
+        date_counts = count_dates(date_list)
+    else:
+        date_metadata = None
+        date_counts = None
 
-	data_filtered, date_metadata, size_filtered = filter_dates(indata.data, inargs.date_file, inargs.offset)
+    # Accumulate the data for all seasons (single pass) #
 
-	# Calculate composite # 
+    running_stats, first_chunk = accumulate(indata, inargs.seasons, date_counts)
+    out_axes = first_chunk.getAxisList()[1:]
 
-	composite, composite_atts = get_composite(data_filtered, inargs.var, 
-                                        	  indata.data.long_name, indata.data.standard_name, indata.data.units,
-                                        	  season)
-	outdata_list.append(composite)
-	outvar_atts_list.append(composite_atts)
-	outvar_axes_list.append(indata.data.getAxisList()[1:])
+    # Calculate composites and perform significance test #
 
-	# Perform significance test # 
+    outdata_list = []
+    outvar_atts_list = []
+    outvar_axes_list = []
 
-	if inargs.date_file:
-            pval, pval_atts = uconv.get_significance(data_filtered, indata.data, 
-	                                             'p_'+season, 'p_value_'+season, 
-						     size_filtered, indata.data.shape[0])
+    for season in inargs.seasons:
+        stats_all, stats_events = running_stats[season]
+        composite_stats = stats_events if date_counts else stats_all
+        
+        composite_atts = get_composite_atts(inargs.var, first_chunk.standard_name, first_chunk.units, season)
+        outdata_list.append(composite_stats.get_mean())
+        outvar_atts_list.append(composite_atts)
+        outvar_axes_list.append(out_axes)
+
+        if date_counts:
+            pval, pval_atts = uconv.get_significance_from_stats(stats_events, stats_all,
+                                                                'p_'+season, 'p_value_'+season, 
+                                                                stats_events.size, stats_all.size,
+                                                                equal_var=not inargs.welch)
             outdata_list.append(pval)
             outvar_atts_list.append(pval_atts)
-            outvar_axes_list.append(indata.data.getAxisList()[1:])	
+            outvar_axes_list.append(out_axes)	
 
 
     # Write the output file #
@@ -165,8 +225,10 @@ example (vortex.earthsci.unimelb.edu.au):
   --date_file /mnt/meteo0/data/simmonds/dbirving/ERAInterim/data/zw3/figures/composites/env_amp_median-date-list_zw3-w19-va-stats-extent75pct-filter90pct_ERAInterim_500hPa_030day-runmean_native-mermax.txt 
   --region small --time 1980-01-01 1982-01-01
 
-fixme:
-  The time selector is broken (it fails once it gets to SON)
+note:
+  The input file is only read once (in time chunks of length --chunk_size), 
+  with the composites (and significance tests) for all seasons calculated 
+  from the running sums accumulated along the way.
 
 author:
   Damien Irving, d.irving@student.unimelb.edu.au
@@ -195,6 +257,10 @@ author:
 
     parser.add_argument("--offset", type=int, default=None,
                         help="Number of days to offset the input dates by (from date_file) [default = None]")
+    parser.add_argument("--welch", action="store_true", default=False,
+                        help="Use Welch's t-test (i.e. don't assume equal variances) for the significance test [default: False]")
+    parser.add_argument("--chunk_size", type=int, default=1000,
+                        help="Number of time steps read from the input file at a time [default = 1000]")
 
     args = parser.parse_args()            
 
@@ -79,8 +79,40 @@ def hilbert_transform(inwave_hat, kmin, kmax):
     
 
 def envelope(inwave, kmin, kmax):
-    """Extract the wave envelope"""
+    """Extract the wave envelope along the last axis of inwave.
+
+    Uses the fast Fourier transform, so that an entire (time, lat, lon) 
+    block can be processed at once. The result is equivalent to applying 
+    fourier_transform and then hilbert_transform to each individual wave. 
+
+    """
     
+    inwave = numpy.asarray(inwave)
+    N = inwave.shape[-1]
+
+    if N % 2 != 0:
+        # Zimin et al (2003) wavenumbers are not integers for odd N
+        return numpy.apply_along_axis(envelope_dft, -1, inwave, kmin, kmax)
+
+    # Wavenumbers in numpy.fft order (the Nyquist frequency, -N/2 in numpy, 
+    # is +N/2 in the Zimin et al convention)
+    kk = numpy.fft.fftfreq(N) * N
+    kk[N / 2] = N / 2.0
+    ffilter = (kk >= kmin) & (kk <= kmax)
+
+    # The Zimin et al. phase convention (l = 1, ..., N) cancels out
+    # between the forward and inverse transforms
+    inwave_fft = numpy.fft.fft(inwave, axis=-1)
+    inwave_fft = inwave_fft * ffilter
+    envelope = 2.0 * numpy.fft.ifft(inwave_fft, axis=-1)
+
+    return numpy.abs(envelope)
+
+
+def envelope_dft(inwave, kmin, kmax):
+    """Extract the wave envelope of a single wave using the 
+    explicit transforms of Zimin et al (2003)"""
+
     inwave_hat = fourier_transform(inwave)
     envelope = hilbert_transform(inwave_hat, kmin, kmax)
     
@@ -124,7 +156,7 @@ def main(inargs):
     # Extract the wave envelope #
     
     kmin, kmax = inargs.wavenumbers
-    outdata = numpy.apply_along_axis(envelope, 2, data_filtered, kmin, kmax)
+    outdata = envelope(data_filtered, kmin, kmax)
     
     # Write output file #
 
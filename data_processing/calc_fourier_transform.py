@@ -141,23 +141,42 @@ def get_coefficients(data, lon_axis, min_freq, max_freq):
     Output:
       - A list: [mag_min_freq, phase_min_freq, ... mag_max_freq, phase_max_freq]
       - The phase is represented by the location of the first local maxima along the longitude axis
+
+    A single Fourier Transform of the entire dataset is performed and 
+    the coefficients for all the frequencies are then processed at once. 
+    The signal associated with frequency k and coefficient c is 
+    (2|c|/N) cos(2 pi k n/N + arg(c)), so the magnitude is 2|c|/N and its
+    maxima are at n = -arg(c) N / (2 pi k) (modulo N/k), which is snapped
+    to the nearest grid point. This matches filter_signal (with 
+    min_freq = max_freq = freq) followed by first_localmax_index, except 
+    that the magnitude isn't limited to the values at the grid points.
+
+    For an even number of longitudes the Nyquist frequency (k = N/2) has 
+    a single (real) coefficient, so its magnitude is |c|/N.
     
     """
 
+    N = len(lon_axis)
+    assert 0 < min_freq <= max_freq <= N / 2.0, \
+    'Frequencies must be in the range 1 to %i' %(N // 2)
+
+    sig_fft = fourier_transform(numpy.array(data), lon_axis)[0]
+    freqs = numpy.arange(min_freq, max_freq + 1)
+    coefs = sig_fft[..., freqs]    # for positive frequencies the coefficient index is the frequency
+
+    scale = numpy.where(2 * freqs == N, 1.0, 2.0)   # no negative frequency counterpart at the Nyquist frequency
+    magnitudes = scale * numpy.abs(coefs) / N
+
+    wavelength = N / freqs.astype(float)   # grid points
+    first_max = numpy.mod(-numpy.angle(coefs) * wavelength / (2.0 * numpy.pi), wavelength)
+    localmax_indexes = numpy.rint(first_max).astype(int)
+    localmax_indexes[first_max > wavelength - 0.5] = 0    # nearest grid point to the last maxima wraps around to zero
+    localmax_lons = numpy.take(lon_axis, localmax_indexes)
+
     outdata_list = [] 
-    exclusion = None
-    for freq in range(min_freq, max_freq + 1):
-        filtered_signal = numpy.apply_along_axis(filter_signal, -1, 
-                                                 data, lon_axis, 
-                                                 freq, freq, 
-                                                 exclusion)
-
-        localmax_vals = numpy.max(filtered_signal, axis=-1)
-        localmax_indexes = numpy.apply_along_axis(first_localmax_index, -1, filtered_signal)
-        localmax_lons = map(lambda x: lon_axis[x], localmax_indexes)
-        
-        outdata_list.append(localmax_vals)
-        outdata_list.append(localmax_lons)
+    for index in range(len(freqs)):
+        outdata_list.append(magnitudes[..., index])
+        outdata_list.append(localmax_lons[..., index])
 
     return outdata_list
 
@@ -7,7 +7,7 @@ Description:  For a given variable, calculate a composite of a related index
 
 # Import general Python modules #
 
-import sys, os, pdb, operator
+import sys, os, pdb
 import argparse
 import numpy
 import MV2
@@ -110,8 +110,7 @@ def main(inargs):
 
         # Find threshold for variable and get boolean index array for samples > and <= the threshold #
         
-        threshold = uconv.get_threshold(var_indata.data, inargs.threshold, axis=time_index)
-        threshold = numpy.resize(threshold, var_indata.data.shape)
+        threshold = uconv.get_threshold(var_indata.data, inargs.threshold, axis=time_index)  # broadcasts along the time axis
 
         if inargs.include == 'above':
             subset_indexes = var_indata.data < threshold  # Because True gets masked, and I want the trues included
@@ -125,20 +124,25 @@ def main(inargs):
         size_all = var_indata.data.shape[time_index]
         size_subset = size_all - size_subset_array[0, 0]
 
-        # Create masked metric arrays #
+        # Accumulate the metric statistics (broadcast to the variable grid) #
+        # (the subset is selected by per-point weights, so the temporary 
+        # grid sized arrays are limited to one time chunk at a time)
 
-        if len(var_indata.data.shape) > 1:
-            dim_size = reduce(operator.mul, var_indata.data.shape[1:], 1)
-            metric_data = numpy.repeat(metric_indata.data, dim_size)
-            metric_data = numpy.reshape(metric_data, var_indata.data.shape)
-        else:
-            metric_data = metric_indata.data
+        metric_shape = (var_indata.data.shape[0],) + (1,) * (len(var_indata.data.shape) - 1)
+        metric_data = numpy.ma.reshape(metric_indata.data, metric_shape)
+        subset_weights = numpy.ma.filled(~subset_indexes, False)
+
+        stats_subset = uconv.RunningStats()
+        for start in range(0, size_all, inargs.chunk_size):
+            stats_subset.update(metric_data[start:start + inargs.chunk_size], 
+                                weights=subset_weights[start:start + inargs.chunk_size])
 
-        metric_data_subset = numpy.ma.masked_array(metric_data, mask=subset_indexes)
+        stats_all = uconv.RunningStats()
+        stats_all.update(metric_data)
  
 	# Calculate composite # 
 	
-        composite_mean = metric_data_subset.mean(axis=time_index)
+        composite_mean = stats_subset.get_mean()
 
         composite_atts = {'id': inargs.metric+'_'+season,
                           'standard_name': metric_indata.data.standard_name+'_'+season,
@@ -152,9 +156,10 @@ def main(inargs):
 
 	# Perform significance test # 
 
-        pval, pval_atts = uconv.get_significance(metric_data_subset, metric_data,
-                                                 'p_'+season, 'p_value_'+season,
-                                                 size_subset, size_all)
+        pval, pval_atts = uconv.get_significance_from_stats(stats_subset, stats_all,
+                                                            'p_'+season, 'p_value_'+season,
+                                                            size_subset, size_all, 
+                                                            equal_var=not inargs.welch)
 
         outdata_list.append(pval)
         outvar_atts_list.append(pval_atts)
@@ -203,6 +208,10 @@ author:
                         help="Include values above or below threshold [default: above]")
     parser.add_argument("--absolute", action="store_true", default=False,
                         help="Use the absolute value of var [default: above]")
+    parser.add_argument("--welch", action="store_true", default=False,
+                        help="Use Welch's t-test (i.e. don't assume equal variances) for the significance test [default: False]")
+    parser.add_argument("--chunk_size", type=int, default=365,
+                        help="Number of time steps processed at a time when accumulating the composite [default: 365]")
 
     parser.add_argument("--time", type=str, nargs=2, metavar=('START_DATE', 'END_DATE'), default=None,
                         help="Time period over which to calculate the composite [default = entire]")
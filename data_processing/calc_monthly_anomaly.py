@@ -15,51 +15,93 @@ import os
 import sys
 
 import argparse
+import numpy
 
-import MV2
+import cdms2
 
 module_dir = os.path.join(os.environ['HOME'], 'modules')
 sys.path.insert(0, module_dir)
 import netcdf_io as nio
+import convenient_universal as uconv
 
 
 def calc_monthly_climatology(base_data):
     """Calculate monthly climatology."""
     
-    ntime, nlat, nlon = MV2.shape(base_data.data)
-    monthly_climatology = MV2.ones([12, nlat, nlon]) * base_data.data.missing_value
-    
-    for i in range(0, 12):
-        monthly_climatology[i, :, :] = MV2.average(base_data.data[i:ntime:12, :, :], axis=0) 
-
-    monthly_climatology = MV2.masked_values(monthly_climatology, base_data.data.missing_value)
+    groups = uconv.get_time_groups(base_data.months())
+    monthly_climatology = uconv.calc_group_climatology(base_data.data, groups, 12)[0]
 
     return monthly_climatology
 
 
-def calc_monthly_anomaly(complete_data, base_data):
+def calc_monthly_anomaly(complete_data, monthly_climatology):
     """Calculate monthly anomaly."""  
     
-    # Calculate the monthly climatology #
-    
-    monthly_climatology = calc_monthly_climatology(base_data)
-    
-    # Calculate the monthly anomaly #
-    
-    ntime, nlat, nlon = MV2.shape(complete_data.data)
-    months = complete_data.months()
-    monthly_anomaly = MV2.ones([ntime, nlat, nlon]) * base_data.data.missing_value
-    for i in range(0, ntime):
-	month_index = months[i]
-	monthly_anomaly[i, :, :] = MV2.subtract(complete_data.data[i, :, :], monthly_climatology[month_index-1, :, :])
-
-    monthly_anomaly = MV2.masked_values(monthly_anomaly, base_data.data.missing_value)
+    groups = uconv.get_time_groups(complete_data.months())
+    monthly_anomaly = uconv.calc_group_anomaly(complete_data.data, groups, monthly_climatology)
 
     return monthly_anomaly
 
 
+def write_climatology(outfile_name, monthly_climatology, var_id, base_period, lat_axis, lon_axis):
+    """Store the monthly climatology in an existing output file 
+    (as var_id_climatology), so that it can be reused in append mode."""
+
+    month_axis = cdms2.createAxis(numpy.arange(1, 13), id='month')
+    month_axis.long_name = 'month'
+    month_axis.units = '1'
+
+    var = cdms2.createVariable(numpy.ma.asarray(monthly_climatology, dtype=numpy.float32), 
+                               axes=[month_axis, lat_axis, lon_axis], 
+                               id=var_id+'_climatology', copy=0)
+    var.long_name = 'monthly climatology'
+    var.base_period = '%s %s' %tuple(base_period)
+
+    outfile = cdms2.open(outfile_name, 'r+')
+    outfile.write(var)
+    outfile.close()
+
+
+def read_climatology(outfile_name, var_id, base_period):
+    """Read the monthly climatology stored in an existing output file."""
+
+    infile = cdms2.open(outfile_name)
+    assert var_id+'_climatology' in infile.variables.keys(), \
+    '%s has no stored climatology, so it must be recalculated without --append' %(outfile_name) 
+    var = infile[var_id+'_climatology']
+    assert var.base_period == '%s %s' %tuple(base_period), \
+    'The base period of %s (%s) differs from --base' %(outfile_name, var.base_period)
+    monthly_climatology = numpy.ma.asarray(var[:])  # cdms2 variables cannot be indexed by a numpy array
+    infile.close()
+
+    return monthly_climatology
+
+
+def append_anomaly(inargs):
+    """Append the monthly anomaly for the new input time steps to the 
+    existing output file (using the stored base period climatology)."""
+
+    time_period = nio.new_time_period(inargs.infile, inargs.variable, inargs.outfile)
+    if not time_period:
+        print 'The output file is up to date'
+        return
+    print 'Appending:', time_period[0], 'to', time_period[1]
+
+    new_data = nio.InputData(inargs.infile, inargs.variable, time=time_period)
+    monthly_climatology = read_climatology(inargs.outfile, inargs.variable, inargs.base)
+    monthly_anomaly = calc_monthly_anomaly(new_data, monthly_climatology)
+
+    nio.append_netcdf(inargs.outfile, [monthly_anomaly,], [inargs.variable,],
+                      [(new_data.data.getTime(), new_data.data.getLatitude(), new_data.data.getLongitude()),],
+                      extra_history=" ".join(sys.argv))
+
+
 def main(inargs):
     """Run the program"""
+
+    if inargs.append and os.path.isfile(inargs.outfile):
+        append_anomaly(inargs)
+        return
     
     # Open the input file #
 
@@ -68,7 +110,8 @@ def main(inargs):
       
     # Calculate the monthly climatology and anomaly #
     
-    monthly_anomaly = calc_monthly_anomaly(full_data, base_data)
+    monthly_climatology = calc_monthly_climatology(base_data)
+    monthly_anomaly = calc_monthly_anomaly(full_data, monthly_climatology)
 
     # Write output file #
 
@@ -77,7 +120,6 @@ def main(inargs):
                  'units': full_data.data.units,
                  'notes': 'Calculated anomaly relative to the %s to %s monthly climatology.'  %(inargs.base[0], inargs.base[1])}
 
-    indata_list = [full_data,]
     outdata_list = [monthly_anomaly,]
     outvar_atts_list = [attributes,]
     outvar_axes_list = [(full_data.data.getTime(), 
@@ -85,10 +127,14 @@ def main(inargs):
                         full_data.data.getLongitude()),]
 
     nio.write_netcdf(inargs.outfile, 'monthly anomaly', 
-                     indata_list, 
+                     full_data.global_atts, 
                      outdata_list,
                      outvar_atts_list, 
-                     outvar_axes_list)
+                     outvar_axes_list,
+                     unlimited_time=True)
+
+    write_climatology(inargs.outfile, monthly_climatology, inargs.variable, inargs.base,
+                      full_data.data.getLatitude(), full_data.data.getLongitude())
 
    
 if __name__ == '__main__':
@@ -98,6 +144,10 @@ example (abyss.earthsci.unimelb.edu.au):
   /usr/local/uvcdat/1.2.0rc1/bin/cdat calc_monthly_anomaly.py 
   /work/dbirving/datasets/Merra/data/processed/ts_Merra_surface_monthly_native-ocean.nc ts
   /work/dbirving/datasets/Merra/data/processed/ts_Merra_surface_monthly-anom-wrt-1981-2010_native-ocean.nc
+
+  With --append, only the input time steps that come after the end of an existing
+  output file are read, and the base period climatology stored in that file 
+  (as <variable>_climatology) is reused. The output file is extended in place.
 """    	
 
     description = 'Take a monthly timeseries and calculate the monthly anomaly timeseries.'
@@ -112,6 +162,8 @@ example (abyss.earthsci.unimelb.edu.au):
     
     parser.add_argument("--base", type=str, nargs=2, metavar=('START', 'END'), default=['1981-01-01', '2010-12-31'],
                         help="start and end dates for the base period [default: '1981-01-01', '2010-12-31']")
+    parser.add_argument("--append", action="store_true", default=False,
+                        help="Append the new time steps to an existing output file")
 
     args = parser.parse_args()            
 
@@ -37,9 +37,15 @@ except ImportError:
 
 # Define functions #
 
-def rotate_vwind(dataU, dataV, new_np, pm_point, res=1.0, anomaly=None):
+def rotate_vwind(dataU, dataV, new_np, pm_point, res=1.0, anomaly=None, nprocs=1, cache_dir=None):
     """Define the new meridional wind field, according to the 
     position of the new north pole.
+
+    nprocs is the number of processes used when switching the axes
+    of (time, lat, lon) data.
+
+    If a cache_dir is given, the rotation angles and rotated grid
+    are stored there and reused by subsequent runs. 
     
     FIX: Need a more general method of dealing with input axes
     (e.g. what if there is multiple levels)
@@ -58,7 +64,7 @@ def rotate_vwind(dataU, dataV, new_np, pm_point, res=1.0, anomaly=None):
 
     # Calculate new vwind on the native grid
 
-    vwind_rot = calc_vwind(dataU, dataV, lat_axis, lon_axis, new_np) 
+    vwind_rot = calc_vwind(dataU, dataV, lat_axis, lon_axis, new_np, cache_dir=cache_dir) 
 
     if anomaly:
         date_pattern = '([0-9]{4})-([0-9]{1,2})-([0-9]{1,2})'
@@ -79,7 +85,8 @@ def rotate_vwind(dataU, dataV, new_np, pm_point, res=1.0, anomaly=None):
     lat_axis_rot = grid.getLatitude()
     lon_axis_rot = grid.getLongitude()
      
-    vwind_rot_switch = rot.switch_regular_axes(vwind_rot, lats, lons, lat_axis_rot[:], lon_axis_rot[:], new_np, pm_point=pm_point, invert=True)
+    vwind_rot_switch = rot.switch_regular_axes(vwind_rot, lats, lons, lat_axis_rot[:], lon_axis_rot[:], new_np, pm_point=pm_point, invert=True, 
+                                               nprocs=nprocs, cache_dir=cache_dir)
     
     if 't' in dataU.getOrder():
         axis_list = [dataU.getTime(), lat_axis_rot, lon_axis_rot]
@@ -92,13 +99,19 @@ def rotate_vwind(dataU, dataV, new_np, pm_point, res=1.0, anomaly=None):
     return vwind_rot, vwind_rot_swtich    
         
 
-def calc_vwind(dataU, dataV, lat_axis, lon_axis, new_np, old_np=(90.0, 0.0)):
+def calc_vwind(dataU, dataV, lat_axis, lon_axis, new_np, old_np=(90.0, 0.0), cache_dir=None):
     """Calculate the new meridional wind field, according to the
     new position of the north pole"""
     
     lats, lons = nio.coordinate_pairs(lat_axis, lon_axis) 
-    theta = rot.rotation_angle(old_np[0], old_np[1], new_np[0], new_np[1], 
-                               lats, lons, reshape=[len(lat_axis), len(lon_axis)])
+    if cache_dir:
+        key_items = ['rotation_angle', lat_axis, lon_axis, new_np, old_np]
+        theta = rot.cached_calculation(cache_dir, key_items, rot.rotation_angle,
+                                       old_np[0], old_np[1], new_np[0], new_np[1], 
+                                       lats, lons, reshape=[len(lat_axis), len(lon_axis)])
+    else:
+        theta = rot.rotation_angle(old_np[0], old_np[1], new_np[0], new_np[1], 
+                                   lats, lons, reshape=[len(lat_axis), len(lon_axis)])
     theta = numpy.resize(theta, numpy.shape(dataU))
     
     dataV_rot = vwind_trig(dataU, dataV, theta) 
@@ -141,7 +154,8 @@ def main(inargs):
     
     # Calulate the new vwind #
 
-    vwind_rot, vwind_rot_switch = rotate_vwind(indataU.data, indataV.data, inargs.north_pole, inargs.pm, anomaly=inargs.anomaly)
+    vwind_rot, vwind_rot_switch = rotate_vwind(indataU.data, indataV.data, inargs.north_pole, inargs.pm, anomaly=inargs.anomaly, 
+                                               nprocs=inargs.nprocs, cache_dir=inargs.cache_dir)
 
     # Write the output file #
 
@@ -229,6 +243,10 @@ author:
                         help="Location of the prime meridian point")	
     parser.add_argument("--anomaly", type=str, nargs=2, metavar=('START_DATE', 'END_DATE'), default=None,
                         help="""Output the anomaly timeseries (calculated from annual cycle monthly climatology). Each date can be 'all' or 'YYYY-MM-DD' [default=False]""")
+    parser.add_argument("--nprocs", type=int, default=1,
+                        help="Number of processes to use when switching the axes of the data [default: 1]")
+    parser.add_argument("--cache_dir", type=str, default=None,
+                        help="Directory for storing (and reusing) the rotation angles and rotated grid [default: no caching]")
     parser.add_argument("--noswitch", action="store_true", default=False,
                         help="Switch for outputing the vwind on the original grid, as opposed to the switched (or rotated) grid [default: False]") 	
     
@@ -18,6 +18,7 @@ Output:       waf x component, waf y component
 Updates | By | Description
 --------+----+------------
 12 October 2012 | Damien Irving | Initial version.
+18 October 2026 | Damien Irving | Native Python calculation of the flux (replaces the Fortran tnf_xy_onelevel.run binary).
 
 """
 
@@ -37,13 +38,13 @@ from cdms2 import MV2
 import numpy
 
 import netCDF4
-from scipy.io.numpyio import fwrite, fread
-# note that in later versions of scipy numpyio this has been replaced.
-# For a work around, see http://stackoverflow.com/questions/10637376/import-error-no-module-named-numpyio 
 
-import regrid2
-from regrid2 import Regridder
 
+### Define constants ###
+
+g = 9.80665        # gravitational acceleration (m s-2)
+omega = 7.2921e-5  # angular velocity of the Earth (rad s-1)
+a = 6371000.0      # radius of the Earth (m)
 
 
 def time_axis_check(axis1, axis2):
@@ -53,17 +54,9 @@ def time_axis_check(axis1, axis2):
     start_time1 = str(start_time1)
     start_year1 = start_time1.split('-')[0]
     
-    end_time1 = axis1.asComponentTime()[-1]
-    end_time1 = str(end_time1)
-    end_year1 = end_time1.split('-')[0]
-    
     start_time2 = axis2.asComponentTime()[0]
     start_time2 = str(start_time2)
     start_year2 = start_time2.split('-')[0]
-    
-    end_time2 = axis2.asComponentTime()[-1]
-    end_time2 = str(end_time2)
-    end_year2 = end_time2.split('-')[0]
 
     if (start_year1 != start_year2 or len(axis1) != len(axis2)):
         sys.exit('Input files do not all have the same time axis')
@@ -76,97 +69,105 @@ def xy_axis_check(axis1, axis2):
         sys.exit('Input files do not all have the same %s axis' %(axis1.id))
 
 
-def read_climatology(fname,vname,nlat,nlon):
+def read_climatology(fname,vname,order='yx'):
     """Reads the climatology data, assuming a 12 step monthly file format"""
     
     infile = cdms2.open(fname)
     
     months = ['jan','feb','mar','apr','may','jun','jul','aug','sep','oct','nov','dec']
-    monthly_climatology = numpy.zeros([len(months),nlat,nlon])
+    monthly_climatology = []
     for i in range(0,len(months)):
-        data = infile(vname+'_'+months[i],order='yx')
-	monthly_climatology[i,:,:] = data
+        data = infile(vname+'_'+months[i],order=order)
+        monthly_climatology.append(numpy.array(data))
     
     infile.close()
     
-    return monthly_climatology
+    return numpy.array(monthly_climatology)
 
 
-def write_binary(data,outfile):
-    """Takes a numpy data array and writes a corresponding binary data file"""
+def derivative(data,coords,axis,cyclic=False):
+    """Centred difference derivative of data with respect to coords along the given axis.
+    
+    One sided differences are used at the end points, unless the axis is 
+    cyclic (e.g. a global longitude axis), in which case coords must be 
+    in radians (the spacing across the end points wraps around by 2 pi).
     
-    fileobj = open(outfile, mode='wb')
-    fwrite(fileobj, data.size, data)
+    """
+
+    data = numpy.rollaxis(numpy.asarray(data, dtype=numpy.float64), axis, data.ndim)
+    coords = numpy.asarray(coords, dtype=numpy.float64)
     
-    fileobj.close()
+    if cyclic:
+        spacing = numpy.roll(coords, -1) - numpy.roll(coords, 1)
+        spacing[0] = spacing[0] + 2 * numpy.pi
+        spacing[-1] = spacing[-1] + 2 * numpy.pi
+        result = (numpy.roll(data, -1, axis=-1) - numpy.roll(data, 1, axis=-1)) / spacing
+    else:
+        result = numpy.empty(data.shape)
+        result[..., 1:-1] = (data[..., 2:] - data[..., :-2]) / (coords[2:] - coords[:-2])
+        result[..., 0] = (data[..., 1] - data[..., 0]) / (coords[1] - coords[0])
+        result[..., -1] = (data[..., -1] - data[..., -2]) / (coords[-1] - coords[-2])
 
+    return numpy.rollaxis(result, data.ndim - 1, axis)
 
-def read_binary(infile,dims):
-    """Reads a binary data file and puts data in an array"""
 
-    fileobj = open(infile, mode='rb')
+def calc_waf(zg_anom,u_clim,v_clim,lats,lons,pressure):
+    """Calculates the horizontal components of the Takaya & Nakamura (2001) wave 
+    activity flux for stationary waves (i.e. their equation 38).
     
-    datatype = 'f'
-    size = dims[0] * dims[1] * dims[2]
+    Arguments:
+      zg_anom   --  geopotential height anomaly, dimensions (..., lat, lon)
+      u_clim    --  climatological u wind (must broadcast against zg_anom)
+      v_clim    --  climatological v wind (must broadcast against zg_anom)
+      lats      --  latitude axis values (degrees north)
+      lons      --  longitude axis values (degrees east)
+      pressure  --  pressure (hPa); a single value or an array that broadcasts
+                    against zg_anom (e.g. shape (nlevs, 1, 1))
     
-    read_data = fread(fileobj, size, datatype)
-    read_data = read_data.reshape(dims)
+    Output: 
+      wafx, wafy (m2 s-2)
     
-    fileobj.close()
-    
-    return read_data
-
+    """
 
-def regrid(data,in_lat,in_lon,oldgrid):
-    """Takes input data and regrids to a 2.5 degree global grid"""
+    lat_rad = numpy.deg2rad(numpy.asarray(lats, dtype=numpy.float64))
+    lon_rad = numpy.deg2rad(numpy.asarray(lons, dtype=numpy.float64))
+    cyclic = abs(abs(lons[-1] - lons[0]) + abs(lons[1] - lons[0]) - 360.0) < 1.0e-4
     
-#    len_test_lat = (len(in_lat) == 73)
-#    len_test_lon = (len(in_lon) == 144)
-#    start_test_lat = (in_lat[0] > in_lat[-1])
-#    
-#    if len_test_lat and len_test_lon and start_test_lat:  # no change - correct input
-#        print 'no regridding...'
-#	new_data = data
-#	latitude = in_lat
-#	longitude = in_lon
-#	
-#    elif len_test_lat and len_test_lon:  # flip latitude axis only
-#        print 'flip latitude axis...'
-#        new_data = data[:,::-1,:]
-#	latitude = in_lat[::-1]
-#	longitude = in_lon
-#    
-#    else:
-#        print 'regridding...'
+    coslat = numpy.cos(lat_rad)[:, numpy.newaxis]
+    f = 2 * omega * numpy.sin(lat_rad)[:, numpy.newaxis]
     
-    #tnf_xy_onelevel.run requires North to South latitude axis
-    latitude = cdms2.createAxis(numpy.arange(90,-92.5,-2.5,'f'),id='latitude') #-90,92.5,2.5
-
-    latitude.designateLatitude()
-    latitude.units = 'degrees_north'
-    latitude.long_name = 'Latitude'
-    latitude.standard_name ='latitude'
-    latitude.axis = 'Y'
-
-    longitude = cdms2.createAxis(numpy.arange(0,360,2.5,'f'),id='longitude')
-    longitude.designateLongitude()
-    longitude.units = 'degrees_east'
-    longitude.long_name = 'Longitude'
-    longitude.standard_name = 'longitude'
-    longitude.axis = 'X'
-    longitude.modulo = 360.
-    longitude.topology = 'circular'
-
-    newgrid = cdms2.createRectGrid(latitude,longitude)                                                     
-
-    regridfunc = Regridder(oldgrid, newgrid)                                
-    new_data = regridfunc(data)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        
+        # Quasi-geostrophic streamfunction anomaly and its derivatives #
     
-    return new_data,latitude,longitude
+        psi = g * numpy.asarray(zg_anom, dtype=numpy.float64) / f
+
+        ylat = psi.ndim - 2
+        xlon = psi.ndim - 1
+
+        psi_x = derivative(psi, lon_rad, xlon, cyclic=cyclic)
+        psi_y = derivative(psi, lat_rad, ylat)
+        psi_xx = derivative(psi_x, lon_rad, xlon, cyclic=cyclic)
+        psi_xy = derivative(psi_x, lat_rad, ylat)
+        psi_yy = derivative(psi_y, lat_rad, ylat)
+
+        term_xx = psi_x**2 - psi * psi_xx
+        term_xy = psi_x * psi_y - psi * psi_xy
+        term_yy = psi_y**2 - psi * psi_yy
+
+        # Flux #
+
+        wind_mag = numpy.sqrt(u_clim**2 + v_clim**2)
+        coefficient = (numpy.asarray(pressure) / 1000.0) * coslat / (2 * wind_mag)
+
+        wafx = coefficient * ((u_clim / (a**2 * coslat**2)) * term_xx + (v_clim / (a**2 * coslat)) * term_xy)
+        wafy = coefficient * ((u_clim / (a**2 * coslat)) * term_xy + (v_clim / a**2) * term_yy)
     
+    return wafx, wafy
+
 
-def write_netcdf(fname_out,waf_data_ns,time_axis,lat_axis,lon_axis,sourcefile_text,outvar):
-    """Writes the output netcdf file"""
+def create_outfile(fname_out,time_axis,level_axis,lat_axis,lon_axis,sourcefile_text,outvar):
+    """Creates the output netcdf file (the data are written later, one time chunk at a time)"""
     
     outfile = netCDF4.Dataset(fname_out, 'w', format='NETCDF3_CLASSIC')   ## Found error using cdo on abyss with format='NETCDF4' 
     
@@ -180,186 +181,106 @@ def write_netcdf(fname_out,waf_data_ns,time_axis,lat_axis,lon_axis,sourcefile_te
 
     # Dimensions #
 
-    outfile.createDimension('time',None)
-    outfile.createDimension('latitude',len(lat_axis))
-    outfile.createDimension('longitude',len(lon_axis))
-
-    times = outfile.createVariable('time','f4',('time',))
-    lats = outfile.createVariable('latitude','f4',('latitude',))
-    lons = outfile.createVariable('longitude','f4',('longitude',))
-
-    for att_name in time_axis.attributes.keys():
-        setattr(times, att_name, time_axis.attributes[att_name])
-    for att_name in lat_axis.attributes.keys():
-        setattr(lats, att_name, lat_axis.attributes[att_name])
-    for att_name in lon_axis.attributes.keys():
-        setattr(lons, att_name, lon_axis.attributes[att_name])           
+    dims = ['time',]
+    axes = [time_axis,]
+    if level_axis:
+        dims.append('level')
+        axes.append(level_axis)
+    dims = dims + ['latitude', 'longitude']
+    axes = axes + [lat_axis, lon_axis]
+    
+    for dim, axis in zip(dims, axes):
+        outfile.createDimension(dim, None if dim == 'time' else len(axis))
+        dim_var = outfile.createVariable(dim, 'f4', (dim,))
+        for att_name in axis.attributes.keys():
+            setattr(dim_var, att_name, axis.attributes[att_name])
+        if not dim == 'time':
+            dim_var[:] = axis[:]
 
     # Variable #
 
-    out_data = outfile.createVariable(outvar,'f4',('time','latitude','longitude',),fill_value=9.999e+20)
+    out_data = outfile.createVariable(outvar,'f4',tuple(dims),fill_value=9.999e+20)
     setattr(out_data, 'standard_name', outvar)
     setattr(out_data, 'units', 'm2 s-2')
     setattr(out_data, 'name', 'Wave activity flux, %s component' %(outvar[-1]))
     setattr(out_data, 'missing_value', 9.999e+20) 
     setattr(out_data, 'notes', 'Calculated wave activity flux from U wind, V wind and geopotential height')
     
-    waf_data_ns = waf_data_ns.astype(numpy.float32)
-    
-    #reshape output data so latitude axis is south to north
-    times[:] = time_axis         
-    lats[:] = lat_axis[::-1]           
-    lons[:] = lon_axis 
-    out_data[:] = waf_data_ns[:,::-1,:]
-    
-    outfile.close()
-    
-
-def apply_mask(input_data,input_clim_u,time_axis):
-    """Apply mask, because WAF only valid where the climatological mean flow is westerly"""  
-    
-    # Get the time axis info #
-
-    time_data = time_axis.asComponentTime()
-    months = []
-    for ii in range(0,len(time_data)):
-	months.append(int(str(time_data[ii]).split('-')[1]))
+    return outfile
     
-    # Expand input climatology to match size of input data (with correct month matching) #
 
-    ntime,nlat,nlon = numpy.shape(input_data)
-    input_clim_u_expanded = numpy.ma.ones([ntime,nlat,nlon]) * 9.999e+20
-    for i in range(0,ntime):
-	month_index = months[i]
-	input_clim_u_expanded[i,:,:] = input_clim_u[month_index-1,:,:]
+def apply_mask(input_data,input_clim_u):
+    """Apply mask, because WAF only valid where the climatological mean flow is westerly
     
-    # Define the mask #
+    input_clim_u must be the same shape as input_data (i.e. the climatology for 
+    the corresponding month at each time step)
     
-    mask_u = numpy.where(input_clim_u_expanded > 1.0, 0, 1)   # exclude points where climtological wind has easterly component
-    mask_inf = numpy.isinf(input_data)                        # exclude infinity values
-    mask_nan = numpy.isnan(input_data)                        # exclude NaN values
+    """  
     
-    mask = numpy.sum([mask_u,mask_inf,mask_nan],axis=0)
-    
-    # Apply the mask #
-    
-    input_data_masked = MV2.array(numpy.ma.masked_array(input_data, mask=mask))
-    
-    return input_data_masked
-
-
-def read_data(fname,vname):
-    """Reads the data from a typical input file"""
-    
-    infile = cdms2.open(fname)
+    mask_u = input_clim_u <= 1.0             # exclude points where climtological wind has easterly component
+    mask_inf_nan = ~numpy.isfinite(input_data)  # exclude infinity and NaN values
     
-    data = infile(vname,order='tyx')  
-    time = data.getTime()
-    lat = data.getLatitude()
-    lon = data.getLongitude()
+    return numpy.ma.masked_array(input_data, mask=mask_u | mask_inf_nan)
 
-    infile.close()
-
-    return data,time,lat,lon
-    
 
-def main(fname_u, fname_uclim, vname_u, fname_v, fname_vclim, vname_v, fname_zg, fname_zgclim, vname_zg, fname_wafx, fname_wafy):
+def main(fname_u, fname_uclim, vname_u, fname_v, fname_vclim, vname_v, fname_zg, fname_zgclim, vname_zg, fname_wafx, fname_wafy, 
+         pressure=250.0, chunk_size=100):
     """Run the program"""
 
-    ### Read the input data ###
-
-    ## u wind, v wind, zg ##
-    
-    data_u,time_u,lat_u,lon_u = read_data(fname_u,vname_u)
-    data_v,time_v,lat_v,lon_v = read_data(fname_v,vname_v)
-    data_zg,time_zg,lat_zg,lon_zg = read_data(fname_zg,vname_zg)
-
     ### Check that the input data are all on the same coordinate axes ###
 
-    ## Time ##
+    infile_zg = cdms2.open(fname_zg)
+    time_zg = infile_zg[vname_zg].getTime()
+    level_zg = infile_zg[vname_zg].getLevel()
+    lat_zg = infile_zg[vname_zg].getLatitude()
+    lon_zg = infile_zg[vname_zg].getLongitude()
 
-    time_axis_check(time_u, time_v)
-    time_axis_check(time_u, time_zg)
-    
-    ## Latitude ##
-        
-    xy_axis_check(lat_u, lat_v)
-    xy_axis_check(lat_u, lat_zg)
+    for fname, vname in [(fname_u, vname_u), (fname_v, vname_v)]:
+        infile = cdms2.open(fname)
+        time_axis_check(time_zg, infile[vname].getTime())
+        xy_axis_check(lat_zg, infile[vname].getLatitude())
+        xy_axis_check(lon_zg, infile[vname].getLongitude())
+        infile.close()
 
-    ## Longitude ##
+    ### Read the climatologies ###
     
-    xy_axis_check(lon_u, lon_v)
-    xy_axis_check(lon_u, lon_zg)
+    order = 'zyx' if level_zg else 'yx'
+    data_uclim = read_climatology(fname_uclim,vname_u,order)  
+    data_vclim = read_climatology(fname_vclim,vname_v,order)
+    data_zgclim = read_climatology(fname_zgclim,vname_zg,order)
+    
+    if level_zg:
+        pressure = numpy.array(level_zg[:], dtype=numpy.float64)
+        if level_zg.units.lower() in ['pa', 'pascal', 'pascals']:
+            pressure = pressure / 100.0
+        pressure = pressure[:, numpy.newaxis, numpy.newaxis]
 
-    ## Find grid characteristics ##
+    months = numpy.array([ct.month for ct in time_zg.asComponentTime()])
 
-    ntime, nlat, nlon = numpy.shape(data_u)
-    input_grid = data_u.getGrid() 
-    
-    ## u wind, v wind, zg climatology ##
-    
-    data_uclim = read_climatology(fname_uclim,vname_u,nlat,nlon)  
-    data_vclim = read_climatology(fname_vclim,vname_v,nlat,nlon)
-    data_zgclim = read_climatology(fname_zgclim,vname_zg,nlat,nlon)
-    
+    ### Calculate the wave activity flux, one time chunk at a time ###
     
-    ### Regrid the data ###
-    
-    data_u_regrid, lat_regrid, lon_regrid = regrid(data_u,lat_u,lon_u,input_grid)
-    data_uclim_regrid, lat_regrid, lon_regrid = regrid(data_uclim,lat_u,lon_u,input_grid)
-    
-    data_v_regrid, lat_regrid, lon_regrid = regrid(data_v,lat_u,lon_u,input_grid)
-    data_vclim_regrid, lat_regrid, lon_regrid = regrid(data_vclim,lat_u,lon_u,input_grid)
-    
-    data_zg_regrid, lat_regrid, lon_regrid = regrid(data_zg,lat_u,lon_u,input_grid)
-    data_zgclim_regrid, lat_regrid, lon_regrid = regrid(data_zgclim,lat_u,lon_u,input_grid)
-   
-    
-    ### Create the binary data files for input into the Fortran wap script ### 
-    
-    write_binary(data_u_regrid,'u.bin')
-    write_binary(data_uclim_regrid,'uclim.bin')
-    write_binary(data_v_regrid,'v.bin')
-    write_binary(data_vclim_regrid,'vclim.bin')
-    write_binary(data_zg_regrid,'zg.bin')
-    write_binary(data_zgclim_regrid,'zgclim.bin')
+    sourcefile_text = '%s, %s, %s, %s, %s, %s' %(fname_u, fname_uclim, fname_v, fname_vclim, fname_zg, fname_zgclim)
+    outfile_x = create_outfile(fname_wafx,time_zg,level_zg,lat_zg,lon_zg,sourcefile_text,'wafx')
+    outfile_y = create_outfile(fname_wafy,time_zg,level_zg,lat_zg,lon_zg,sourcefile_text,'wafy')
 
-    
-    ### Calculate the wave activity flux ###
-    
-    fout = open('answers.txt','w')
-    print >>fout, '250'
-    print >>fout, 'zg.bin'
-    print >>fout, 'zgclim.bin'
-    print >>fout, 'u.bin'
-    print >>fout, 'uclim.bin'
-    print >>fout, 'v.bin'
-    print >>fout, 'vclim.bin'
-    print >>fout, 'wafx.bin'
-    print >>fout, 'wafy.bin'
-
-    fout.close()
-    
-    os.system("/home/dbirving/data_processing/WAF/tnf_xy_onelevel.run < answers.txt")
-    
-    
-    ### Write the output netCDF file ###
-    
-    wafx_data_ns = read_binary('wafx.bin',[ntime,73,144])
-    wafy_data_ns = read_binary('wafy.bin',[ntime,73,144])    
+    ntime = len(time_zg)
+    for start in range(0, ntime, chunk_size):
+        end = min(start + chunk_size, ntime)
         
-    wafx_data_ns_masked = apply_mask(wafx_data_ns,data_uclim_regrid,time_u)
-    wafy_data_ns_masked = apply_mask(wafy_data_ns,data_uclim_regrid,time_u)
-  
-    sourcefile_text = '%s, %s, %s, %s, %s, %s' %(fname_u, fname_uclim, fname_v, fname_vclim, fname_zg, fname_zgclim)
-    
-    write_netcdf(fname_wafx,wafx_data_ns_masked,time_u,lat_regrid,lon_regrid,sourcefile_text,'wafx')
-    write_netcdf(fname_wafy,wafy_data_ns_masked,time_u,lat_regrid,lon_regrid,sourcefile_text,'wafy')
+        data_zg = numpy.array(infile_zg(vname_zg, time=slice(start, end), order='t'+order))
+        clim_index = months[start:end] - 1
+        
+        wafx, wafy = calc_waf(data_zg - data_zgclim[clim_index], 
+                              data_uclim[clim_index], data_vclim[clim_index], 
+                              lat_zg[:], lon_zg[:], pressure)
+        
+        for outfile, outvar, waf in [(outfile_x, 'wafx', wafx), (outfile_y, 'wafy', wafy)]:
+            outfile.variables['time'][start:end] = time_zg[start:end]
+            outfile.variables[outvar][start:end] = apply_mask(waf, data_uclim[clim_index]).astype(numpy.float32)
 
-    
-    ### Clean up ###
-    
-    os.system("rm answers.txt zg.bin zgclim.bin u.bin uclim.bin v.bin vclim.bin wafx.bin wafy.bin")
+    infile_zg.close()
+    outfile_x.close()
+    outfile_y.close()
 
 
 if __name__ == '__main__':
@@ -370,6 +291,8 @@ if __name__ == '__main__':
     parser = OptionParser(usage=usage)
 
     parser.add_option("-M", "--manual",action="store_true",dest="manual",default=False,help="output a detailed description of the program")
+    parser.add_option("-p", "--pressure",dest="pressure",type="float",default=250.0,help="pressure level (hPa) of input data with no level axis [default = 250]")
+    parser.add_option("-c", "--chunk_size",dest="chunk_size",type="int",default=100,help="number of time steps to process at once [default = 100]")
 
     (options, args) = parser.parse_args()            # Now that the options have been defined, instruct the program to parse the command line
 
@@ -383,17 +306,23 @@ if __name__ == '__main__':
 	Options
             -M -> Display this on-line manual page and exit
             -h -> Display a help/usage message and exit
+            -p -> Pressure level (hPa) of input data that have no level axis [default = 250]
+            -c -> Number of time steps to process at once [default = 100]
 
 	Description
             Takes as input the u wind, v wind, geopotential height (zg)  
 	    and their climatologies and outputs the x and y 
 	    components of the wave activity flux.
 	
-	Assumptions (i.e. hard wired elements) 
-	    The WAF Fortran code is hard wired to produce output on a 
-	    global 2.5 by 2.5 deg grid (i.e. 73 lats, 144 lons).
-	    It is hard wired that the input data is from the 250 hPa level.
-	    It is assumed that the input data is three dimensional (time, lat, lon). 
+	Assumptions
+	    The input data are on a regular latitude/longitude grid and
+	    are three (time, lat, lon) or four (time, level, lat, lon)
+	    dimensional. All input files share the same grid.
+	    The climatology files contain 12 monthly variables
+	    (e.g. ua_jan, ua_feb, ..., ua_dec).
+	    The flux is the stationary wave form of the flux (i.e. equation
+	    38 of Takaya & Nakamura (2001)), so only the climatological u
+	    and v winds are used (the u and v files are used to check the axes).
 	
 	Reference
 	    Takaya, K., Nakamura, H., 2001.
@@ -441,4 +370,5 @@ if __name__ == '__main__':
 
     fname_u, fname_uclim, vname_u, fname_v, fname_vclim, vname_v, fname_zg, fname_zgclim, vname_zg, fname_wafx, fname_wafy = args  
     
-    main(fname_u,fname_uclim,vname_u,fname_v,fname_vclim,vname_v,fname_zg,fname_zgclim,vname_zg,fname_wafx,fname_wafy)
+    main(fname_u,fname_uclim,vname_u,fname_v,fname_vclim,vname_v,fname_zg,fname_zgclim,vname_zg,fname_wafx,fname_wafy,
+         pressure=options.pressure,chunk_size=options.chunk_size)
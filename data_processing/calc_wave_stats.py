@@ -62,6 +62,60 @@ def extent_stats(data_double, lons_double, threshold, lons_spacing):
     return start_lon, end_lon, extent
 
 
+def extent_stats_all(data, lons, threshold, lons_spacing):
+    """Return key statistics regarding the extent for all timesteps at once
+
+    Input data are (time, longitude). The result is identical to calling 
+    extent_stats for each timestep (with the longitude doubled data), but
+    the contiguous runs of grid cells exceeding the threshold are found by 
+    run-length encoding the entire (time, doubled longitude) exceedance mask.
+
+    """
+
+    data = numpy.asarray(data)
+    ntime, nlon = data.shape
+    lons_double = numpy.append(lons, lons)
+
+    # Run-length encode the cyclic (i.e. longitude doubled) exceedance mask #
+    
+    exceed = data > threshold
+    exceed_double = numpy.append(exceed, exceed, axis=1)
+    padding = numpy.zeros([ntime, 1], dtype=numpy.int8)
+    changes = numpy.diff(numpy.hstack([padding, exceed_double.astype(numpy.int8), padding]), axis=1)
+    
+    run_rows, run_starts = numpy.nonzero(changes == 1)
+    run_ends = numpy.nonzero(changes == -1)[1]  # exclusive (runs appear in the same row major order)
+    run_lengths = run_ends - run_starts
+
+    # Select the (first) longest run for each timestep #
+
+    order = numpy.lexsort((run_starts, -run_lengths, run_rows))
+    rows, first_index = numpy.unique(run_rows[order], return_index=True)
+    selected = order[first_index]
+
+    start_lon = numpy.zeros(ntime)
+    end_lon = numpy.zeros(ntime)
+    extent = numpy.zeros(ntime)
+
+    start_lon[rows] = lons_double[run_starts[selected]]
+    end_lon[rows] = lons_double[run_ends[selected] - 1]
+    extent[rows] = run_lengths[selected] * lons_spacing[0]
+
+    # Special cases (consistent with extent_stats) #
+
+    count = exceed.sum(axis=1)
+
+    single = count == 1  # The one grid cell (in each half of the doubled data) counts as a run of two 
+    extent[single] = 2 * lons_spacing[0]
+    
+    everywhere = count == nlon
+    start_lon[everywhere] = 0.0
+    end_lon[everywhere] = lons_double[-1]
+    extent[everywhere] = nlon
+
+    return start_lon, end_lon, extent
+
+
 def extent_atts(orig_data, statistic, threshold, outvar_atts_list):
     """Get the attributes for the extent statistics"""
 
@@ -72,7 +126,7 @@ def extent_atts(orig_data, statistic, threshold, outvar_atts_list):
                 'long_name': statistic+'_of_wave_amplitude_exceeding_threshold',
                 'threshold': threshold,
                 'units': orig_data.getLongitude().units,
-                'notes': orig_data.notes}
+                'notes': orig_data.attributes['notes']}
 
     outvar_atts_list.append(var_atts)
 
@@ -87,15 +141,25 @@ def amp_stats(data):
     return amp_mean, amp_median
 
 
+def amp_stats_all(data):
+    """Return key statistics regarding the amplitude of the wave 
+    envelope across the entire zonal domain, for all timesteps at once"""
+    
+    amp_mean = numpy.mean(numpy.asarray(data), axis=1)
+    amp_median = numpy.median(numpy.asarray(data), axis=1)
+    
+    return amp_mean, amp_median
+
+
 def amp_atts(orig_data, stat, outvar_atts_list):
     """Get the attributes for the wave amplitude statistic"""
    
     text = 'zonal_%s_of_the_meridional_maximum_' %(stat)
     var_atts = {'id': 'amp'+stat,
-                'standard_name': text+orig_data.long_name,
-                'long_name': text+orig_data.long_name,
-                'units': orig_data.units,
-                'notes': orig_data.notes}
+                'standard_name': text+orig_data.attributes['long_name'],
+                'long_name': text+orig_data.attributes['long_name'],
+                'units': orig_data.attributes['units'],
+                'notes': orig_data.attributes['notes']}
 
     outvar_atts_list.append(var_atts)
 
@@ -129,54 +193,43 @@ def main(inargs):
 
     # Read data and check inputs #
 
-    indata = nio.InputData(inargs.infile, inargs.var, 
-                           **nio.dict_filter(vars(inargs), ['time',]))
+    if inargs.mmap:
+        indata = nio.MappedData(inargs.infile, inargs.var, 
+                                **nio.dict_filter(vars(inargs), ['time',]))
+        var = indata  # has the same axis methods and attributes as a cdms2 variable
+    else:
+        indata = nio.InputData(inargs.infile, inargs.var, 
+                               **nio.dict_filter(vars(inargs), ['time',]))
+        var = indata.data
 			       
-    assert indata.data.getOrder() == 'tx', \
+    assert var.getOrder() == 'tx', \
     'Input data must be time, longitude'
     
-    times = indata.data.getTime().asComponentTime()
-    lons, lons_spacing = get_lons(indata.data)
-    
-    # Duplicate input data to cater for extents that straddle the Greenwich meridian #
-    
-    data_double = numpy.append(indata.data, indata.data, axis=1)
-    lons_double = numpy.append(lons, lons)
+    lons, lons_spacing = get_lons(var)
     
     # Calculate threshold if one is not given
 
     threshold = calc_threshold(indata.data, inargs.threshold)
 
-    # Loop through every timestep, writing the statistics to relevant variables # 
-    
-    amp_mean_data = []
-    amp_median_data = []
-    extent_data = []    
-    start_lon_data = []
-    end_lon_data = []
-    for i in range(0, len(times)):
-        amp_mean, amp_median = amp_stats(indata.data[i, :])
-        start_lon, end_lon, extent = extent_stats(data_double[i, :], lons_double, threshold, lons_spacing)
-        amp_mean_data.append(amp_mean)
-        amp_median_data.append(amp_median)
-        extent_data.append(extent)
-        start_lon_data.append(start_lon)
-        end_lon_data.append(end_lon)
+    # Calculate the statistics for all timesteps # 
+    
+    amp_mean_data, amp_median_data = amp_stats_all(indata.data)
+    start_lon_data, end_lon_data, extent_data = extent_stats_all(indata.data, lons, threshold, lons_spacing)
 
     # Write output file #
 
     outvar_atts_list = [] 
-    amp_atts(indata.data, 'mean', outvar_atts_list)
-    amp_atts(indata.data, 'median', outvar_atts_list)
-    extent_atts(indata.data, 'extent', inargs.threshold, outvar_atts_list)
-    extent_atts(indata.data, 'startlon', inargs.threshold, outvar_atts_list)
-    extent_atts(indata.data, 'endlon', inargs.threshold, outvar_atts_list)    
+    amp_atts(var, 'mean', outvar_atts_list)
+    amp_atts(var, 'median', outvar_atts_list)
+    extent_atts(var, 'extent', inargs.threshold, outvar_atts_list)
+    extent_atts(var, 'startlon', inargs.threshold, outvar_atts_list)
+    extent_atts(var, 'endlon', inargs.threshold, outvar_atts_list)    
 
     outdata_list = [amp_mean_data, amp_median_data, extent_data, start_lon_data, end_lon_data] 
     
     outvar_axes_list = []
     for item in outdata_list: 
-        outvar_axes_list.append([indata.data.getTime(),])
+        outvar_axes_list.append([var.getTime(),])
 
     nio.write_netcdf(inargs.outfile, " ".join(sys.argv), 
                      indata.global_atts, 
@@ -212,6 +265,8 @@ author:
                         help="Time period [default = entire]")
     parser.add_argument("--threshold", type=str, default='75pct',
                         help="Threshold used in extent calculation. Enter a raw number or a percentile [default = 75pct]")
+    parser.add_argument("--mmap", action="store_true", default=False,
+                        help="Memory map the input data instead of reading it with cdms2 (uncompressed files only) [default: False]")
     
     args = parser.parse_args()            
 
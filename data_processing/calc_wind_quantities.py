@@ -10,7 +10,9 @@ Reference:    Uses the windspharm package: ajdawson.github.com/windspharm/index.
 
 import sys, os
 import argparse
+import itertools
 import numpy
+import cdms2
 from windspharm.cdms import VectorWind
 import pdb
 
@@ -60,6 +62,12 @@ var_atts['absolutevorticity'] = {'id': 'avrt',
     'units': '1.e-5 s-1',
     'notes': 'windspharm absolutevorticity(), http://ajdawson.github.com/windspharm/index.html'}
 
+var_atts['absolutevorticitygradient'] = {'id': 'avrtgrad',
+    'standard_name': 'absolute_vorticity_gradient',
+    'long_name': 'Magnitude of the absolute vorticity gradient',
+    'units': '1.e-5 m-1 s-1',
+    'notes': 'calculated using windspharm - http://ajdawson.github.com/windspharm/index.html'}
+
 var_atts['planetaryvorticity'] = {'id': 'pvrt',
     'standard_name': 'planetary_vorticity',
     'long_name': 'Planetary Vorticity (Coriolis parameter)',
@@ -121,10 +129,41 @@ var_atts['rossbywavesource2'] = {'id': 'rws2',
     'notes': 'calculated using windspharm - http://ajdawson.github.com/windspharm/index.html'}
 
 
-def calc_quantity(uwnd, vwnd, quantity):
-    """Calculates a single wind quantity using windspharm (ajdawson.github.com/windspharm/index.html)"""
-    
+def calc_quantities(uwnd, vwnd, quantities):
+    """Calculate one or more wind quantities from a single windspharm 
+    VectorWind instance (i.e. the spherical harmonic analysis of the
+    wind is only done once).
+
+    Returns a list of the output data and a list of the 
+    corresponding output variable attributes.
+
+    """
+
     w = VectorWind(uwnd, vwnd)
+
+    outdata_list = []
+    outvar_atts_list = []
+    for quantity in quantities:
+        data_out = calc_quantity(w, quantity)
+
+        if (type(data_out) == dict) and ('u' in data_out.keys()):
+            outdata_list.extend([data_out['u'], data_out['v']])
+            outvar_atts_list.extend([var_atts[quantity, 'u'], var_atts[quantity, 'v']])
+        elif (type(data_out) == dict) and ('rws' in data_out.keys()):
+            outdata_list.extend([data_out['rws'], data_out['rws1'], data_out['rws2']])
+            outvar_atts_list.extend([var_atts['rossbywavesource'], 
+                                     var_atts['rossbywavesource1'],
+                                     var_atts['rossbywavesource2']])
+        else:
+            outdata_list.append(data_out)
+            outvar_atts_list.append(var_atts[quantity])
+
+    return outdata_list, outvar_atts_list
+
+
+def calc_quantity(w, quantity):
+    """Calculates a single wind quantity from a windspharm 
+    VectorWind instance (ajdawson.github.com/windspharm/index.html)"""
     
     if quantity == 'rossbywavesource':
 	eta = w.absolutevorticity()
@@ -181,51 +220,64 @@ def calc_quantity(uwnd, vwnd, quantity):
 
     return data_out
 
+
+def has_time_axis(infile, var_id):
+    """Check whether an input file variable has a time axis"""
+
+    fin = cdms2.open(infile)
+    order = fin[var_id].getOrder()
+    fin.close()
+
+    return 't' in order
+
     
 def main(inargs):
     """Run the program"""
 
-    # Read the input data #
+    assert len(set(inargs.quantity)) == len(inargs.quantity), 'Each quantity can only be requested once'
+
+    # Read the input data (one time chunk at a time) #
+
+    kwargs = nio.dict_filter(vars(inargs), ['time', 'region', 'latitude', 'longitude'])
+    if inargs.chunk_size and has_time_axis(inargs.infileu, inargs.varu):
+        data_u = nio.InputDataStream(inargs.infileu, inargs.varu, chunk_size=inargs.chunk_size, **kwargs)
+        data_v = nio.InputDataStream(inargs.infilev, inargs.varv, chunk_size=inargs.chunk_size, **kwargs)
+        assert len(data_u.time_indexes) == len(data_v.time_indexes), \
+        'The U and V input data must have the same time axis'
+        wind_chunks = itertools.izip(data_u, data_v)
+    else:
+        data_u = nio.InputData(inargs.infileu, inargs.varu, **kwargs)
+        data_v = nio.InputData(inargs.infilev, inargs.varv, **kwargs)
+        wind_chunks = [(data_u.data, data_v.data)]
 
-    data_u = nio.InputData(inargs.infileu, inargs.varu, 
-                           **nio.dict_filter(vars(inargs), ['time', 'region', 'latitude', 'longitude']))
-    data_v = nio.InputData(inargs.infilev, inargs.varv, 
-                           **nio.dict_filter(vars(inargs), ['time', 'region', 'latitude', 'longitude']))
+    for chunk_number, (uwnd, vwnd) in enumerate(wind_chunks):
 
-    # Check that the input data are all on the same coordinate axes #
+        # Check that the input data are all on the same coordinate axes #
 
-    nio.xy_axis_check(data_u.data.getLatitude(), data_v.data.getLatitude())
-    nio.xy_axis_check(data_u.data.getLongitude(), data_v.data.getLongitude())
-    if 't' in data_u.data.getOrder():
-        nio.time_axis_check(data_u.data.getTime(), data_v.data.getTime())
+        nio.xy_axis_check(uwnd.getLatitude(), vwnd.getLatitude())
+        nio.xy_axis_check(uwnd.getLongitude(), vwnd.getLongitude())
+        if 't' in uwnd.getOrder():
+            nio.time_axis_check(uwnd.getTime(), vwnd.getTime())
     
-    # Calculate the desired quantity #
+        # Calculate the desired quantities #
     
-    data_out = calc_quantity(data_u.data, data_v.data, inargs.quantity)
-
-    # Write output file #
-
-    indata_list = [data_u, data_v,]
-    if (type(data_out) == dict) and ('u' in data_out.keys()):
-        outdata_list = [data_out['u'], data_out['v'],]
-        outvar_atts_list = [var_atts[inargs.quantity, 'u'], var_atts[inargs.quantity, 'v'],]
-	outvar_axes_list = [data_u.data.getAxisList()] * 2
-    elif (type(data_out) == dict) and ('rws' in data_out.keys()):
-        outdata_list = [data_out['rws'], data_out['rws1'], data_out['rws2']]
-        outvar_atts_list = [var_atts['rossbywavesource'], 
-	                    var_atts['rossbywavesource1'],
-			    var_atts['rossbywavesource2']]
-	outvar_axes_list = [data_u.data.getAxisList()] * 3
-    else:
-        outdata_list = [data_out,]
-        outvar_atts_list = [var_atts[inargs.quantity],]
-        outvar_axes_list = [data_u.data.getAxisList(),]
-
-    nio.write_netcdf(inargs.outfile, " ".join(sys.argv), 
-                     data_u.global_atts, 
-                     outdata_list,
-                     outvar_atts_list, 
-                     outvar_axes_list)
+        outdata_list, outvar_atts_list = calc_quantities(uwnd, vwnd, inargs.quantity)
+        outvar_axes_list = [uwnd.getAxisList()] * len(outdata_list)
+
+        # Write output file (the first chunk creates it, subsequent chunks extend it) #
+
+        if chunk_number == 0:
+            nio.write_netcdf(inargs.outfile, " ".join(sys.argv), 
+                             data_u.global_atts, 
+                             outdata_list,
+                             outvar_atts_list, 
+                             outvar_axes_list,
+                             unlimited_time=True)
+        else:
+            nio.append_netcdf(inargs.outfile, outdata_list,
+                              [atts['id'] for atts in outvar_atts_list],
+                              outvar_axes_list,
+                              update_history=False)
 
     
 if __name__ == '__main__':
@@ -248,6 +300,12 @@ wind quantities:
 note:
   The input data can have no missing values
 
+  Multiple quantities can be calculated at once, in which case they are all
+  calculated from the same spherical harmonic analysis of the wind and written
+  to the one output file. The data are processed --chunk_size time steps at a 
+  time, which bounds the memory usage (input data with no time axis are 
+  processed all at once).
+
 reference:
   Uses the windspharm package: http://ajdawson.github.com/windspharm/intro.html
 
@@ -257,6 +315,12 @@ example (vortex.earthsci.unimelb.edu.au):
   va_Merra_250hPa_monthly_native.nc va
   sf_Merra_250hPa_monthly_native.nc
 
+  /usr/local/uvcdat/1.3.0/bin/cdat calc_wind_quantities.py streamfunction velocitypotential 
+  vorticity divergence rossbywavesource
+  ua_Merra_250hPa_daily_native.nc ua
+  va_Merra_250hPa_daily_native.nc va
+  wind-quantities_Merra_250hPa_daily_native.nc
+
 author:
   Damien Irving, d.irving@student.unimelb.edu.au
 
@@ -269,7 +333,7 @@ author:
                                      argument_default=argparse.SUPPRESS,
                                      formatter_class=argparse.RawDescriptionHelpFormatter)
 
-    parser.add_argument("quantity", type=str, help="Quantity to calculate",
+    parser.add_argument("quantity", type=str, nargs='+', help="Quantity (or quantities) to calculate",
                         choices=['magnitude', 'vorticity', 'divergence', 'absolutevorticity', 
 			         'absolutevorticitygradient', 'planetaryvorticity',
                                  'irrotationalcomponent', 'nondivergentcomponent', 
@@ -288,6 +352,8 @@ author:
                         help="Longitude range [default = entire]")
     parser.add_argument("--time", type=str, nargs=3, metavar=('START_DATE', 'END_DATE', 'MONTHS'),
                         help="Time period [default = entire]")
+    parser.add_argument("--chunk_size", type=int, default=365,
+                        help="Number of time steps processed at a time (0 = entire record) [default = 365]")
 
     args = parser.parse_args()  
     
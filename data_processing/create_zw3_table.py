@@ -124,8 +124,8 @@ note:
     
     parser.add_argument("outfile", type=str, help="Output file name")
     
-    parser.add_argument("--lat_range", type=float, default=[-70, -40],
-                        help="Latitude range to select from the fourier file")                    
+    parser.add_argument("--lat_range", type=float, nargs=2, metavar=('SOUTH', 'NORTH'), default=[-70, -40],
+                        help="Latitude range to select from the fourier file [default = -70 -40]")                    
 
     
     args = parser.parse_args()             
@@ -3,7 +3,6 @@
 import os, sys, re, pdb
 from collections import OrderedDict
 
-import operator
 import numpy
 import pandas
 
@@ -11,9 +10,6 @@ import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 
-from itertools import groupby
-from operator import itemgetter
-
 from datetime import datetime
 from dateutil.rrule import *
 from dateutil.relativedelta import relativedelta
@@ -52,38 +48,59 @@ def add_duration(DataFrame, metric, metric_threshold):
     
     Note that every timestep is assigned a duration value equal to the number of
     days in the entire event.
+
+    If metric_threshold is a list of thresholds, a duration and event column is 
+    added for each (e.g. duration_5.0 and event_5.0 for a threshold of 5.0).
     
     """
 
-    events = DataFrame[metric].map(lambda x: x > metric_threshold)
-    event_list = events.tolist()
-    grouped_events = [(k, sum(1 for i in g)) for k,g in groupby(event_list)]
-
-    duration = []
-    for event in grouped_events:
-        if event[0]:
-            data = [event[1]] * event[1]
-        else:
-            data = [0] * event[1]
-        duration.append(data)
+    values = DataFrame[metric].values
 
-    DataFrame['duration'] = reduce(operator.add, duration)
-    DataFrame['event'] = events
+    if isinstance(metric_threshold, (list, tuple, numpy.ndarray)):
+        for threshold in metric_threshold:
+            events, duration = event_duration(values, threshold)
+            DataFrame['duration_'+str(threshold)] = duration
+            DataFrame['event_'+str(threshold)] = events
+    else:
+        events, duration = event_duration(values, metric_threshold)
+        DataFrame['duration'] = duration
+        DataFrame['event'] = events
 
     return DataFrame  
+
+
+def event_duration(values, threshold):
+    """Identify events (consecutive values greater than the threshold) 
+    and return the duration of the event at each timestep (zero for 
+    timesteps that are not part of an event).
+
+    The events are found by run-length encoding, so the calculation
+    is linear in the number of timesteps.
+
+    """
+
+    events = numpy.asarray(values) > threshold
+
+    changes = numpy.diff(numpy.concatenate(([0], events.astype(numpy.int8), [0])))
+    starts = numpy.nonzero(changes == 1)[0]
+    ends = numpy.nonzero(changes == -1)[0]
+
+    event_number = numpy.cumsum(changes[:-1] == 1) * events  # 1, 2, ... for each event (0 = no event)
+    event_lengths = numpy.concatenate(([0], ends - starts))
+    duration = event_lengths[event_number]
+
+    return events, duration
     
 
-def basic_stats(DataFrame, stats, before_filtering=True):
+def basic_stats(DataFrame, stats, heading, duration_column='duration'):
     """Return basic statistics (for printing to the screen)"""
     
-    if before_filtering:
-        stats.append('# Before filtering')     
-    else:
+    if stats:
         stats.append(' ') 
-        stats.append('# After filtering')
+    stats.append('# ' + heading)
          
-    stats.append('total number of days: ' + str(len(DataFrame['duration'])))
-    stats = duration_stats(DataFrame['duration'].tolist(), stats)
+    stats.append('total number of days: ' + str(len(DataFrame[duration_column])))
+    stats = duration_stats(DataFrame[duration_column].tolist(), stats)
 
     return stats
 
@@ -324,7 +341,7 @@ def main(inargs):
     
     # Add relevant columns
     indata = add_duration(indata, inargs.metric, metric_threshold)
-    stats = basic_stats(indata, [], before_filtering=True)    
+    stats = basic_stats(indata, [], 'Before filtering')    
 
     # Apply filters
     dt_selector = aconv.pandas_dt_selector(indata.index, inargs.season, inargs.start, inargs.end)
@@ -346,7 +363,14 @@ def main(inargs):
     data = indata[selector]
 
     # Print basic stats to screen
-    stats = basic_stats(data, stats, before_filtering=False)
+    stats = basic_stats(data, stats, 'After filtering')
+
+    if inargs.threshold_sweep:
+        sweep_thresholds = [uconv.get_threshold(indata[inargs.metric], threshold) for threshold in inargs.threshold_sweep]
+        sweep_data = add_duration(indata.copy(), inargs.metric, sweep_thresholds)
+        for threshold_str, threshold in zip(inargs.threshold_sweep, sweep_thresholds):
+            heading = 'Before filtering, threshold %s (%s)' %(threshold_str, str(threshold))
+            stats = basic_stats(sweep_data, stats, heading, duration_column='duration_'+str(threshold))
 
     for line in stats:
         print line
@@ -432,6 +456,8 @@ author:
                         help="Keep values greater or less than the threshold.")
     parser.add_argument("--duration_filter", type=float, nargs=2, default=None, metavar=('MIN', 'MAX'),
                         help="Duration filter - only events of length equal to or within these bounds are included")
+    parser.add_argument("--threshold_sweep", type=str, nargs='*', default=None,
+                        help="Also print the duration statistics (before filtering) for each of these thresholds (e.g. 80pct 90pct 95pct)")
                         
     # Optional outputs
     parser.add_argument("--plot_name", type=str, default=None, 
@@ -0,0 +1,161 @@
+"""
+Filename:     zw3_workflow.py
+Author:       Damien Irving, d.irving@student.unimelb.edu.au
+Description:  Run the wave envelope / ZW3 processing chain
+              (calc_vwind_rotation -> calc_envelope -> calc_hovmoller
+              -> calc_wave_stats -> parse_wave_stats / create_zw3_table)
+              for one or more latitude bands, only rerunning the steps
+              that are out of date (see modules/workflow.py)
+
+"""
+
+# Import general Python modules #
+
+import sys, os, pdb
+import argparse
+
+# Import my modules #
+
+cwd = os.getcwd()
+repo_dir = '/'
+for directory in cwd.split('/')[1:]:
+    repo_dir = os.path.join(repo_dir, directory)
+    if directory == 'phd':
+        break
+
+modules_dir = os.path.join(repo_dir, 'modules')
+sys.path.append(modules_dir)
+
+try:
+    import workflow
+except ImportError:
+    raise ImportError('Must run this script from anywhere within the phd git repo')
+
+
+# Define functions #
+
+def lat_label(south, north):
+    """Return a latitude band label (e.g. lat70S40N)"""
+
+    label = lambda lat: '%i%s' %(abs(lat), 'S' if lat < 0 else 'N')
+
+    return 'lat%s%s' %(label(south), label(north))
+
+
+def define_workflow(inargs):
+    """Define the workflow steps."""
+
+    script = lambda name: os.path.join(repo_dir, 'data_processing', name)
+    outfile = lambda name: os.path.join(inargs.outdir, name)
+    prefix = 'w%i%i' %tuple(inargs.wavenumbers)
+
+    wf = workflow.Workflow()
+
+    vrot = outfile('vrot_np%i-%i.nc' %tuple(inargs.north_pole))
+    wf.add(workflow.Step(script('calc_vwind_rotation.py'),
+                         [inargs.ua_file, 'ua', inargs.va_file, 'va', vrot, '--north_pole'] + inargs.north_pole,
+                         [inargs.ua_file, inargs.va_file], [vrot]))
+
+    env = outfile('env-%s_%s' %(prefix, os.path.basename(vrot)))
+    wf.add(workflow.Step(script('calc_envelope.py'),
+                         [vrot, 'vrot', env, '--wavenumbers'] + inargs.wavenumbers,
+                         [vrot], [env]))
+
+    # Independent branch for each latitude band #
+
+    for south, north in zip(inargs.lat_bands[0::2], inargs.lat_bands[1::2]):
+        band = lat_label(south, north)
+
+        hov = outfile('hov-%s_%s' %(band, os.path.basename(env)))
+        wf.add(workflow.Step(script('calc_hovmoller.py'),
+                             [env, 'env', 'absolute', inargs.clip_threshold, hov, '--latitude', south, north],
+                             [env], [hov]))
+
+        stats = outfile('wavestats-threshold%s_%s' %(inargs.threshold, os.path.basename(hov)))
+        wf.add(workflow.Step(script('calc_wave_stats.py'),
+                             [hov, 'env', stats, '--threshold', inargs.threshold],
+                             [hov], [stats]))
+
+        dates = outfile('dates-%s_%s.txt' %(inargs.metric, os.path.splitext(os.path.basename(stats))[0]))
+        wf.add(workflow.Step(script('parse_wave_stats.py'),
+                             [stats, inargs.metric, '--date_list', dates],
+                             [stats], [dates]))
+
+        if inargs.zw3_file and inargs.fourier_file:
+            table = outfile('table_%s.csv' %(os.path.splitext(os.path.basename(stats))[0]))
+            wf.add(workflow.Step(script('create_zw3_table.py'),
+                                 [stats, inargs.zw3_file, inargs.fourier_file, table, '--lat_range', south, north],
+                                 [stats, inargs.zw3_file, inargs.fourier_file], [table]))
+
+    return wf
+
+
+def main(inargs):
+    """Run the program."""
+
+    assert len(inargs.lat_bands) % 2 == 0, \
+    'Latitude bands must be given as pairs (e.g. -70 -40 -60 -30)'
+
+    wf = define_workflow(inargs)
+    failed = wf.run(nprocs=inargs.nprocs, force=inargs.force, dry_run=inargs.dry_run)
+
+    if failed:
+        sys.exit('The following steps failed or were not run: \n' + '\n'.join([step.name for step in failed]))
+
+
+if __name__ == '__main__':
+
+    extra_info ="""
+example (vortex.earthsci.unimelb.edu.au):
+  /usr/local/uvcdat/1.3.0/bin/cdat zw3_workflow.py
+  ua_ERAInterim_500hPa_daily_native.nc va_ERAInterim_500hPa_daily_native.nc
+  /mnt/meteo0/data/simmonds/dbirving/ERAInterim/data/zw3
+  --lat_bands -70 -40 -60 -30 --nprocs 2 --dry_run
+
+notes:
+  A step is rerun if an output is missing or older than its inputs,
+  or if the command line or code (git hash) recorded in the history
+  attribute (or .met file) of its output differs from the current one.
+
+author:
+  Damien Irving, d.irving@student.unimelb.edu.au
+
+"""
+
+    description='Run the wave envelope / ZW3 processing chain'
+    parser = argparse.ArgumentParser(description=description,
+                                     epilog=extra_info,
+                                     argument_default=argparse.SUPPRESS,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    parser.add_argument("ua_file", type=str, help="Input zonal wind file (variable ua)")
+    parser.add_argument("va_file", type=str, help="Input meridional wind file (variable va)")
+    parser.add_argument("outdir", type=str, help="Output directory")
+
+    parser.add_argument("--zw3_file", type=str, default=None,
+                        help="ZW3 index file (if given with --fourier_file, the ZW3 table is created)")
+    parser.add_argument("--fourier_file", type=str, default=None,
+                        help="Fourier coefficients file")
+    parser.add_argument("--north_pole", type=float, nargs=2, metavar=('LAT', 'LON'), default=[90.0, 0.0],
+                        help="Location of north pole [default = (90, 0)]")
+    parser.add_argument("--wavenumbers", type=int, nargs=2, metavar=('LOWER', 'UPPER'), default=[5, 7],
+                        help="Wavenumber range for the envelope [default = (5, 7)]")
+    parser.add_argument("--lat_bands", type=float, nargs='*', default=[-70, -40],
+                        help="Pairs of south and north bounds of the latitude bands [default = -70 -40]")
+    parser.add_argument("--clip_threshold", type=float, default=0.0,
+                        help="Absolute clipping threshold for the Hovmoller diagram [default = 0.0]")
+    parser.add_argument("--threshold", type=str, default='75pct',
+                        help="Threshold for the extent calculation [default = 75pct]")
+    parser.add_argument("--metric", type=str, default='extent',
+                        help="Metric used to filter the dates [default = extent]")
+
+    parser.add_argument("--nprocs", type=int, default=1,
+                        help="Number of steps that can run at once [default = 1]")
+    parser.add_argument("--force", action="store_true", default=False,
+                        help="Rerun every step")
+    parser.add_argument("--dry_run", action="store_true", default=False,
+                        help="Report which steps would be run, without running them")
+
+    args = parser.parse_args()
+
+    main(args)
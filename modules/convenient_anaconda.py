@@ -108,11 +108,11 @@ def nc_to_df(infile, var_list, lat=None):
 
     time_axis = indata.data.getTime().asComponentTime()
     data = numpy.zeros((len(time_axis), len(var_list)))
-    data[:, 0] = numpy.array(indata.data)
+    data[:, 0] = indata.data
     headers = [var_list[0]] 
     for i, var in enumerate(var_list[1:]):
         indata = nio.InputData(infile, var, **nio.dict_filter(options, ['latitude', 'mermax', 'spatave']))
-        data[:, i+1] = numpy.array(indata.data)
+        data[:, i+1] = indata.data
         headers.append(var)
 
     output = pandas.DataFrame(data, index=map(lambda x: gio.standard_datetime(x), time_axis), columns=headers)
@@ -2,13 +2,26 @@
 
 Included functions:
 adjust_lon_range     -- Express longitude values in desired 360 degree interval
+calc_field_mean      -- Calculate the area weighted mean over latitude and longitude
+calc_group_anomaly   -- Subtract (and divide by) the climatology of each time step's group
+calc_group_climatology -- Calculate the mean and standard deviation of each time group
+get_pval_atts        -- Define the attributes of a significance test p-value
+get_significance     -- Perform significance test
+get_significance_from_stats -- Perform significance test using accumulated RunningStats
 get_threshold        -- Turn the user input threshold into a numeric threshold
+get_time_groups      -- Month of year or day of year index of each time step
+select_lonlat_box    -- Select the data within a longitude/latitude box
 single2list          -- Check if item is a list, then convert if not
+ttest_ind_from_stats -- Independent two sample t-test from accumulated RunningStats
+
+Included classes:
+RunningStats         -- Running (chunk by chunk) mean and variance
 
 """
 
 import numpy
 from scipy import stats
+from scipy import sparse
 import pdb, re
 
 
@@ -44,7 +57,7 @@ def adjust_lon_range(lons, radians=True, start=0.0):
 
 def get_significance(data_subset, data_all, 
                      p_var, p_standard_name,
-                     size_subset, size_all):
+                     size_subset, size_all, equal_var=True):
     """Perform significance test.
 
     size_subset and size_all can either be a variable name (and the variable 
@@ -58,11 +71,11 @@ def get_significance(data_subset, data_all,
     
     http://stackoverflow.com/questions/21494141/how-do-i-do-a-f-test-in-python
 
-    FIXME: If equal_var=False then it will perform a Welch's t-test, which is for samples
-    with unequal variance (early versions of scipy don't have this option). To test whether
-    the variances are equal or not you use an F-test (i.e. do the test at each grid point and
-    then assign equal_var accordingly). If your data is close to normally distributed you can 
-    use the Barlett test (scipy.stats.bartlett), otherwise the Levene test (scipy.stats.levene).
+    If equal_var=False a Welch's t-test is performed, which is for samples
+    with unequal variance. To test whether the variances are equal or not you 
+    use an F-test (i.e. do the test at each grid point and then assign equal_var 
+    accordingly). If your data is close to normally distributed you can use the 
+    Barlett test (scipy.stats.bartlett), otherwise the Levene test (scipy.stats.levene).
     
     FIXME: I need to account for autocorrelation in the data by calculating an effective
     sample size (see Wilkes, p 147). I can get the autocorrelation using either
@@ -72,6 +85,10 @@ def get_significance(data_subset, data_all,
     FIXME: I also need to consider whether a parametric t-test is appropriate. One of my samples
     might be very non-normally distributed, which means a non-parametric test might be better. 
     
+    To avoid holding the entire data samples in memory, accumulate a 
+    RunningStats instance for each sample (chunk by chunk) and pass them 
+    to get_significance_from_stats instead.
+
     """
 
 #    alpha = 0.05 
@@ -81,18 +98,34 @@ def get_significance(data_subset, data_all,
 #    else:
 #        equal_var = True
 
+    stats_subset = RunningStats()
+    stats_subset.update(data_subset)
+    
+    stats_all = RunningStats()
+    stats_all.update(data_all)
+
+    return get_significance_from_stats(stats_subset, stats_all, p_var, p_standard_name,
+                                       size_subset, size_all, equal_var=equal_var)
+
+
+def get_significance_from_stats(stats_subset, stats_all, 
+                                p_var, p_standard_name,
+                                size_subset, size_all, equal_var=True):
+    """Perform significance test, using the accumulated RunningStats 
+    for the subsetted and entire data samples.
+
+    The output is the same as for get_significance.
+
+    """
+
     assert type(size_subset) == type(size_all)
     assert type(size_subset) in [str, float, int]
 
-    t, pvals = stats.mstats.ttest_ind(data_subset, data_all, axis=0) # stats.ttest_ind has an equal_var option that mstats does not
-    print 'WARNING: Significance test assumed equal variances'
+    t, pvals = ttest_ind_from_stats(stats_subset, stats_all, equal_var=equal_var)
+    if equal_var:
+        print 'WARNING: Significance test assumed equal variances'
 
-    pval_atts = {'id': p_var,
-                 'standard_name': p_standard_name,
-                 'long_name': p_standard_name,
-                 'units': ' ',
-                 'notes': """Two-tailed p-value from standard independent two sample t-test comparing the subsetted data (size=%s) to a sample containing all the data (size=%s)""" %(str(size_subset), str(size_all)),
-                 'reference': 'scipy.stats.ttest_ind(a, b, axis=t, equal_var=False)'}
+    pval_atts = get_pval_atts(p_var, p_standard_name, size_subset, size_all, equal_var=equal_var)
 
     if type(size_subset) == str:
 
@@ -115,6 +148,100 @@ def get_significance(data_subset, data_all,
         return pvals, pval_atts
 
 
+def calc_group_anomaly(data, groups, mean, std=None):
+    """Subtract the climatological mean of each time step's group 
+    (and optionally divide by the climatological standard deviation).
+
+    Arguments:
+      data   -- Array with time as the first axis
+      groups -- Group index of each time step (see get_time_groups)
+      mean   -- Climatological mean of each group (see calc_group_climatology)
+      std    -- Climatological standard deviation of each group
+
+    """
+
+    groups = numpy.asarray(groups, dtype=int)
+
+    anomaly = numpy.ma.subtract(data, mean[groups])
+    if std is not None:
+        anomaly = numpy.ma.divide(anomaly, std[groups])
+
+    return anomaly
+
+
+def calc_field_mean(data, lats):
+    """Calculate the area weighted mean over the last two (latitude, longitude) 
+    axes of data, where lats are the latitude values (in degrees).
+
+    The weights are proportional to the cosine of latitude (i.e. the grid cell 
+    area for a regular grid). Missing values can be masked. 
+
+    """
+
+    data = numpy.ma.masked_array(data, dtype=numpy.float64)
+    weights = numpy.cos(numpy.deg2rad(numpy.asarray(lats, dtype=numpy.float64)))[:, numpy.newaxis]
+    weights = weights * ~numpy.ma.getmaskarray(data)
+
+    total = (weights * data.filled(0.0)).sum(axis=-1).sum(axis=-1)
+    total_weight = weights.sum(axis=-1).sum(axis=-1)
+
+    return numpy.ma.masked_where(total_weight == 0, total) / numpy.ma.masked_equal(total_weight, 0)
+
+
+def calc_group_climatology(data, groups, ngroups, ddof=0):
+    """Calculate the mean and standard deviation of each group 
+    (e.g. each month of the year) along the first (time) axis of data.
+
+    Arguments:
+      data    -- Array with time as the first axis (missing values can be masked)
+      groups  -- Group index (0 to ngroups - 1) of each time step (see get_time_groups)
+      ngroups -- Number of groups (e.g. 12 for a monthly climatology)
+      ddof    -- Delta degrees of freedom for the standard deviation 
+
+    Returns masked arrays of shape (ngroups, ...), where groups 
+    with no (or insufficient) data are masked. The reductions 
+    are all done with a single sparse group membership matrix, 
+    so the time series can start in any month and the groups 
+    needn't be regularly spaced.
+
+    """
+
+    groups = numpy.asarray(groups, dtype=int)
+    data = numpy.ma.masked_array(data, dtype=numpy.float64)
+    ntime = data.shape[0]
+    assert len(groups) == ntime, 'There must be a group index for each time step'
+
+    flat_data = data.reshape((ntime, -1))
+    valid = ~numpy.ma.getmaskarray(flat_data)
+    values = flat_data.filled(0.0)
+
+    membership = sparse.csr_matrix((numpy.ones(ntime), (groups, numpy.arange(ntime))), shape=(ngroups, ntime))
+    count = membership.dot(valid.astype(numpy.float64))
+    mean = membership.dot(values) / numpy.where(count > 0, count, 1.0)
+    sum_sq_dev = membership.dot(((values - mean[groups]) * valid)**2)
+
+    std = numpy.ma.sqrt(sum_sq_dev / (numpy.ma.masked_less_equal(count, ddof) - ddof))
+    mean = numpy.ma.masked_where(count == 0, mean)
+
+    out_shape = (ngroups,) + data.shape[1:]
+
+    return numpy.ma.reshape(mean, out_shape), numpy.ma.reshape(std, out_shape)
+
+
+def get_pval_atts(p_var, p_standard_name, size_subset, size_all, equal_var=True):
+    """Define the attributes of the p-value output by get_significance"""
+
+    test_name = 'standard independent two sample t-test' if equal_var else "Welch's t-test"
+    pval_atts = {'id': p_var,
+                 'standard_name': p_standard_name,
+                 'long_name': p_standard_name,
+                 'units': ' ',
+                 'notes': """Two-tailed p-value from %s comparing the subsetted data (size=%s) to a sample containing all the data (size=%s)""" %(test_name, str(size_subset), str(size_all)),
+                 'reference': 'scipy.stats.ttest_ind(a, b, axis=t, equal_var=%s)' %(str(equal_var))}
+
+    return pval_atts
+
+
 def get_threshold(data, threshold_str, axis=None):
     """Turn the user input threshold into a numeric threshold"""
     
@@ -127,6 +254,162 @@ def get_threshold(data, threshold_str, axis=None):
     return threshold_float
 
 
+class RunningStats:
+    """Running mean and variance at each point of a data sample, 
+    accumulated one chunk (along the first axis) at a time.
+
+    Chunks are combined using the parallel form of Welford's algorithm
+    (Chan et al, 1979), which avoids the loss of precision associated 
+    with accumulating sums of squares. 
+
+    """
+
+    def __init__(self):
+        """Initialise the accumulators."""
+
+        self.count = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.size = 0
+
+
+    def update(self, data, weights=None):
+        """Add a chunk of data (missing values can be masked).
+
+        Arguments:
+          weights -- Number of times each data value is counted (e.g. 0 or 1 
+                     to select a subset). Either an array of the same shape as
+                     data or with one value for each index along the first axis.
+        
+        Data that are constant at all points (e.g. a timeseries used 
+        at every grid point) can be passed with shape (n, 1, 1, ...).
+
+        """
+
+        data = numpy.ma.masked_array(data, dtype=numpy.float64)
+        weights = numpy.ones(data.shape[0:1]) if weights is None else numpy.asarray(weights, dtype=numpy.float64)
+        if weights.ndim == 1:
+            self.size = self.size + int(weights.sum())
+            weights = weights.reshape(weights.shape + (1,) * (data.ndim - 1))
+
+        values = data.filled(0.0)
+        weights = weights * ~numpy.ma.getmaskarray(data)
+
+        chunk_count = weights.sum(axis=0)
+        chunk_mean = (weights * values).sum(axis=0) / numpy.where(chunk_count > 0, chunk_count, 1.0)
+        chunk_m2 = (weights * (values - chunk_mean)**2).sum(axis=0)
+
+        count = self.count + chunk_count
+        delta = chunk_mean - self.mean
+        ratio = chunk_count / numpy.where(count > 0, count, 1.0)
+
+        self.mean = self.mean + delta * ratio
+        self.m2 = self.m2 + chunk_m2 + delta**2 * self.count * ratio
+        self.count = count
+
+
+    def get_mean(self):
+        """Return the sample mean (masked where there are no data)."""
+
+        return numpy.ma.masked_where(self.count * numpy.ones(numpy.shape(self.mean)) == 0, self.mean)
+
+
+    def get_variance(self, ddof=1):
+        """Return the sample variance (masked where there are insufficient data)."""
+
+        count = numpy.ma.masked_less_equal(self.count, ddof)
+
+        return self.m2 / (count - ddof)
+
+
+def ttest_ind_from_stats(stats_a, stats_b, equal_var=True):
+    """Two-sided independent two sample t-test, calculated from 
+    the RunningStats of each sample.
+
+    Gives the same t statistics and p-values as scipy.stats.ttest_ind 
+    (or scipy.stats.mstats.ttest_ind for masked data).
+
+    Arguments:
+      equal_var -- True  => standard t-test (assumes equal population variances)
+                   False => Welch's t-test
+
+    """
+
+    n_a = numpy.ma.masked_less_equal(stats_a.count, 1)
+    n_b = numpy.ma.masked_less_equal(stats_b.count, 1)
+    var_a = stats_a.get_variance()
+    var_b = stats_b.get_variance()
+    
+    if equal_var:
+        df = n_a + n_b - 2.0
+        pooled_var = ((n_a - 1) * var_a + (n_b - 1) * var_b) / df
+        denom = numpy.ma.sqrt(pooled_var * (1.0 / n_a + 1.0 / n_b))
+    else:
+        vn_a = var_a / n_a
+        vn_b = var_b / n_b
+        df = (vn_a + vn_b)**2 / (vn_a**2 / (n_a - 1) + vn_b**2 / (n_b - 1))
+        denom = numpy.ma.sqrt(vn_a + vn_b)
+
+    t = (stats_a.get_mean() - stats_b.get_mean()) / denom
+    t = numpy.ma.masked_invalid(t)
+    df = numpy.ma.masked_invalid(df * numpy.ones(t.shape))
+    
+    pvals = 2 * stats.t.sf(numpy.ma.abs(t).filled(1.0), df.filled(1.0))
+    pvals = numpy.ma.masked_array(pvals, mask=numpy.ma.getmaskarray(t) | numpy.ma.getmaskarray(df))
+
+    return t, pvals
+
+
+def get_time_groups(months, days=None):
+    """Return the (zero based) month of the year of each time step, or
+    if days are provided, the day of the year relative to a 366 day year 
+    (i.e. Dec 31 is always index 365).
+
+    Arguments:
+      months -- Month (1-12) of each time step
+      days   -- Day of the month (1-31) of each time step
+
+    """
+
+    months = numpy.asarray(months, dtype=int)
+    if days is None:
+        return months - 1
+
+    month_start = numpy.array([0, 31, 60, 91, 121, 152, 182, 213, 244, 274, 305, 335])  # 366 day year
+
+    return month_start[months - 1] + numpy.asarray(days, dtype=int) - 1
+
+
+def select_lonlat_box(data, lats, lons, south_lat, north_lat, west_lon, east_lon):
+    """Select the data within a longitude/latitude box (inclusive of the 
+    boundaries), where the last two axes of data are latitude and longitude.
+
+    Like cdo sellonlatbox, the box can cross the 0/360 longitude boundary 
+    (e.g. west_lon=340, east_lon=20). 
+
+    data can be a cdms2 variable, but is converted to a numpy masked array 
+    (cdms2 indexing doesn't support boolean index arrays).
+
+    Returns the selected data, latitudes and longitudes.
+
+    """
+
+    data = numpy.ma.asarray(data)
+    lats = numpy.asarray(lats)
+    lons = numpy.asarray(lons)
+
+    lat_selection = (lats >= south_lat) & (lats <= north_lat)
+
+    width = east_lon - west_lon
+    if width <= 0:
+        width = width + 360.0
+    lon_selection = (lons - west_lon) % 360.0 <= min(width, 360.0)
+
+    subset = data[..., lat_selection, :][..., lon_selection]
+
+    return subset, lats[lat_selection], lons[lon_selection]
+
+
 def single2list(item, numpy_array=False):
     """Check if item is a list, then convert if not"""
     
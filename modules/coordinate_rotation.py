@@ -21,6 +21,10 @@ angular_distance
 rotation_angle
   --  Find angle of rotation between the old and new north pole.
 
+cached_calculation
+  --  Load the result of a calculation from an on-disk (.npz) cache, 
+      or perform the calculation and store the result.
+
 
 Required improvements:
 1. Many of the functions lack assertions (e.g. assert that the input is a 
@@ -35,6 +39,8 @@ Required improvements:
 
 import math
 import numpy
+import multiprocessing
+import hashlib
 
 import MV2
 import css
@@ -64,7 +70,7 @@ except ImportError:
 ## Switching between coordinate systems ##
 ##########################################
 
-def switch_regular_axes(data, lats_in, lons_in, lat_axis_out, lon_axis_out, new_np, pm_point=(0, 0), invert=False, euler=None):
+def switch_regular_axes(data, lats_in, lons_in, lat_axis_out, lon_axis_out, new_np, pm_point=(0, 0), invert=False, euler=None, nprocs=1, cache_dir=None):
     """Take data on a specified grid (lats_in, lons_in), rotate the axes 
     (according to the position of the new north pole) and regrid to 
     a new regular grid (lat_axis_out, lon_axis_out) 
@@ -75,21 +81,33 @@ def switch_regular_axes(data, lats_in, lons_in, lat_axis_out, lon_axis_out, new_
     
     lat_axis_out and lat_axis_in are simply axis values for a regular/uniform grid
     (i.e. together, they do not desribe coordinate pairs for every grid point)
+
+    For (time, lat, lon) data, nprocs > 1 splits the time steps across a 
+    pool of nprocs worker processes. The rotated grid is set up once, before
+    the workers are forked, and is shared with them (as is the input data).
+
+    If a cache_dir is given, the rotated grid point locations are stored 
+    there (see cached_calculation), so that repeat runs with the same input 
+    grid, output grid, new_np, pm_point and invert skip the spherical 
+    trigonometry. (The css triangulation is internal to css, so it is
+    always repeated.)
     
     References:
     The css package (http://www2-pcmdi.llnl.gov/cdat/contrib/csgriddoc) is based on the
     ngmath library (http://ngwww.ucar.edu/ngmath/)
     """
 
-    if euler: #override the north_pole_to_rotation_angles function
-        phi, theta, psi = euler
+    if cache_dir:
+        key_items = ['switch_regular_axes', lats_in, lons_in, lat_axis_out, lon_axis_out, new_np, pm_point, invert, euler]
+        lats_in_rot, lons_in_rot = cached_calculation(cache_dir, key_items, _rotate_grid, 
+                                                      lats_in, lons_in, new_np, pm_point, invert, euler)
     else:
-        phi, theta, psi = north_pole_to_rotation_angles(new_np[0], new_np[1], prime_meridian_point=pm_point)
-    
-    lats_in_rot, lons_in_rot = rotate_spherical(lats_in, lons_in, phi, theta, psi, invert=invert)
+        lats_in_rot, lons_in_rot = _rotate_grid(lats_in, lons_in, new_np, pm_point, invert, euler)
 
     grid_instance = css.Cssgrid(lats_in_rot, lons_in_rot, lat_axis_out, lon_axis_out)
-    if numpy.rank(data) == 3:    
+    if numpy.rank(data) == 3 and nprocs > 1:
+        data_rot = _parallel_regrid(grid_instance, data, nprocs)
+    elif numpy.rank(data) == 3:    
         data_rot = numpy.zeros(numpy.shape(data))
         for tstep in xrange(0, numpy.shape(data)[0]):
 	    regrid = grid_instance.rgrd(data[tstep, :, :].flatten())
@@ -101,6 +119,103 @@ def switch_regular_axes(data, lats_in, lons_in, lat_axis_out, lon_axis_out, new_
     return data_rot
 
 
+def _rotate_grid(lats_in, lons_in, new_np, pm_point, invert, euler):
+    """Rotate the input grid point locations (see switch_regular_axes)"""
+
+    if euler: #override the north_pole_to_rotation_angles function
+        phi, theta, psi = euler
+    else:
+        phi, theta, psi = north_pole_to_rotation_angles(new_np[0], new_np[1], prime_meridian_point=pm_point)
+    
+    return rotate_spherical(lats_in, lons_in, phi, theta, psi, invert=invert)
+
+
+# The grid instance and data shared with the worker processes 
+# (set before the pool is created, so they are inherited by each worker) 
+_shared_regrid = {}
+
+
+def _parallel_regrid(grid_instance, data, nprocs):
+    """Regrid each time step of data, with the time steps split
+    across a pool of nprocs worker processes.
+
+    The output order is the same as for a serial loop over the time steps. 
+    """
+
+    _shared_regrid['grid'] = grid_instance
+    _shared_regrid['data'] = data
+
+    ntime = numpy.shape(data)[0]
+    nchunks = min(ntime, nprocs * 4)
+    tstep_chunks = numpy.array_split(numpy.arange(ntime), nchunks)
+
+    pool = multiprocessing.Pool(nprocs)
+    try:
+        results = pool.map(_regrid_tsteps, tstep_chunks)
+    finally:
+        pool.close()
+        pool.join()
+        _shared_regrid.clear()
+    
+    return numpy.concatenate(results, axis=0)
+
+
+def _regrid_tsteps(tsteps):
+    """Regrid the selected time steps of the shared data (used by the worker processes)"""
+
+    grid_instance = _shared_regrid['grid']
+    data = _shared_regrid['data']
+
+    data_rot = []
+    for tstep in tsteps:
+        regrid = grid_instance.rgrd(numpy.array(data[tstep, :, :]).flatten())
+        data_rot.append(numpy.transpose(regrid))
+
+    return numpy.array(data_rot)
+
+
+#############
+## Caching ##
+#############
+
+def cached_calculation(cache_dir, key_items, func, *args, **kwargs):
+    """Return the output of func(*args, **kwargs), which must be a numpy 
+    array or tuple of numpy arrays. 
+    
+    The output is stored in cache_dir as a .npz file, with a name based on 
+    a hash of key_items (a list of arrays, numbers, strings etc that together 
+    uniquely define the calculation). If that file already exists the output 
+    is read from it instead of being calculated.
+    """
+
+    md5 = hashlib.md5()
+    for item in key_items:
+        if item is None or isinstance(item, (str, bool)):
+            md5.update(repr(item))
+        else:
+            values = numpy.ascontiguousarray(numpy.array(item, dtype=numpy.float64))
+            md5.update(repr(values.shape))
+            md5.update(values.tostring())
+    cache_file = os.path.join(cache_dir, 'rotation_%s.npz' %(md5.hexdigest()))
+
+    if os.path.isfile(cache_file):
+        cache = numpy.load(cache_file)
+        items = [cache['arr_%i' %(i)] for i in range(0, len(cache.files) - 1)]
+        return items[0] if cache['single'] else tuple(items)
+    
+    output = func(*args, **kwargs)
+    single = not isinstance(output, tuple)
+    items = [output,] if single else list(output)
+    
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    temp_file = cache_file.replace('.npz', '_%i.npz' %(os.getpid()))
+    numpy.savez(temp_file, *items, single=single)
+    os.rename(temp_file, cache_file)  # so that concurrent runs never read a partial file
+    
+    return output
+
+
 ###########################
 ## Numerical adjustments ##
 ###########################
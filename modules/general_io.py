@@ -12,6 +12,8 @@ read_dates        -- Read in a list of dates
 set_outfile_date  -- Take an outfile name and replace existing date with new one
 standard_datetime -- Convert any arbitrary date/time to standard format: YYYY-MM-DD
 write_dates       -- Write a list of dates
+write_metadata    -- Write a metadata output file
+write_profiles    -- Write processing profiles to a JSON file
 
 """
 
@@ -20,6 +22,7 @@ from datetime import datetime
 from dateutil import parser
 from collections import defaultdict
 import re
+import json
 
 try:
     from git import Repo 
@@ -70,7 +73,7 @@ def read_dates(infile):
         date_list.append(line.rstrip('\n'))
     fin.close()
 
-    file_body = infile.split('.')[0]
+    file_body = os.path.splitext(infile)[0]
     with open (file_body+'.met', 'r') as metfile:
         date_metadata=metfile.read()
 
@@ -108,7 +111,7 @@ def write_dates(outfile, date_list):
     fout.close()
 
 
-def write_metadata(ofile=None, file_info=None, extra_notes=None):
+def write_metadata(ofile=None, file_info=None, extra_notes=None, profiles=None):
     """Write a metadata output file
     
     Arguments:
@@ -116,6 +119,8 @@ def write_metadata(ofile=None, file_info=None, extra_notes=None):
                        alongside (i.e. new file with .met extension will be created)
       file_info    --  a dictionary where keys are filenames and values are the global attribute history
       extra_notes  --  list containing character strings of extra information (output is one list item per line)
+      profiles     --  list of processing profiles (netcdf_io.StageProfile instances), 
+                       which are written to a .profile.json file alongside the .met file 
       
     """
     
@@ -143,9 +148,23 @@ def write_metadata(ofile=None, file_info=None, extra_notes=None):
     
     # Create outfile or return string
     if ofile:
-        fname, extension = ofile.split('.')
+        fname, extension = os.path.splitext(ofile)
         fout = open(fname+'.met', 'w')
         fout.write(result) 
         fout.close()
+        if profiles:
+            write_profiles(fname+'.profile.json', profiles)
     else:
         return result
+
+
+def write_profiles(ofile, profiles):
+    """Write a list of processing profiles to a JSON file 
+    (see write_metadata)"""
+
+    output = {'timestamp': get_timestamp(),
+              'profiles': [profile.as_dict() for profile in profiles]}
+
+    fout = open(ofile, 'w')
+    json.dump(output, fout, indent=2)
+    fout.close()
@@ -7,16 +7,21 @@ module_dir = os.path.join(os.environ['HOME'], 'modules')
 sys.path.insert(0, module_dir)
 
 Included functions:
+append_netcdf        -- Append time steps to an existing output netCDF file
 convert_units        -- Convert units
 coordinate_pairs     -- Produce all lat/lon pairs for a given grid
+date_index           -- Map each (year, month, day) to its position in a time axis
 day_of_year_366      -- Convert a datetime instance to a day of the year (all years assumed 366)
+decode_time_axis     -- Decode a time axis into arrays of year, month, day etc
 dict_filter          -- Filter dictionary 
 get_datetime         -- Return datetime instances for list of dates/times
 hi_lo                -- Update highest and lowest value
 list_kwargs          -- List keyword arguments of a function
 match_dates          -- Take simple list of dates and match with corresponding more verbose list
+new_time_period      -- Find the input time steps that come after the end of an output file
 normalise_data       -- Normalise data ((x - mean) / std) along the time axis
 regrid_uniform       -- Regrid data to a uniform output grid
+regrid_weights       -- Sparse matrix of area weights for regridding between two grids
 running_average      -- Calculate running average
 scale_offset         -- Apply scaling and offset factors
 get_cdms2_tbounds    -- Get time bounds for cdms2 data extraction   
@@ -28,6 +33,9 @@ xy_axis_check        -- Check whether 2 lat or lon axes are the same
 
 Included classes:
 InputData            -- Extract and subset data
+InputDataStream      -- Extract and subset data, one time chunk at a time
+MappedData           -- Memory map data (no copies, no cdms2 variables)
+StageProfile         -- Record the time and memory used by processing stages
 
 """
 
@@ -36,6 +44,12 @@ InputData            -- Extract and subset data
 import os, sys, pdb
 import re
 import copy
+import hashlib
+import shutil
+import cPickle
+import collections
+import resource
+import timeit
 
 import inspect
 import calendar
@@ -44,16 +58,22 @@ from dateutil.parser import *
 
 import numpy
 from scipy import stats
+from scipy import sparse
+from scipy.io import netcdf
+try:
+    import h5py
+except ImportError:
+    h5py = None  # only required for memory mapping NetCDF4 files (see MappedData)
 
 import cdutil
 import genutil
 import cdms2
+import cdtime
 #if hasattr(cdms2, 'setNetcdfDeflateFlag'):
 cdms2.setNetcdfShuffleFlag(0)
 cdms2.setNetcdfDeflateFlag(0)
 cdms2.setNetcdfDeflateLevelFlag(0)
 import MV2
-import regrid2
 
 
 ## Import my modules ##
@@ -114,13 +134,45 @@ regions = {'aus': [(-45, -10, 'cc'), (110, 160, 'cc')],
            'zw33': [(-50, -45, 'cc'), (279, 289, 'cc')],
            }
 
+month_dict = {'JAN': 1, 'FEB': 2, 'MAR': 3, 'APR': 4, 
+              'MAY': 5, 'JUN': 6, 'JUL': 7, 'AUG': 8, 
+              'SEP': 9, 'OCT': 10, 'NOV': 11, 'DEC': 12}
+
+season_dict = {'DJF': ('JAN', 'FEB', 'DEC'),
+               'MAM': ('MAR', 'APR', 'MAY'),
+               'JJA': ('JUN', 'JUL', 'AUG'),
+               'SON': ('SEP', 'OCT', 'NOV')}
+
+
+## InputData cache ##
+
+cache_max_size = 20 * 1024**3  # bytes
+_code_hash = None  # see _code_version
+
+
+## Regridding weights cache (see regrid_weights) ##
+
+regrid_cache_max_entries = 10
+_regrid_weights_cache = collections.OrderedDict()
+
+
+## MappedData ##
+
+_calendars = {'gregorian': cdtime.MixedCalendar,
+              'standard': cdtime.MixedCalendar,
+              'proleptic_gregorian': cdtime.GregorianCalendar,
+              'julian': cdtime.JulianCalendar,
+              'noleap': cdtime.NoLeapCalendar,
+              '365_day': cdtime.NoLeapCalendar,
+              '360_day': cdtime.Calendar360}
+
 
 ## Classes/functions ##
 
 class InputData:
     """Extract and subset data."""
 
-    def __init__(self, fname, var_id, convert=False, normalise=False, **kwargs):
+    def __init__(self, fname, var_id, convert=False, normalise=False, cache_dir=None, profile=None, **kwargs):
         """Extract desired data from an input file.
     
         Keyword arguments (with examples):
@@ -152,6 +204,20 @@ class InputData:
         spatial averaging (mermax, spatave), temporal aggregation (agg), 
         running average (runave), regrid (grid), convert units, 
         normalise 
+
+        CACHING
+        cache_dir -- Directory for storing the processed data. Once an 
+                     input file has been processed with a given set of
+                     keyword arguments, subsequent calls read the result
+                     (memory mapped) from the cache. Entries are invalidated
+                     when the input file or this module changes, and the least 
+                     recently used entries are deleted once the cache exceeds 
+                     cache_max_size bytes.
+
+        PROFILING
+        profile   -- StageProfile instance, in which the wall time, bytes read, 
+                     array size and peak memory of each processing stage are
+                     recorded (also available as self.profile)
             
         self.data has all the attributes and methods
         of a typical cdms2 variable. For instance:
@@ -162,63 +228,50 @@ class InputData:
     
         """
 
+        self.fname = fname
+        self.id = var_id
+        self.profile = profile
+
+        if cache_dir:
+            cache_key = _cache_key(fname, var_id, convert=convert, normalise=normalise, **kwargs)
+            cached = _stage(self.profile, 'cache_read', _read_cache, cache_dir, cache_key)
+            if cached:
+                _split_kwargs(self, kwargs)  # sets the region attributes 
+                self.data, self.global_atts = cached
+                return
+
         infile = cdms2.open(fname)          
         _infile_attribute_check(infile, var_id)
         kwargs['order'] = _define_order(infile, var_id)
 
         # Subset input data #
 
-        if kwargs.has_key('region'):   
-            try:
-                kwargs['latitude'], kwargs['longitude'] = regions[kwargs['region']]
-                self.minlat, self.maxlat = kwargs['latitude'][0:2]
-                self.minlon, self.maxlon = kwargs['longitude'][0:2]
-                self.region = kwargs['region']
-            except KeyError:
-                print 'region not defined - using all spatial data...'    
-            del kwargs['region']
-
-        #remove None values
-        for key in kwargs:
-            if not kwargs[key]:
-                del kwargs[key]
-
-        subsettors = ['latitude', 'level', 'longitude', 'time']
-        subset_kwargs = {}
-        for key in kwargs.keys():
-            if key in subsettors:
-                subset_kwargs[key] = kwargs[key]
-
-        data = _subset_data(infile, var_id, **subset_kwargs)        
+        kwargs, subset_kwargs = _split_kwargs(self, kwargs)
+        data = _stage(self.profile, 'subset', _subset_data, infile, var_id, **subset_kwargs)
        
         # Manipulate the subsetted data #  
 
-        if kwargs.has_key('mermax'):
-            lat_index = data.getOrder().index('y')
-            data = MV2.max(data, axis=lat_index)
-        
-        if kwargs.has_key('spatave'):
-            ave_axes = data.getOrder().translate(None, 't')
-            data = cdutil.averager(data, axis=ave_axes, weights=['unweighted']*len(ave_axes))
+        if kwargs.has_key('mermax') or kwargs.has_key('spatave'):
+            data = _stage(self.profile, 'spatial_reduction', _spatial_reduction, data, **kwargs)
         
         if kwargs.has_key('agg'):
             quantity = kwargs['agg'][0]
             timescale = kwargs['agg'][1]
             times = [kwargs['agg'][2], kwargs['agg'][3]] if len(kwargs['agg']) > 2 else None
-            data = temporal_aggregation(data, timescale, quantity, time_period=times)
+            data = _stage(self.profile, 'agg', temporal_aggregation, data, timescale, quantity, time_period=times)
 
         if kwargs.has_key('runave'):
             window = kwargs['runave']
-            data = running_average(data, window) if window > 1 else data
+            data = _stage(self.profile, 'runave', running_average, data, window) if window > 1 else data
 
         if kwargs.has_key('grid'):
-            data = regrid_uniform(data, kwargs['grid'])            
+            data = _stage(self.profile, 'grid', regrid_uniform, data, kwargs['grid'])            
 
         if convert:
-            data = convert_units(data)
+            data = _stage(self.profile, 'convert', convert_units, data)
 
         if normalise:
-            data = normalise_data(data, sub_mean=True)
+            data = _stage(self.profile, 'normalise', normalise_data, data, sub_mean=True)
 
         # Set object attributes #
         
@@ -227,29 +280,41 @@ class InputData:
                 print 'WARNING: There are duplicate longitude values (can be problematic for some applications)'  
 
         self.data = data
-        self.fname = fname
-        self.id = var_id
         self.global_atts = infile.attributes
     
         infile.close()
+
+        if cache_dir:
+            _stage(self.profile, 'cache_write', _write_cache, cache_dir, cache_key, self.data, self.global_atts)
     
 
     def datetime_axis(self):
         """Return the time axis, expressed as a list of datetime objects."""
      
-        return get_datetime(self.data.getTime().asComponentTime())
+        times = self.decoded_time()
+        time_parts = zip(times['year'], times['month'], times['day'], 
+                         times['hour'], times['minute'], times['second'])
+
+        return [datetime.datetime(*map(int, parts)) for parts in time_parts]
         
 
+    def decoded_time(self):
+        """Return the decoded time axis (see decode_time_axis).
+
+        The time axis is only decoded once, so repeated calls are cheap.
+
+        """
+
+        if not hasattr(self, '_decoded_time'):
+            self._decoded_time = decode_time_axis(self.data.getTime())
+
+        return self._decoded_time
+
+
     def months(self):
         """Return array containing the months"""        
  
-        datetimes = self.data.getTime().asComponentTime()
-        
-        months = []
-        for datetime in datetimes:
-            months.append(int(str(datetime).split('-')[1]))    
-
-        return months
+        return self.decoded_time()['month'].tolist()
 
 
     def picker(self, **kwargs):
@@ -271,13 +336,478 @@ class InputData:
     def years(self):
         """Return array containing the years"""        
  
-        datetimes = self.data.getTime().asComponentTime()
+        return self.decoded_time()['year'].tolist()
+
+
+class InputDataStream:
+    """Extract and subset data, one time chunk at a time."""
+
+    def __init__(self, fname, var_id, chunk_size=365, convert=False, normalise=False, **kwargs):
+        """Define the data to be extracted from an input file.
+
+        Iterating over an InputDataStream instance yields the data 
+        one time chunk (of length chunk_size) at a time, which keeps 
+        the memory footprint bounded regardless of the record length.
+        e.g.
+
+        for chunk in nio.InputDataStream(fname, var_id, chunk_size=1000, region='sh'):
+            ...
+
+        Each chunk has all the attributes and methods of a typical
+        cdms2 variable. 
+
+        The subsettors (latitude, level, longitude, region, time) and 
+        manipulators grid, mermax, spatave, convert and normalise are
+        the same as for InputData. The agg and runave manipulators
+        require the entire record and are therefore not available.
+
+        Normalisation requires the mean and standard deviation of the entire 
+        record, so if normalise=True the input data are read twice.
+
+        """
+
+        assert type(chunk_size) == int and chunk_size > 1, \
+        'chunk_size must be an integer greater than one'
+
+        for key in ['agg', 'runave']:
+            assert not kwargs.get(key, None), \
+            '%s is not available when streaming the input data in time chunks' %(key)
+
+        infile = cdms2.open(fname)          
+        _infile_attribute_check(infile, var_id)
+        kwargs['order'] = _define_order(infile, var_id)
+        assert kwargs['order'][0] == 't', \
+        'Input data must have a time axis'
+
+        kwargs, subset_kwargs = _split_kwargs(self, kwargs)
+        time_selector = subset_kwargs.pop('time', None)
+        self.time_indexes = _time_indexes(infile.getAxis('time'), time_selector)
+        self.subset_kwargs = _spatial_selectors(infile, **subset_kwargs)
         
-        years = []
-        for datetime in datetimes:
-            years.append(int(str(datetime).split('-')[0]))
-            
-        return years
+        self.kwargs = kwargs
+        self.chunk_size = chunk_size
+        self.convert = convert
+        self.normalise = normalise
+
+        self.fname = fname
+        self.id = var_id
+        self.global_atts = infile.attributes
+
+        infile.close()
+
+
+    def __iter__(self):
+        """Iterate over the time chunks."""
+
+        if self.normalise:
+            mean, std = self._mean_std()
+            for data in self._chunks():
+                yield MV2.divide(MV2.subtract(data, mean), std)
+        else:
+            for data in self._chunks():
+                yield data
+
+
+    def __len__(self):
+        """Return the number of time chunks."""
+
+        return len(self._chunk_indexes())
+
+
+    def _chunk_indexes(self):
+        """Split the selected time indexes into chunks."""
+
+        split_points = range(self.chunk_size, len(self.time_indexes), self.chunk_size)
+
+        return numpy.split(self.time_indexes, split_points)  # final chunk holds the remainder
+
+
+    def _chunks(self):
+        """Read and manipulate each time chunk."""
+
+        infile = cdms2.open(self.fname)
+        for indexes in self._chunk_indexes():
+            data = _read_time_indexes(infile, self.id, indexes, **self.subset_kwargs)
+            data = _spatial_reduction(data, **self.kwargs)
+
+            if self.kwargs.has_key('grid'):
+                data = regrid_uniform(data, self.kwargs['grid'])            
+
+            if self.convert:
+                data = convert_units(data)
+
+            yield data
+
+        infile.close()
+
+
+    def _mean_std(self):
+        """Calculate the mean and standard deviation of the entire record."""
+
+        total, total_sq, count = 0.0, 0.0, 0.0
+        for data in self._chunks():
+            data = numpy.ma.masked_array(data, dtype=numpy.float64)
+            total = total + numpy.ma.sum(data, axis=0).filled(0.0)
+            total_sq = total_sq + numpy.ma.sum(data**2, axis=0).filled(0.0)
+            count = count + numpy.ma.count(data, axis=0)
+
+        mean = total / count
+        std = numpy.sqrt(total_sq / count - mean**2)
+
+        return mean, std
+
+
+class MappedData:
+    """Memory map data, without copying it or creating cdms2 variables."""
+
+    def __init__(self, fname, var_id, **kwargs):
+        """Memory map a variable from an input file.
+
+        Only uncompressed variables can be mapped, which means either
+        a NetCDF3 (classic or 64-bit offset) file, or a contiguous
+        (i.e. unchunked) variable in a NetCDF4 file (requires h5py).
+        Packed data (scale_factor, add_offset) are not supported.
+        Use InputData for anything else.
+
+        Keyword arguments (with examples):
+        latitude  -- (-30, 30) or 30
+        level     -- (1000.)
+        longitude -- (120, 165) or 230
+        region    -- aus
+        time      -- ('1979-01-01', '2000-12-31', 'MONTH/SEASON')
+
+        self.data is a read-only numpy array. If the selection is
+        contiguous (i.e. anything but a month/season selection) it is
+        a view of the memory mapped file, so values are only read
+        from disk when they are accessed. Missing values are not
+        masked (see self.masked()).
+
+        Like a cdms2 variable, the axes are available via getTime(),
+        getLatitude(), getLongitude(), getLevel(), getAxisList() and
+        getOrder(). The (one dimensional) cdms2 axes are only created
+        when requested.
+
+        """
+
+        self.fname = fname
+        self.id = var_id
+
+        with open(fname, 'rb') as infile:
+            file_signature = infile.read(4)
+
+        if file_signature in ['CDF\x01', 'CDF\x02']:
+            self._infile, data, self.attributes, self.global_atts, self._axes = _map_netcdf3(fname, var_id)
+        elif file_signature == '\x89HDF':
+            self._infile, data, self.attributes, self.global_atts, self._axes = _map_hdf5(fname, var_id)
+        else:
+            raise ValueError('%s is not a NetCDF3 or NetCDF4 file' %(fname))
+
+        for att in ['scale_factor', 'add_offset']:
+            if att in self.attributes:
+                raise ValueError('Packed data (%s) cannot be memory mapped - use InputData' %(att))
+
+        # Subset the data #
+
+        kwargs, subset_kwargs = _split_kwargs(self, kwargs)
+        for key in kwargs.keys():
+            if not key in subset_kwargs.keys():
+                raise ValueError('%s is not available for memory mapped data - use InputData' %(key))
+
+        axis_types = {'time': 't', 'latitude': 'y', 'longitude': 'x', 'level': 'z'}
+        selection = [slice(None)] * data.ndim
+        for key, selector in subset_kwargs.iteritems():
+            order = self.getOrder()
+            assert axis_types[key] in order, \
+            'Input data do not have a %s axis' %(key)
+            dim = order.index(axis_types[key])
+            selection[dim] = _mapped_indexes(self._axes[dim], selector, time=(key == 'time'))
+
+        for dim in range(data.ndim):
+            self._axes[dim]['values'] = self._axes[dim]['values'][selection[dim]]
+            if isinstance(selection[dim], numpy.ndarray):
+                data = numpy.take(data, selection[dim], axis=dim)  # the only selection that requires a copy
+                selection[dim] = slice(None)
+
+        self.data = data[tuple(selection)]
+        self.data.flags.writeable = False
+        self._axes = [axis for axis, selector in zip(self._axes, selection) if not isinstance(selector, int)]
+        self._axis_cache = {}
+
+
+    def decoded_time(self):
+        """Return the decoded time axis (see decode_time_axis)."""
+
+        if not hasattr(self, '_decoded_time'):
+            self._decoded_time = decode_time_axis(self.getTime())
+
+        return self._decoded_time
+
+
+    def getAxis(self, dim):
+        """Return the cdms2 axis corresponding to dimension dim."""
+
+        if not self._axis_cache.has_key(dim):
+            self._axis_cache[dim] = _create_axis(self._axes[dim])
+
+        return self._axis_cache[dim]
+
+
+    def getAxisList(self):
+        """Return a list of the cdms2 axes."""
+
+        return [self.getAxis(dim) for dim in range(len(self._axes))]
+
+
+    def getLatitude(self):
+        """Return the latitude axis (or None)."""
+
+        return self._get_axis_type('y')
+
+
+    def getLevel(self):
+        """Return the level axis (or None)."""
+
+        return self._get_axis_type('z')
+
+
+    def getLongitude(self):
+        """Return the longitude axis (or None)."""
+
+        return self._get_axis_type('x')
+
+
+    def getOrder(self):
+        """Return the axis order (e.g. tyx), consistent with cdms2."""
+
+        return ''.join([axis['type'] if axis['type'] else '-' for axis in self._axes])
+
+
+    def getTime(self):
+        """Return the time axis (or None)."""
+
+        return self._get_axis_type('t')
+
+
+    def masked(self):
+        """Return the data as a masked array.
+
+        Only the mask is created - the data values are not copied.
+
+        """
+
+        for att in ['_FillValue', 'missing_value']:
+            if att in self.attributes:
+                fill_value = numpy.array(self.attributes[att]).flat[0]
+                return numpy.ma.masked_equal(self.data, fill_value, copy=False)
+
+        return numpy.ma.masked_array(self.data, copy=False)
+
+
+    def _get_axis_type(self, axis_type):
+        """Return the axis of the given type (or None)."""
+
+        order = self.getOrder()
+
+        return self.getAxis(order.index(axis_type)) if axis_type in order else None
+
+
+class StageProfile:
+    """Record the time and memory used by processing stages."""
+
+    def __init__(self, name):
+        """Each stage run via self.run is recorded (in order) in self.stages,
+        as a dictionary with the following keys:
+
+        stage       -- stage name
+        wall_time   -- wall clock time (seconds)
+        bytes_read  -- bytes read by the process during the stage
+        bytes_written  -- bytes written by the process during the stage
+        array_shape -- shape of the array returned by the stage
+        array_bytes -- size of the array returned by the stage (bytes)
+        peak_rss    -- peak resident memory (bytes)
+
+        The bytes read and written come from /proc/self/io (so they are None 
+        on systems other than Linux). On Linux (kernel 4.0 or later) the peak 
+        memory is reset at the start of each stage. Elsewhere it is the peak 
+        memory of the process up until the end of the stage.
+
+        """
+
+        self.name = name
+        self.stages = []
+
+
+    def as_dict(self):
+        """Return the profile as a (JSON serialisable) dictionary."""
+
+        return {'name': self.name,
+                'total_wall_time': sum([stage['wall_time'] for stage in self.stages]),
+                'stages': self.stages}
+
+
+    def report(self):
+        """Return a table summarising each stage."""
+
+        def megabytes(value):
+            return '%.1f' %(value / 1024.0**2) if value is not None else '-'
+
+        lines = [self.name,
+                 '%-20s %10s %12s %12s %12s %12s' %('stage', 'time (s)', 'read (MB)', 'written (MB)', 'array (MB)', 'peak (MB)')]
+        for stage in self.stages:
+            lines.append('%-20s %10.3f %12s %12s %12s %12s' %(stage['stage'], stage['wall_time'], 
+                                                              megabytes(stage['bytes_read']), megabytes(stage['bytes_written']), 
+                                                              megabytes(stage['array_bytes']), megabytes(stage['peak_rss'])))
+
+        return '\n'.join(lines)
+
+
+    def run(self, stage_name, func, *args, **kwargs):
+        """Run func(*args, **kwargs) as a stage and return the result."""
+
+        _reset_peak_rss()
+        io_start = _process_io()
+        start_time = timeit.default_timer()
+
+        result = func(*args, **kwargs)
+
+        wall_time = timeit.default_timer() - start_time
+        io_end = _process_io()
+
+        shape = getattr(result, 'shape', None)
+        if shape is None:
+            array_bytes = None
+        elif hasattr(result, 'nbytes'):
+            array_bytes = int(result.nbytes)
+        else:
+            array_bytes = int(numpy.prod(shape)) * numpy.dtype(result.typecode()).itemsize  # e.g. cdms2 file variables
+
+        self.stages.append({'stage': stage_name,
+                            'wall_time': wall_time,
+                            'bytes_read': io_end['rchar'] - io_start['rchar'] if io_start else None,
+                            'bytes_written': io_end['wchar'] - io_start['wchar'] if io_start else None,
+                            'array_shape': [int(size) for size in shape] if shape is not None else None,
+                            'array_bytes': array_bytes,
+                            'peak_rss': _peak_rss()})
+
+        return result
+
+
+def append_netcdf(outfile_name, outdata, outvar_ids, outvar_axes, extra_history=' ', update_history=True):
+    """Append time steps to the variables of an existing output netCDF file.
+
+    The file is extended in place along its (unlimited) time axis, 
+    so it must have been written by write_netcdf with unlimited_time=True.
+
+    Positional arguments (incl. type/description):
+      outfile_name  -- string
+      outdata       -- List or tuple containing the new data (time must be
+                       the first axis) for each output variable
+      outvar_ids    -- List or tuple of the corresponding output file variables
+      outvar_axes   -- List or tuple of axis lists or tuples for each outdata 
+                       element (in order tyx). The time axis covers the new
+                       time steps only (see new_time_period)
+
+    Keyword arguments:
+      extra_history  -- string of extra info to be added to the global
+                        'history' attribute output
+      update_history -- False = leave the global 'history' attribute as is
+                        (e.g. when a file written by write_netcdf is 
+                        extended one time chunk at a time by the same program)
+
+    """
+
+    assert len(outdata) == len(outvar_ids) == len(outvar_axes)
+
+    outfile = cdms2.open(outfile_name, 'r+')
+    
+    time_axes = [axis for axis in outfile.axes.values() if axis.isTime()]
+    assert len(time_axes) == 1 and time_axes[0].isUnlimited(), \
+    '%s does not have an unlimited time axis (it may need to be recreated with write_netcdf, unlimited_time=True)' %(outfile_name)
+    file_time = time_axes[0]
+    start, last_time = len(file_time), file_time[-1]
+
+    for data, var_id, axes in zip(outdata, outvar_ids, outvar_axes):
+        assert var_id in outfile.variables.keys(), '%s is not in %s' %(var_id, outfile_name)
+        file_var = outfile[var_id]
+
+        new_time = axes[0].clone()
+        assert new_time.isTime(), 'Time must be the first axis for appended data'
+        new_time.toRelativeTime(file_time.units, file_time.getCalendar())
+        new_time.id = file_time.id
+        assert new_time[0] > last_time, 'Appended time steps must come after the end of %s' %(outfile_name)
+
+        fill_value = getattr(file_var, 'missing_value', 1.0e20)
+        data = numpy.ma.filled(numpy.ma.asarray(data, dtype=numpy.float32), fill_value)
+        var = cdms2.createVariable(data, axes=[new_time] + list(axes[1:]), id=var_id, copy=0)
+        outfile.write(var, extend=1, index=start)
+
+    if update_history:
+        timestamp = gio.get_timestamp()
+        setattr(outfile, 'history', 
+        """%s [appended %i time steps]. %s\n%s""" %(timestamp, len(new_time), extra_history, outfile.attributes.get('history', '')))
+
+    outfile.close()
+
+
+def _axis_metadata(axis):
+    """Return the information needed to recreate an axis (see _create_axis)."""
+
+    if axis.isTime():
+        axis_type = 't'
+    elif axis.isLatitude():
+        axis_type = 'y'
+    elif axis.isLongitude():
+        axis_type = 'x'
+    elif axis.isLevel():
+        axis_type = 'z'
+    else:
+        axis_type = None
+
+    metadata = {'id': axis.id,
+                'values': numpy.array(axis[:]),
+                'bounds': axis.getBounds(),
+                'attributes': dict(axis.attributes),
+                'type': axis_type,
+                'calendar': axis.getCalendar() if axis_type == 't' else None}
+
+    return metadata
+
+
+def _cache_key(fname, var_id, **kwargs):
+    """Return the InputData cache key.
+
+    The key is a hash of the input file path, size and modification time, 
+    the variable, the (normalised) keyword arguments and the source code
+    of this module (so that entries are invalidated when the code changes).
+
+    """
+
+    def normalise(value):
+        if isinstance(value, (list, tuple)):
+            return tuple(normalise(item) for item in value)
+        return value
+
+    fname = os.path.abspath(fname)
+    file_info = os.stat(fname)
+    kwargs = sorted((key, normalise(value)) for key, value in kwargs.iteritems() if value is not None)
+
+    md5 = hashlib.md5()
+    md5.update(repr((fname, file_info.st_size, file_info.st_mtime, var_id, kwargs)))
+    md5.update(_code_version())
+
+    return md5.hexdigest()
+
+
+def _code_version():
+    """Return a hash of the source code of this module."""
+
+    global _code_hash
+    if _code_hash is None:
+        source_file = os.path.splitext(os.path.abspath(__file__))[0] + '.py'
+        with open(source_file, 'rb') as source:
+            _code_hash = hashlib.md5(source.read()).hexdigest()
+
+    return _code_hash
 
 
 def convert_units(data):
@@ -327,6 +857,25 @@ def coordinate_pairs(lat_axis, lon_axis):
     return lat_mesh.flatten(), lon_mesh.flatten()
 
 
+def _create_axis(metadata):
+    """Create an axis from the output of _axis_metadata."""
+
+    axis = cdms2.createAxis(metadata['values'], bounds=metadata['bounds'], id=metadata['id'])
+    for key, value in metadata['attributes'].iteritems():
+        setattr(axis, key, value)
+
+    if metadata['type'] == 't':
+        axis.designateTime(calendar=metadata['calendar'])
+    elif metadata['type'] == 'y':
+        axis.designateLatitude()
+    elif metadata['type'] == 'x':
+        axis.designateLongitude()
+    elif metadata['type'] == 'z':
+        axis.designateLevel()
+
+    return axis
+
+
 def day_of_year_366(dt):
     """Take a datetime instance (dt) and return the day of the year 
     relative to a 366 day year.
@@ -366,12 +915,120 @@ def _define_order(infile, var_id, template='tyxz'):
     return order
 
 
+def date_index(time_axis):
+    """Take a time axis (e.g. getTime().asComponentTime()) and return a
+    dictionary that maps each (year, month, day) to its position in the axis.
+
+    Where there is more than one time step on a given day, the first
+    time step is used.
+
+    """
+
+    index = {}
+    for position, date in enumerate(map(split_dt, time_axis)):
+        index.setdefault(date, position)
+
+    return index
+
+
+def decode_time_axis(time_axis):
+    """Decode a cdms2 time axis into its date/time components.
+
+    Returns a dictionary of numpy arrays: year, month, day, hour, 
+    minute, second and datetime64. The components are calculated 
+    directly from the numeric time values and units (e.g. days since 
+    1979-01-01) for the standard, no leap and 360 day calendars. Other 
+    calendars and units (e.g. months since) fall back on the slower 
+    asComponentTime() method.
+
+    The datetime64 entry is None unless the calendar is the standard 
+    (Gregorian) calendar.
+
+    """
+
+    unit_seconds = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+    calendar_type = time_axis.getCalendar()
+    gregorian = calendar_type in [cdtime.GregorianCalendar, cdtime.MixedCalendar]
+    noleap = calendar_type == cdtime.NoLeapCalendar
+    days360 = calendar_type == cdtime.Calendar360
+
+    units_match = re.match('\s*(\w+?)s?\s+since\s+(.+)', time_axis.units)
+    if units_match and units_match.group(1).lower() in unit_seconds.keys() and (gregorian or noleap or days360):
+        ref = cdtime.s2c(units_match.group(2).strip())
+        ref_seconds = ref.hour * 3600 + ref.minute * 60 + int(round(ref.second))
+        values = numpy.array(time_axis[:], dtype=numpy.float64)
+        seconds = numpy.round(values * unit_seconds[units_match.group(1).lower()]).astype(numpy.int64) + ref_seconds 
+        days = seconds // 86400
+        seconds_of_day = seconds % 86400
+
+        if gregorian:
+            # The reference date is located via cdtime, because on the mixed calendar a 
+            # reference before 1582-10-15 (e.g. 1-1-1) is a Julian date
+            ref_days = cdtime.comptime(ref.year, ref.month, ref.day).torel('days since 1970-01-01', calendar_type).value
+            ref_date = numpy.datetime64('1970-01-01', 'D') + numpy.timedelta64(int(round(ref_days)), 'D')
+            dates = ref_date + days.astype('timedelta64[D]')
+            month_start = dates.astype('datetime64[M]')
+            year = dates.astype('datetime64[Y]').astype(numpy.int64) + 1970
+            month = month_start.astype(numpy.int64) % 12 + 1
+            day = (dates - month_start).astype(numpy.int64) + 1
+            dt64 = dates.astype('datetime64[s]') + seconds_of_day.astype('timedelta64[s]')
+            if calendar_type == cdtime.MixedCalendar and (year.size > 0) and (year.min() < 1583):
+                gregorian = False  # the Julian part of the mixed calendar
+        else:
+            days_per_month = [30] * 12 if days360 else [31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
+            month_starts = numpy.cumsum([0] + days_per_month)
+            days_per_year = month_starts[-1]
+
+            ordinal = ref.year * days_per_year + month_starts[ref.month - 1] + (ref.day - 1) + days 
+            year = ordinal // days_per_year
+            day_of_year = ordinal % days_per_year
+            month = numpy.searchsorted(month_starts, day_of_year, side='right')
+            day = day_of_year - month_starts[month - 1] + 1
+            dt64 = None
+
+        if gregorian or noleap or days360:
+            return {'year': year, 'month': month, 'day': day,
+                    'hour': seconds_of_day // 3600,
+                    'minute': (seconds_of_day % 3600) // 60,
+                    'second': seconds_of_day % 60,
+                    'datetime64': dt64}
+
+    components = time_axis.asComponentTime()
+    times = {}
+    for part in ['year', 'month', 'day', 'hour', 'minute']:
+        times[part] = numpy.array([getattr(ct, part) for ct in components], dtype=numpy.int64)
+    times['second'] = numpy.array([int(ct.second) for ct in components], dtype=numpy.int64)
+    times['datetime64'] = None
+
+    return times
+
+
 def dict_filter(indict, key_list):
     """Filter dictionary according to specified keys."""
     
     return dict((key, value) for key, value in indict.iteritems() if key in key_list)
 
 
+def _evict_cache(cache_dir, max_size):
+    """Delete the least recently used InputData cache entries 
+    until the total size of the cache is less than max_size bytes."""
+
+    entries = []
+    for entry in os.listdir(cache_dir):
+        entry_dir = os.path.join(cache_dir, entry)
+        if entry.startswith('inputdata_') and os.path.isdir(entry_dir):
+            size = sum(os.path.getsize(os.path.join(entry_dir, item)) for item in os.listdir(entry_dir))
+            entries.append((os.path.getmtime(entry_dir), size, entry_dir))
+
+    total_size = sum(entry[1] for entry in entries)
+    for last_used, size, entry_dir in sorted(entries):
+        if total_size <= max_size:
+            break
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        total_size = total_size - size
+
+
 def get_cdms2_tbounds(date, timescale):
     """Return the appropriate time bounds and date abbreviation for 
     a given timescale and single date extracted using getTime().asComponentTime()"""
@@ -403,6 +1060,11 @@ def get_datetime(datetime_list):
 
     datetime_object_list = []
     for item in datetime_list:
+        if hasattr(item, 'year'):
+            #component times can be converted directly (no string parsing)
+            dt = datetime.datetime(item.year, item.month, item.day, item.hour, item.minute)
+            datetime_object_list.append(dt + datetime.timedelta(seconds=int(item.second)))
+            continue
         #compensate for 60.0 seconds which genutil.filters.runningaverage can produce
         if not str(item)[-4] in ['0', '1', '2', '3', '4', '5', ':']:
             item = str(item)[0:-5]        
@@ -510,6 +1172,143 @@ def list_kwargs(func):
     return details.args[-nopt:]
 
 
+def _map_hdf5(fname, var_id):
+    """Memory map a contiguous variable from a NetCDF4 file (see MappedData).
+
+    Returns None (in place of an open file), the data, variable attributes,
+    global attributes and axis metadata (see _mapped_axis_metadata).
+
+    """
+
+    if not h5py:
+        raise ImportError('h5py is required to memory map NetCDF4 files - use InputData')
+
+    hdf5_atts = ['CLASS', 'DIMENSION_LIST', 'NAME', 'REFERENCE_LIST', 
+                 '_Netcdf4Coordinates', '_Netcdf4Dimid', '_NCProperties', '_nc3_strict']
+
+    def netcdf_attributes(obj):
+        return dict((key, value) for key, value in obj.attrs.items() if not key in hdf5_atts)
+
+    with h5py.File(fname, 'r') as infile:
+        var = infile[var_id]
+        offset = var.id.get_offset()
+        if var.chunks or var.compression or offset is None:
+            raise ValueError('%s is not stored contiguously in %s - use InputData' %(var_id, fname))
+
+        axes = []
+        for dim, dim_scales in enumerate(var.dims):
+            if len(dim_scales) > 0:
+                coord = dim_scales[0]
+                dim_name = coord.name.lstrip('/')
+                if str(coord.attrs.get('NAME', '')).startswith('This is a netCDF dimension but not a netCDF variable'):
+                    axes.append(_mapped_axis_metadata(dim_name, numpy.arange(var.shape[dim]), {}))
+                else:
+                    axes.append(_mapped_axis_metadata(dim_name, coord[...], netcdf_attributes(coord)))
+            else:
+                axes.append(_mapped_axis_metadata('axis_%i' %(dim), numpy.arange(var.shape[dim]), {}))
+
+        data = numpy.memmap(fname, dtype=var.dtype, mode='r', offset=offset, shape=var.shape)
+        var_atts = netcdf_attributes(var)
+        global_atts = netcdf_attributes(infile)
+
+    return None, data, var_atts, global_atts, axes
+
+
+def _map_netcdf3(fname, var_id):
+    """Memory map a variable from a NetCDF3 file (see MappedData).
+
+    Returns the open file (which must stay open for as long as the data 
+    are used), the data, variable attributes, global attributes and axis 
+    metadata (see _mapped_axis_metadata).
+
+    """
+
+    infile = netcdf.netcdf_file(fname, 'r', mmap=True)
+    var = infile.variables[var_id]
+
+    axes = []
+    for dim, dim_name in enumerate(var.dimensions):
+        if infile.variables.has_key(dim_name):
+            coord = infile.variables[dim_name]
+            axes.append(_mapped_axis_metadata(dim_name, coord.data, dict(coord._attributes)))
+        else:
+            axes.append(_mapped_axis_metadata(dim_name, numpy.arange(var.data.shape[dim]), {}))
+
+    return infile, var.data, dict(var._attributes), dict(infile._attributes), axes
+
+
+def _mapped_axis_metadata(dim_name, values, attributes):
+    """Return the metadata for an axis read directly from a file
+    (in the format of _axis_metadata)."""
+
+    units = str(attributes.get('units', ''))
+    axis_att = str(attributes.get('axis', '')).upper()
+    name = dim_name.lower()
+
+    if axis_att == 'T' or ' since ' in units:
+        axis_type = 't'
+    elif axis_att == 'Y' or units in ['degrees_north', 'degree_north', 'degrees_N', 'degree_N'] or name.startswith('lat'):
+        axis_type = 'y'
+    elif axis_att == 'X' or units in ['degrees_east', 'degree_east', 'degrees_E', 'degree_E'] or name.startswith('lon'):
+        axis_type = 'x'
+    elif axis_att == 'Z' or 'positive' in attributes or name.startswith('lev') or name in ['plev', 'pressure', 'depth']:
+        axis_type = 'z'
+    else:
+        axis_type = None
+
+    calendar = str(attributes.get('calendar', 'standard')).lower()
+    values = numpy.array(values)
+    
+    metadata = {'id': dim_name,
+                'values': values.astype(values.dtype.newbyteorder('=')),  # NetCDF3 is big-endian
+                'bounds': None,
+                'attributes': dict((key, value) for key, value in attributes.iteritems() if not key in ['bounds', '_FillValue']),
+                'type': axis_type,
+                'calendar': _calendars.get(calendar, cdtime.DefaultCalendar) if axis_type == 't' else None}
+
+    return metadata
+
+
+def _mapped_indexes(axis, selector, time=False):
+    """Return the indexes of the axis values that satisfy the selector.
+
+    Contiguous selections are returned as a slice (so that selecting 
+    them returns a view of the data) and single values as an integer.
+    
+    Arguments:
+      axis     -- axis metadata (see _mapped_axis_metadata)
+      selector -- see MappedData for examples
+
+    """
+
+    values = axis['values']
+    if time:
+        indexes = _time_indexes(_create_axis(axis), selector)
+    elif type(selector) in [int, float]:
+        index = int(numpy.abs(values - selector).argmin())
+        if values[index] != selector:
+            print "Selected %s not available, used %s instead" %(axis['id'], str(values[index]))
+        return index
+    else:
+        bounds = selector[2] if len(selector) > 2 else 'cc'
+        def in_bounds(vals):
+            lower = vals >= selector[0] if bounds[0] == 'c' else vals > selector[0]
+            upper = vals <= selector[1] if bounds[1] == 'c' else vals < selector[1]
+            return lower & upper
+        
+        if axis['type'] == 'x' and (in_bounds(values + 360).any() or in_bounds(values - 360).any()):
+            raise ValueError('Longitude selections that wrap around the grid cannot be memory mapped - use InputData')
+        indexes = numpy.where(in_bounds(values))[0]
+
+    assert len(indexes) > 0, \
+    'No data in the selected %s range' %(axis['id'])
+
+    if numpy.all(numpy.diff(indexes) == 1):
+        return slice(int(indexes[0]), int(indexes[-1]) + 1)
+    else:
+        return indexes
+
+
 def match_dates(dates, time_axis, invert_matching=False, return_indexes=False):
     """Take a simple list of dates (e.g. 1979-01-01) and match with the corresponding
     times in a more detailed time axis (e.g. 1979-01-01 12:00:0.0).
@@ -525,34 +1324,56 @@ def match_dates(dates, time_axis, invert_matching=False, return_indexes=False):
                         False => the returned time_axis values are actual dates
     """
     
-    dates_split = map(split_dt, dates)
-    time_axis_split = map(split_dt, time_axis)
+    time_axis_index = date_index(time_axis)
     
     matches_indexes = []
-    matches_dates = []
-    misses_indexes = range(0, len(time_axis))
-    misses_dates = time_axis[:]  # creates a shallow copy
-    
-    for date in dates_split:
-        try:
-            index = time_axis_split.index(date)
-            if invert_matching:
-                misses_dates.remove(time_axis[index])
-                misses_indexes.remove(index)
-            else:
-                matches_dates.append(time_axis[index])
-                matches_indexes.append(index)
-        except ValueError:
-            pass        
-
-    if invert_matching and return_indexes:
-        return misses_indexes
-    elif invert_matching and not return_indexes:
-        return misses_dates
-    elif not invert_matching and return_indexes:
-        return matches_indexes
+    for date in map(split_dt, dates):
+        if date in time_axis_index:
+            matches_indexes.append(time_axis_index[date])
+
+    if invert_matching:
+        matches = set(matches_indexes)
+        indexes = [index for index in xrange(0, len(time_axis)) if not index in matches]
+    else:
+        indexes = matches_indexes
+
+    if return_indexes:
+        return indexes
     else:
-        return matches_dates
+        return [time_axis[index] for index in indexes]
+
+
+def new_time_period(infile_name, var_id, outfile_name):
+    """Find the time steps of an input file variable that come after 
+    the end of an existing output file (e.g. for append_netcdf).
+
+    Returns the (start_date, end_date) of those time steps, in the 
+    form of the InputData time keyword argument, or None if the 
+    output file is up to date. The selection is by date, so the 
+    time steps must be daily or coarser.
+
+    """
+
+    infile = cdms2.open(infile_name)
+    in_time = infile[var_id].getTime()
+    units, calendar = in_time.units, in_time.getCalendar()
+    in_values = numpy.array(in_time[:])
+    infile.close()
+
+    outfile = cdms2.open(outfile_name)
+    out_time = [axis for axis in outfile.axes.values() if axis.isTime()][0]
+    last_date = out_time.asComponentTime()[-1]
+    outfile.close()
+
+    new_values = in_values[in_values > last_date.torel(units, calendar).value]
+    if not len(new_values):
+        return None
+
+    start, end = [cdtime.reltime(value, units).tocomp(calendar) for value in (new_values[0], new_values[-1])]
+    assert split_dt(start) != split_dt(last_date), \
+    'The new time steps must start on a new day (i.e. the data must be daily or coarser)'
+
+    return tuple(['%04i-%02i-%02i' %(date.year, date.month, date.day) for date in (start, end)])
 
 
 def normalise_data(indata, sub_mean=False):
@@ -576,25 +1397,180 @@ def normalise_data(indata, sub_mean=False):
     return data / std 
 
 
-def regrid_uniform(data, target_grid):
-    """Regrid data to a uniform output grid"""
+def _peak_rss():
+    """Return the peak resident memory of the process (bytes)."""
 
-    ingrid = data.getGrid()
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except IOError:
+        pass
+
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
     
-    if isinstance(target_grid, cdms2.grid.TransientRectGrid):
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024  # bytes on OS X, kilobytes on Linux
+
+
+def _process_io():
+    """Return the I/O counters of the process (or None if unavailable)."""
+
+    try:
+        with open('/proc/self/io') as io_file:
+            return dict((key, int(value)) for key, value in [line.split(':') for line in io_file])
+    except IOError:
+        return None
+
+
+def regrid_uniform(data, target_grid):
+    """Regrid data to a uniform output grid.
+
+    The regridding is area weighted (i.e. conservative), like 
+    regrid2.Horizontal. The weights for each input/output grid pair 
+    are calculated once (see regrid_weights) and applied to all 
+    time steps (and levels) with a single sparse matrix multiplication.
+    Output grid cells with no valid input data are masked.
+
+    """
+
+    assert data.getOrder()[-2:] == 'yx', \
+    'The last two dimensions of the input data must be latitude and longitude'
+
+    if hasattr(target_grid, 'getLatitude'):
         outgrid = target_grid
     else:
         assert isinstance(target_grid, (list, tuple)) and len(target_grid) == 6, \
-    'Target grid must be a cdms2.grid.TransientRectGrid or list specifying: startLat, nlat, deltaLat, startLon, nlon, deltaLon'
+        'Target grid must be a cdms2 rectilinear grid or list specifying: startLat, nlat, deltaLat, startLon, nlon, deltaLon'
     
-    startLat, nlat, deltaLat, startLon, nlon, deltaLon = target_grid
-    outgrid = cdms2.createUniformGrid(startLat, nlat, deltaLat, startLon, nlon, deltaLon)
+        startLat, nlat, deltaLat, startLon, nlon, deltaLon = target_grid
+        outgrid = cdms2.createUniformGrid(startLat, int(nlat), deltaLat, startLon, int(nlon), deltaLon)
     
-    regridFunc = regrid2.Horizontal(ingrid, outgrid)
+    out_lat = outgrid.getLatitude()
+    out_lon = outgrid.getLongitude()
+    weights = regrid_weights(data.getLatitude(), data.getLongitude(), out_lat, out_lon)
+
+    ny_in, nx_in = data.shape[-2:]
+    other_shape = data.shape[:-2]
     
-    return regridFunc(data)
+    indata = numpy.ma.masked_array(data, dtype=numpy.float64)
+    values = indata.filled(0.0).reshape((-1, ny_in * nx_in)).T
+    valid = ~numpy.ma.getmaskarray(indata).reshape((-1, ny_in * nx_in)).T
+    
+    numerator = weights.dot(values)
+    if valid.all():
+        denominator = weights.dot(numpy.ones((ny_in * nx_in, 1)))
+    else:
+        denominator = weights.dot(valid.astype(numpy.float64))
+
+    no_data = (denominator == 0) | numpy.zeros(numerator.shape, dtype=bool)
+    outvals = numpy.ma.masked_array(numerator / numpy.where(denominator == 0, 1.0, denominator), mask=no_data)
+    outvals = outvals.T.reshape(other_shape + (len(out_lat), len(out_lon)))
+    
+    axes = data.getAxisList()[:-2] + [out_lat, out_lon]
+    outdata = cdms2.createVariable(outvals.astype(data.dtype), axes=axes, id=data.id, fill_value=data.fill_value)
+    for att, value in data.attributes.iteritems():
+        if not att in ['_FillValue', 'missing_value']:
+            setattr(outdata, att, value)
+
+    return outdata
      
 
+def regrid_weights(in_lat, in_lon, out_lat, out_lon):
+    """Return the area weights for regridding between two 
+    rectilinear grids, as a sparse matrix.
+
+    Element [i, j] of the matrix is the area (on the unit sphere)
+    of the overlap between output grid cell i and input grid cell j, 
+    with cells numbered in (lat, lon) order (i.e. a flattened 2D field).
+
+    The weights for each grid pair (as defined by the cell bounds) 
+    are calculated once and stored in memory for subsequent calls. 
+    Only the regrid_cache_max_entries most recently used grid pairs 
+    are kept.
+
+    """
+
+    bounds = [_axis_bounds(in_lat, latitude=True), _axis_bounds(in_lon),
+              _axis_bounds(out_lat, latitude=True), _axis_bounds(out_lon)]
+    key = tuple(axis_bounds.tostring() for axis_bounds in bounds)
+    
+    if _regrid_weights_cache.has_key(key):
+        weights = _regrid_weights_cache.pop(key)
+    else:
+        in_lat_bounds, in_lon_bounds, out_lat_bounds, out_lon_bounds = bounds
+        lat_weights = _overlap_weights(out_lat_bounds, in_lat_bounds, latitude=True)
+        lon_weights = _overlap_weights(out_lon_bounds, in_lon_bounds)
+        weights = sparse.kron(lat_weights, lon_weights, format='csr')
+        while len(_regrid_weights_cache) >= regrid_cache_max_entries:
+            _regrid_weights_cache.popitem(last=False)  # least recently used
+
+    _regrid_weights_cache[key] = weights
+
+    return weights
+
+
+def _axis_bounds(axis, latitude=False):
+    """Return the (lower, upper) cell bounds for a latitude or longitude axis.
+
+    If the axis has no bounds, they are placed halfway between the axis values.
+
+    """
+
+    bounds = axis.getBounds() if hasattr(axis, 'getBounds') else None
+    
+    if bounds is None:
+        values = numpy.array(axis[:], dtype=numpy.float64)
+        if len(values) == 1:
+            edges = numpy.array([values[0] - 0.5, values[0] + 0.5])
+        else:
+            mid = (values[1:] + values[:-1]) / 2.0
+            edges = numpy.concatenate(([2 * values[0] - mid[0]], mid, [2 * values[-1] - mid[-1]]))
+        bounds = numpy.array([edges[:-1], edges[1:]]).T
+
+    bounds = numpy.sort(numpy.array(bounds, dtype=numpy.float64), axis=1)
+    if latitude:
+        bounds = numpy.clip(bounds, -90.0, 90.0)
+
+    return bounds
+
+
+def _overlap_weights(out_bounds, in_bounds, latitude=False):
+    """Return a sparse matrix of the overlap between each output 
+    and input cell along a single (latitude or longitude) axis.
+
+    For latitude the overlap is measured in sin(latitude) (i.e. it is 
+    proportional to area), while longitude is treated as cyclic.
+
+    """
+
+    out_lower = out_bounds[:, 0][:, numpy.newaxis]
+    out_upper = out_bounds[:, 1][:, numpy.newaxis]
+    
+    if latitude:
+        lower = numpy.maximum(out_lower, in_bounds[:, 0])
+        upper = numpy.minimum(out_upper, in_bounds[:, 1])
+        overlap = numpy.where(upper > lower, numpy.sin(numpy.deg2rad(upper)) - numpy.sin(numpy.deg2rad(lower)), 0.0)
+    else:
+        overlap = numpy.zeros((len(out_bounds), len(in_bounds)))
+        for shift in [-720.0, -360.0, 0.0, 360.0, 720.0]:
+            lower = numpy.maximum(out_lower, in_bounds[:, 0] + shift)
+            upper = numpy.minimum(out_upper, in_bounds[:, 1] + shift)
+            overlap = overlap + numpy.where(upper > lower, numpy.deg2rad(upper - lower), 0.0)
+
+    return sparse.csr_matrix(overlap)
+
+
+def _reset_peak_rss():
+    """Reset the peak resident memory of the process (Linux 4.0 or later only)."""
+
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+    except IOError:
+        pass
+
+
 def running_average(data, window):
     """Calculate running average with desired window."""
 
@@ -620,6 +1596,9 @@ def scale_offset(data, scale=1.0, offset=0.0):
 def split_dt(dt):
     """Split a getTime().asComponentTime() date/time into year, month and day parts"""
     
+    if hasattr(dt, 'year'):
+        return (int(dt.year), int(dt.month), int(dt.day))
+
     date = str(dt).split()[0]
     year, month, day = date.split('-')
     
@@ -633,6 +1612,188 @@ def find_nearest(array, value):
     return array[idx]
 
 
+def _parse_time_selector(time_selector):
+    """Check a time selector and split it into its date range 
+    and month/season parts.
+
+    Returns:
+      date_selector -- (start_date, end_date) or None
+      months        -- tuple of selected months (1-12) or None
+
+    """
+
+    assert isinstance(time_selector, (list, tuple)), \
+    'time selector must be a list or tuple'
+
+    assert len(time_selector) == 2 or len(time_selector) == 3, \
+    'time selector must be length two or three'
+
+    date_pattern = '([0-9]{4})-([0-9]{1,2})-([0-9]{1,2})'
+    assert re.search(date_pattern, time_selector[0]) or time_selector[0].lower() == 'none'
+    assert re.search(date_pattern, time_selector[1]) or time_selector[1].lower() == 'none'
+    valid_trange = re.search(date_pattern, time_selector[0]) and re.search(date_pattern, time_selector[1])
+    date_selector = tuple(time_selector[0:2]) if valid_trange else None
+
+    months = None
+    if len(time_selector) == 3 and time_selector[2].lower() != 'none':
+        month_selector = time_selector[2]
+        assert (month_selector in month_dict.keys()) or (month_selector in season_dict.keys())
+        selection = (month_selector,) if month_selector in month_dict.keys() else season_dict[month_selector]
+        months = tuple(month_dict[month] for month in selection)
+
+    return date_selector, months
+
+
+def _read_cache(cache_dir, cache_key):
+    """Read an InputData cache entry.
+
+    Returns (data, global_atts), or None if there is no entry.
+    The data values (and mask) are memory mapped. 
+
+    """
+
+    entry_dir = os.path.join(cache_dir, 'inputdata_%s' %(cache_key))
+    if not os.path.isdir(entry_dir):
+        return None
+
+    with open(os.path.join(entry_dir, 'metadata.pkl'), 'rb') as metafile:
+        metadata = cPickle.load(metafile)
+
+    values = numpy.load(os.path.join(entry_dir, 'values.npy'), mmap_mode='c')
+    mask_file = os.path.join(entry_dir, 'mask.npy')
+    mask = numpy.load(mask_file, mmap_mode='c') if os.path.isfile(mask_file) else numpy.ma.nomask
+
+    axes = [_create_axis(axis_metadata) for axis_metadata in metadata['axes']]
+    data = cdms2.createVariable(numpy.ma.masked_array(values, mask=mask, fill_value=metadata['fill_value']), 
+                                axes=axes, id=metadata['id'], copy=0)
+    for key, value in metadata['attributes'].iteritems():
+        if not key in ['_FillValue', 'missing_value']:
+            setattr(data, key, value)
+
+    os.utime(entry_dir, None)  # record the use (for the least recently used eviction)
+
+    return data, metadata['global_atts']
+
+
+def _read_time_indexes(infile, var_id, indexes, **kwargs):
+    """Read the data corresponding to a set of (ascending) time indexes.
+
+    Each contiguous run of indexes is extracted with a single read. 
+    Any other selectors (latitude, longitude, level, squeeze) are 
+    passed straight through to the read.
+
+    """
+
+    squeeze = kwargs.pop('squeeze', 0)
+    
+    indexes = numpy.asarray(indexes)
+    assert indexes.size > 0, \
+    'No data in the selected time period'
+    run_breaks = numpy.where(numpy.diff(indexes) != 1)[0] + 1
+    run_starts = numpy.concatenate(([indexes[0]], indexes[run_breaks]))
+    run_ends = numpy.concatenate((indexes[run_breaks - 1], [indexes[-1]]))
+
+    extracts = []
+    for start, end in zip(run_starts, run_ends):
+        extracts.append(infile(var_id, time=slice(int(start), int(end) + 1), **kwargs))
+
+    if len(extracts) > 1:
+        data = MV2.concatenate(extracts, axis=0)
+        #reinstate stripped attributes
+        for att in infile.listattribute(vname=var_id):
+            if not att == 'missing_value':
+                setattr(data, att, infile.getattribute(var_id, att))
+    else:
+        data = extracts[0]
+
+    if squeeze:
+        data = data(squeeze=1)
+
+    return data
+
+
+def _spatial_reduction(data, **kwargs):
+    """Apply the mermax and spatave manipulators."""
+
+    if kwargs.has_key('mermax'):
+        lat_index = data.getOrder().index('y')
+        data = MV2.max(data, axis=lat_index)
+        
+    if kwargs.has_key('spatave'):
+        ave_axes = data.getOrder().translate(None, 't')
+        data = cdutil.averager(data, axis=ave_axes, weights=['unweighted']*len(ave_axes))
+
+    return data
+
+
+def _spatial_selectors(infile, **kwargs):
+    """Prepare the non-time selectors for reading data from infile.
+
+    Data are always squeezed and singular latitude or longitude 
+    selections are replaced by the nearest available value.
+
+    """
+
+    kwargs['squeeze'] = 1
+
+    for axis in ['latitude', 'longitude']:
+        if axis in kwargs.keys():
+            if type(kwargs[axis]) == int or type(kwargs[axis]) == float:
+                try:
+                    axis_vals = infile.getAxis(axis)[:]
+                except TypeError:
+                    axis_vals = infile.getAxis(axis[0:3])[:]
+                nearest = find_nearest(axis_vals, kwargs[axis])
+                if kwargs[axis] != nearest:
+                    print "Selected %s not available, used %s instead" %(axis, str(nearest))
+                    kwargs[axis] = nearest
+
+    return kwargs
+
+
+def _split_kwargs(obj, kwargs):
+    """Process the InputData keyword arguments.
+
+    Regions are converted to latitude and longitude selectors 
+    (and recorded as attributes of obj) and None values are removed.
+
+    Returns the remaining kwargs and those that are subsettors.
+
+    """
+
+    if kwargs.has_key('region'):   
+        try:
+            kwargs['latitude'], kwargs['longitude'] = regions[kwargs['region']]
+            obj.minlat, obj.maxlat = kwargs['latitude'][0:2]
+            obj.minlon, obj.maxlon = kwargs['longitude'][0:2]
+            obj.region = kwargs['region']
+        except KeyError:
+            print 'region not defined - using all spatial data...'    
+        del kwargs['region']
+
+    #remove None values
+    for key in kwargs.keys():
+        if not kwargs[key]:
+            del kwargs[key]
+
+    subsettors = ['latitude', 'level', 'longitude', 'time']
+    subset_kwargs = {}
+    for key in kwargs.keys():
+        if key in subsettors:
+            subset_kwargs[key] = kwargs[key]
+
+    return kwargs, subset_kwargs
+
+
+def _stage(profile, stage_name, func, *args, **kwargs):
+    """Run a processing stage, recording it in profile (a StageProfile or None)."""
+
+    if profile is None:
+        return func(*args, **kwargs)
+    else:
+        return profile.run(stage_name, func, *args, **kwargs)
+
+
 def _subset_data(infile, var_id, **kwargs):
     """Take a subset of the infile data
     
@@ -649,81 +1810,21 @@ def _subset_data(infile, var_id, **kwargs):
 
     assert type(infile) == cdms2.dataset.CdmsFile      
     
-    # Data are always squeezed
-    kwargs['squeeze'] = 1
-
-    # Account for singular latitude or longitude selections
-    for axis in ['latitude', 'longitude']:
-        if axis in kwargs.keys():
-            if type(kwargs[axis]) == int or type(kwargs[axis]) == float:
-                try:
-                    axis_vals = infile.getAxis(axis)[:]
-                except TypeError:
-                    axis_vals = infile.getAxis(axis[0:3])[:]
-                nearest = find_nearest(axis_vals, kwargs[axis])
-                if kwargs[axis] != nearest:
-                    print "Selected %s not available, used %s instead" %(axis, str(nearest))
-                    kwargs[axis] = nearest
+    kwargs = _spatial_selectors(infile, **kwargs)
     
-    # Final selection (involves some messy time stuff)      
+    # Final selection
     if kwargs.has_key('time'):
-        assert isinstance(kwargs['time'], (list, tuple)), \
-        'time selector must be a list or tuple'
-
-        assert len(kwargs['time']) == 2 or len(kwargs['time']) == 3, \
-        'time selector must be length two or three'
-
-        date_pattern = '([0-9]{4})-([0-9]{1,2})-([0-9]{1,2})'
-        assert re.search(date_pattern, kwargs['time'][0]) or kwargs['time'][0].lower() == 'none'
-        assert re.search(date_pattern, kwargs['time'][1]) or kwargs['time'][1].lower() == 'none'
-        valid_trange = re.search(date_pattern, kwargs['time'][0]) and re.search(date_pattern, kwargs['time'][1])
-
-        month_dict = {'JAN': 1, 'FEB': 2, 'MAR': 3, 'APR': 4, 
-                      'MAY': 5, 'JUN': 6, 'JUL': 7, 'AUG': 8, 
-                      'SEP': 9, 'OCT': 10, 'NOV': 11, 'DEC': 12}
-        season_dict = {'DJF': ('JAN', 'FEB', 'DEC'),
-                       'MAM': ('MAR', 'APR', 'MAY'),
-                       'JJA': ('JUN', 'JUL', 'AUG'),
-                       'SON': ('SEP', 'OCT', 'NOV')}
-        if len(kwargs['time']) == 3 and kwargs['time'][2].lower() != 'none':
-            assert (kwargs['time'][2] in month_dict.keys()) or (kwargs['time'][2] in season_dict.keys())
-
-            month_selector = kwargs['time'][2]
-            date_selector = kwargs['time'][0:2]
+        date_selector, months = _parse_time_selector(kwargs['time'])
+
+        if months:
+            #make the month/season (and date range) selection with a 
+            #single read for each contiguous block of time indexes
+            indexes = _time_indexes(infile.getAxis('time'), kwargs['time'])
             del kwargs['time']
+            data = _read_time_indexes(infile, var_id, indexes, **kwargs)
 
-            #make the month/season selection
-            months = (month_selector,) if month_selector in month_dict.keys() else season_dict[month_selector]
-            datetimes = infile.getAxis('time').asComponentTime()
-            years_all = []
-            for datetime in datetimes:
-                years_all.append(int(str(datetime).split('-')[0]))
-            years_unique = list(set(years_all))
-
-            extracts = []
-            for year in years_unique:
-                for month in months: 
-                    start_date = str(year)+'-'+str(month_dict[month])+'-1 00:00:0.0'
-                    end_date = str(year)+'-'+str(month_dict[month])+'-'+str(calendar.monthrange(year, month_dict[month])[-1])+' 23:59:0.0'
-                    kwargs['time'] = (start_date, end_date)
-                    try:
-                        extracts.append(infile(var_id, **kwargs))
-                    except cdms2.error.CDMSError:
-                        continue
-
-            data = MV2.concatenate(extracts, axis=0) if len(extracts) > 1 else extracts[0]      
-
-            #make the date range selection
-            if valid_trange:
-                data = data(time=date_selector)
-
-            #reinstate stripped attributes
-            for att in infile.listattribute(vname=var_id):
-                if not att == 'missing_value':
-                    setattr(data, att, infile.getattribute(var_id, att))
-
-        elif valid_trange:
-            kwargs['time'] = (kwargs['time'][0]+' 0:0:0.0', kwargs['time'][1]+' 23:59:0.0')
+        elif date_selector:
+            kwargs['time'] = (date_selector[0]+' 0:0:0.0', date_selector[1]+' 23:59:0.0')
             data = infile(var_id, **kwargs)
 
         else:
@@ -735,6 +1836,41 @@ def _subset_data(infile, var_id, **kwargs):
     return data
 
 
+def _time_indexes(time_axis, time_selector=None):
+    """Return the indexes of the time axis values that satisfy 
+    the time selector (consistent with the selection made by _subset_data).
+
+    Arguments:
+      time_axis     -- cdms2 time axis
+      time_selector -- ('1979-01-01', '2000-12-31', 'MONTH/SEASON')
+                       (see _subset_data for details)
+
+    """
+
+    indexes = numpy.arange(len(time_axis))
+    if not time_selector:
+        return indexes
+
+    date_selector, months = _parse_time_selector(time_selector)
+    selection = numpy.ones(len(time_axis), dtype=bool)
+
+    if months:
+        time_months = decode_time_axis(time_axis)['month']
+        selection = selection & numpy.in1d(time_months, months)
+    
+    if date_selector:
+        # For month/season selections _subset_data applies the default 
+        # cdms2 bounds (i.e. up to the start of the end date)
+        end_time = ' 0:0:0.0' if months else ' 23:59:0.0'
+        units, calendar = time_axis.units, time_axis.getCalendar()
+        start = cdtime.s2c(date_selector[0]+' 0:0:0.0').torel(units, calendar).value
+        end = cdtime.s2c(date_selector[1]+end_time).torel(units, calendar).value
+        time_values = numpy.array(time_axis[:])
+        selection = selection & (time_values >= start) & (time_values <= end)
+
+    return indexes[selection]
+
+
 def temporal_aggregation(data, output_timescale, output_quantity, time_period=None):
     """Create a temporal aggregate of the input data, or further process it
     to produce a climatology or anomaly timeseries.
@@ -865,29 +2001,48 @@ def temporal_extract(data, selection, indexes=True, tvar_out=True):
 def time_axis_check(axis1, axis2):
     """Checks whether the time axes of the input files are the same"""
     
-    start_time1 = axis1.asComponentTime()[0]
-    start_time1 = str(start_time1)
-    start_year1 = start_time1.split('-')[0]
-    
-    end_time1 = axis1.asComponentTime()[-1]
-    end_time1 = str(end_time1)
-    end_year1 = end_time1.split('-')[0]
-    
-    start_time2 = axis2.asComponentTime()[0]
-    start_time2 = str(start_time2)
-    start_year2 = start_time2.split('-')[0]
-    
-    end_time2 = axis2.asComponentTime()[-1]
-    end_time2 = str(end_time2)
-    end_year2 = end_time2.split('-')[0]
+    start_year1 = decode_time_axis(axis1)['year'][0]
+    start_year2 = decode_time_axis(axis2)['year'][0]
 
     if (start_year1 != start_year2 or len(axis1) != len(axis2)):
         sys.exit('Input files do not all have the same time axis')
 
 
+def _write_cache(cache_dir, cache_key, data, global_atts):
+    """Write an InputData cache entry (see _read_cache)."""
+
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    
+    entry_dir = os.path.join(cache_dir, 'inputdata_%s' %(cache_key))
+    temp_dir = '%s_%i' %(entry_dir, os.getpid())
+    if not os.path.isdir(temp_dir):
+        os.makedirs(temp_dir)
+
+    numpy.save(os.path.join(temp_dir, 'values.npy'), numpy.ma.getdata(data))
+    if numpy.ma.is_masked(data):
+        numpy.save(os.path.join(temp_dir, 'mask.npy'), numpy.ma.getmaskarray(data))
+
+    metadata = {'id': data.id,
+                'attributes': dict(data.attributes),
+                'fill_value': data.fill_value,
+                'axes': [_axis_metadata(axis) for axis in data.getAxisList()],
+                'global_atts': dict(global_atts)}
+    with open(os.path.join(temp_dir, 'metadata.pkl'), 'wb') as metafile:
+        cPickle.dump(metadata, metafile, cPickle.HIGHEST_PROTOCOL)
+
+    try:
+        os.rename(temp_dir, entry_dir)  # so that concurrent runs never read a partial entry
+    except OSError:
+        shutil.rmtree(temp_dir, ignore_errors=True)  # another process got there first
+
+    _evict_cache(cache_dir, cache_max_size)
+
+
 def write_netcdf(outfile_name, history_entry, global_atts, 
                  outdata, outvar_atts, outvar_axes, 
-                 clear_history=False, extra_history=' '):
+                 clear_history=False, extra_history=' ',
+                 compression=None, profile=None, unlimited_time=False):
     """Write an output netCDF file.
     
     Intended for use with a calculated quantity.
@@ -903,8 +2058,11 @@ def write_netcdf(outfile_name, history_entry, global_atts,
       global_atts   -- Dictionary of global attributes for output file
                        (usually obtained from InputData instances via
                        the .global_atts attribute)
-      outdata       -- List or tuple of numpy arrays, containing 
-                       the data for each output variable
+      outdata       -- List or tuple (or any iterable, such as a generator) 
+                       containing the data for each output variable. 
+                       The data for a variable can be a numpy array 
+                       or an iterator (e.g. a generator or InputDataStream)
+                       of time chunks, which are written as they arrive
       outvar_atts   -- List or tuple of dictionaries, containing 
                        the attriubtes for each output variable
                        Suggested minumum attributes include: id, 
@@ -919,19 +2077,38 @@ def write_netcdf(outfile_name, history_entry, global_atts,
                        to the corresponding attribute in the output file
       extra_history -- string of extra info to be added to the standard
                        global 'history' attribute output     
+      compression   -- zlib compression level (1-9). If given the output is
+                       a (shuffled and deflated) NetCDF4 file, otherwise
+                       it is NETCDF3_CLASSIC
+      profile       -- StageProfile instance, in which the writing of each
+                       variable is recorded as a stage (for generators this
+                       includes the time taken to generate the data)
+      unlimited_time -- True = make the time axis unlimited, so that the 
+                       output can be extended in place with append_netcdf
+
+    Each variable is written to file as soon as its data is available, 
+    so if outdata is a generator only one variable (or for chunked data, 
+    one time chunk) needs to be held in memory at a time.
 
     """
 
     assert type(global_atts) == dict
     
-    assert isinstance(outdata, (list, tuple)), \
-    '4th argument (outdata) must be a list or tuple of data arrays, e.g. (data,)'
+    assert hasattr(outdata, '__iter__'), \
+    '4th argument (outdata) must be an iterable (e.g. list, tuple or generator) of data arrays, e.g. (data,)'
     
     assert isinstance(outvar_atts, (list, tuple)) and type(outvar_atts[0]) == dict, \
     '5th argument (outvar_atts) must be a list or tuple of dictionaries, e.g. (atts,)'
     
     assert isinstance(outvar_axes, (list, tuple)), \
     '6th argument (outvar_axes) must be a list or tuple of axis lists or tuples, e.g. (data.getTime(),)'
+
+    nvars = len(outvar_atts)
+    assert len(outvar_axes) == nvars, \
+    'outvar_atts (%i variables) and outvar_axes (%i) must be the same length' %(nvars, len(outvar_axes))
+    if hasattr(outdata, '__len__'):
+        assert len(outdata) == nvars, \
+        'outdata (%i variables) and outvar_atts (%i) must be the same length' %(len(outdata), nvars)
     
     for axes in outvar_axes:
 	index = 0
@@ -941,43 +2118,120 @@ def write_netcdf(outfile_name, history_entry, global_atts,
             '6th argument (outvar_axes) elements must a time, latitude or longitude axis, in that order'
             index = test.index(1)
 
-    outfile = cdms2.open(outfile_name, 'w')
+    if compression:
+        assert compression in range(1, 10), 'compression must be a zlib compression level (1-9)'
+        file_format = 'NETCDF4, zlib compression level %i' %(compression)
+    else:
+        file_format = 'NETCDF3_CLASSIC'
+
+    _set_netcdf_compression(compression)
+    try:
+        outfile = cdms2.open(outfile_name, 'w')
+        try:
+            # Global attributes #
     
-    # Global attributes #
+            for att_name in global_atts.keys():
+                if att_name not in ["history", "calendar"]:  # Calendar excluded because iris doesn't like it
+                    setattr(outfile, att_name, global_atts[att_name])
     
-    for att_name in global_atts.keys():
-        if att_name not in ["history", "calendar"]:  # Calendar excluded because iris doesn't like it
-            setattr(outfile, att_name, global_atts[att_name])
+            if not clear_history:
+                old_history = global_atts['history'] if ('history' in \
+                              global_atts.keys()) else ''
+            else:
+                old_history = ''
     
-    if not clear_history:
-        old_history = global_atts['history'] if ('history' in \
-                      global_atts.keys()) else ''
-    else:
-        old_history = ''
+            timestamp = gio.get_timestamp()
+            setattr(outfile, 'history', 
+            """%s [format=%s]. %s\n%s""" %(timestamp, file_format, extra_history, old_history))
+
+            # Variables #
+
+            nwritten = 0
+            for data in outdata:
+                assert nwritten < nvars, 'outdata has more variables than outvar_atts (%i)' %(nvars)
+                atts = outvar_atts[nwritten]
+
+                outvar_axis_list = []
+                for axis in outvar_axes[nwritten]:
+                    outvar_axis_list.append(outfile.copyAxis(axis, unlimited=int(unlimited_time and axis.isTime())))
+
+                _stage(profile, 'write_%s' %(atts['id']), _write_variable, outfile, data, atts, outvar_axis_list)
+                nwritten = nwritten + 1
+
+            assert nwritten == nvars, \
+            'outdata (%i variables) and outvar_atts (%i) must be the same length' %(nwritten, nvars)
+        finally:
+            outfile.close()
+    finally:
+        _set_netcdf_compression(None)
+
+
+def _set_netcdf_compression(compression):
+    """Set the cdms2 NetCDF4 shuffle and deflate flags.
+
+    compression is a zlib compression level (1-9), 
+    or None for no compression (i.e. NETCDF3_CLASSIC output).
+
+    """
+
+    flag = 1 if compression else 0
+    cdms2.setNetcdfShuffleFlag(flag)
+    cdms2.setNetcdfDeflateFlag(flag)
+    cdms2.setNetcdfDeflateLevelFlag(compression if compression else 0)
+
+
+def _write_variable(outfile, data, atts, axes):
+    """Write a variable to outfile (see write_netcdf).
+
+    Returns the output file variable.
+
+    """
+
+    if isinstance(data, InputDataStream) or hasattr(data, 'next'):
+        return _write_time_chunks(outfile, data, atts, axes)
     
-    timestamp = gio.get_timestamp()
-    setattr(outfile, 'history', 
-    """%s [format=NETCDF3_CLASSIC]. %s\n%s""" %(timestamp, extra_history, old_history))
+    data = numpy.ma.asarray(data)
+    if data.dtype != numpy.float32:
+        data = data.astype(numpy.float32)
+    var = cdms2.createVariable(data, copy=0)
+    var.setAxisList(axes)
 
-    # Variables #
+    for key, value in atts.iteritems():
+        setattr(var, key, value)
 
-    nvars = len(outdata)
-    for index in range(0, nvars):
+    return outfile.write(var)  
 
-        outvar_axis_list = []
-        for axis in outvar_axes[index]:
-            outvar_axis_list.append(outfile.copyAxis(axis))
 
-        var = cdms2.MV2.array(outdata[index])
-        var = var.astype(numpy.float32)
-        var.setAxisList(outvar_axis_list)
+def _write_time_chunks(outfile, chunks, atts, axes):
+    """Write a variable to outfile one time chunk at a time.
 
-        for key, value in outvar_atts[index].iteritems():
+    Arguments:
+      outfile -- cdms2 file (open for writing)
+      chunks  -- Iterator of data arrays (time must be the first axis)
+      atts    -- Dictionary of variable attributes (must include id)
+      axes    -- List of output file axes (time must be the first axis)
+
+    """
+
+    assert axes[0].isTime(), 'Time must be the first axis for data written in time chunks'
+
+    fill_value = atts.get('missing_value', 1.0e20)
+    var = outfile.createVariable(atts['id'], numpy.dtype('float32').char, axes, fill_value=fill_value)
+    for key, value in atts.iteritems():
+        if key != 'id':
             setattr(var, key, value)
+    var.missing_value = fill_value
 
-        outfile.write(var)  
+    start = 0
+    for chunk in chunks:
+        chunk = numpy.ma.filled(numpy.ma.asarray(chunk, dtype=numpy.float32), fill_value)
+        var[start:start + chunk.shape[0]] = chunk
+        start = start + chunk.shape[0]
 
-    outfile.close()
+    assert start == len(axes[0]), \
+    'The time chunks for %s (%i time steps) do not match its time axis (%i)' %(atts['id'], start, len(axes[0]))
+
+    return var
 
 
 def xy_axis_check(axis1, axis2):
@@ -0,0 +1,273 @@
+"""
+Collection of classes and functions for running a data processing
+workflow (i.e. a directed acyclic graph of steps) in the manner of make.
+
+A step is only rerun if one of its outputs is missing or older than its
+inputs, or if the provenance recorded in its first output (see read_provenance)
+shows that the output was created with different command line arguments or
+an older version of the code. Steps that do not depend on each other are
+run concurrently on a local process pool.
+
+To import:
+module_dir = os.path.join(os.environ['HOME'], 'phd', 'modules')
+sys.path.insert(0, module_dir)
+
+Included functions:
+code_changed     -- Check whether the code has changed since a given git commit
+read_provenance  -- Read the provenance (command line and git hash) of an output file
+step_status      -- Determine whether a step needs to be run
+
+Included classes:
+Step             -- A single step (command, inputs and outputs)
+Workflow         -- A collection of steps
+
+"""
+
+import os, sys, pdb
+import re
+import subprocess
+import multiprocessing
+import time
+
+import cdms2
+
+
+## Import my modules ##
+
+cwd = os.getcwd()
+repo_dir = '/'
+for directory in cwd.split('/')[1:]:
+    repo_dir = os.path.join(repo_dir, directory)
+    if directory == 'phd':
+        break
+
+modules_dir = os.path.join(repo_dir, 'modules')
+
+
+## Classes/functions ##
+
+class Step:
+    """A single workflow step."""
+
+    def __init__(self, script, args, inputs, outputs, name=None, executable=sys.executable, code_paths=None):
+        """Define a step.
+
+        Arguments:
+          script     -- Python script to run
+          args       -- list of command line arguments for the script
+          inputs     -- list of input files
+          outputs    -- list of output files (the provenance is read from the
+                        first, so it should be a netCDF file or a file with an
+                        accompanying .met file)
+
+        Keyword arguments:
+          name       -- name for progress messages [default = script and first output]
+          executable -- Python executable [default = the current one]
+          code_paths -- files and directories whose modification means the step
+                        must be rerun [default = the script and the modules directory]
+
+        """
+
+        assert len(outputs) > 0, 'A step must have at least one output'
+
+        self.script = script
+        self.args = [str(arg) for arg in args]
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.command = [executable, script] + self.args
+        self.name = name if name else '%s -> %s' %(os.path.basename(script), os.path.basename(outputs[0]))
+        self.code_paths = code_paths if code_paths else [script, modules_dir]
+
+
+class Workflow:
+    """A collection of steps, run as a directed acyclic graph."""
+
+    def __init__(self):
+        """Steps are added with the add method.
+
+        The graph is defined by matching the inputs of each step with
+        the outputs of the other steps (as for make).
+
+        """
+
+        self.steps = []
+
+
+    def add(self, step):
+        """Add a step to the workflow."""
+
+        existing_outputs = set([os.path.abspath(output) for other in self.steps for output in other.outputs])
+        for output in step.outputs:
+            assert not os.path.abspath(output) in existing_outputs, \
+            '%s is the output of more than one step' %(output)
+
+        self.steps.append(step)
+
+        return step
+
+
+    def dependencies(self):
+        """Return the indexes of the steps that each step depends on."""
+
+        producers = {}
+        for index, step in enumerate(self.steps):
+            for output in step.outputs:
+                producers[os.path.abspath(output)] = index
+
+        deps = []
+        for step in self.steps:
+            deps.append(set([producers[os.path.abspath(infile)] for infile in step.inputs if os.path.abspath(infile) in producers]))
+
+        return deps
+
+
+    def run(self, nprocs=1, force=False, dry_run=False):
+        """Run the steps that are out of date.
+
+        Each step is started as soon as the steps it depends on have
+        finished, with up to nprocs steps running at once. Steps that
+        depend on a failed step are not run.
+
+        Returns a list of the steps that failed (or were not run because
+        an upstream step failed).
+
+        """
+
+        deps = self.dependencies()
+        pending = range(len(self.steps))
+        done, rerun, failed = set(), set(), set()
+        running = {}
+
+        pool = multiprocessing.Pool(nprocs)
+        while pending or running:
+            ready = [index for index in pending if deps[index] <= (done | failed)]
+            if not (ready or running):
+                raise ValueError('The workflow contains a cycle')
+
+            for index in ready:
+                pending.remove(index)
+                step = self.steps[index]
+                if deps[index] & failed:
+                    print 'NOT RUN (upstream failure): %s' %(step.name)
+                    failed.add(index)
+                    continue
+
+                run_step, reason = step_status(step, force=force, upstream_rerun=bool(deps[index] & rerun))
+                print '%s: %s (%s)' %('RUN' if run_step else 'SKIP', step.name, reason)
+                if run_step:
+                    rerun.add(index)
+                if run_step and not dry_run:
+                    for output in step.outputs:
+                        output_dir = os.path.dirname(os.path.abspath(output))
+                        if not os.path.isdir(output_dir):
+                            os.makedirs(output_dir)
+                    running[index] = pool.apply_async(_run_command, (step.command,))
+                else:
+                    done.add(index)
+
+            for index, result in running.items():
+                if result.ready():
+                    del running[index]
+                    if result.get() == 0:
+                        done.add(index)
+                    else:
+                        print 'FAILED: %s' %(self.steps[index].name)
+                        failed.add(index)
+
+            if running:
+                time.sleep(0.1)
+
+        pool.close()
+        pool.join()
+
+        return [self.steps[index] for index in sorted(failed)]
+
+
+def _run_command(command):
+    """Run a command and return its exit status."""
+
+    return subprocess.call(command)
+
+
+def code_changed(git_hash, paths):
+    """Check whether any of paths has changed (including uncommitted
+    changes) since the git commit git_hash.
+
+    Also returns True if that cannot be determined (e.g. unknown hash).
+
+    """
+
+    with open(os.devnull, 'w') as devnull:
+        status = subprocess.call(['git', 'diff', '--quiet', git_hash, '--'] + [os.path.abspath(path) for path in paths],
+                                 cwd=repo_dir, stdout=devnull, stderr=devnull)
+
+    return status != 0
+
+
+def read_provenance(fname):
+    """Read the provenance of an output file.
+
+    The provenance is the most recent entry (i.e. the first line) of the
+    global history attribute for netCDF files, or of the accompanying .met
+    file (see general_io.write_metadata) for other files. Both are written
+    by general_io.get_timestamp, e.g.
+    Tue Oct 14 10:01:22 2014: /usr/bin/python script.py arg1 arg2 (Git hash: 1a2b3c4)
+
+    Returns a dictionary (script, args, git_hash) or None if there is
+    no provenance.
+
+    """
+
+    file_body, extension = os.path.splitext(fname)
+    if extension == '.nc':
+        infile = cdms2.open(fname)
+        history = infile.attributes.get('history', '')
+        infile.close()
+    else:
+        met_file = file_body + '.met'
+        if not os.path.isfile(met_file):
+            return None
+        with open(met_file) as infile:
+            history = infile.read()
+
+    match = re.match('.+? \d{4}: (\S+) (\S+)(.*?) \(Git hash: (\w+)\)', history)
+    if not match:
+        return None
+
+    return {'script': match.group(2),
+            'args': match.group(3).strip(),
+            'git_hash': match.group(4)}
+
+
+def step_status(step, force=False, upstream_rerun=False):
+    """Determine whether a step needs to be run.
+
+    Returns True or False and the reason.
+
+    """
+
+    if force:
+        return True, 'forced'
+    if upstream_rerun:
+        return True, 'an upstream step was rerun'
+
+    for output in step.outputs:
+        if not os.path.exists(output):
+            return True, 'missing output %s' %(output)
+
+    existing_inputs = [infile for infile in step.inputs if os.path.exists(infile)]
+    if existing_inputs:
+        newest_input = max([os.path.getmtime(infile) for infile in existing_inputs])
+        oldest_output = min([os.path.getmtime(output) for output in step.outputs])
+        if newest_input > oldest_output:
+            return True, 'inputs have changed'
+
+    provenance = read_provenance(step.outputs[0])
+    if not provenance:
+        return False, 'up to date (no provenance found, so only the file times were checked)'
+    if os.path.basename(provenance['script']) != os.path.basename(step.script) or provenance['args'] != ' '.join(step.args):
+        return True, 'arguments have changed'
+    if code_changed(provenance['git_hash'], step.code_paths):
+        return True, 'code has changed since commit %s' %(provenance['git_hash'])
+
+    return False, 'up to date'
@@ -0,0 +1,321 @@
+"""
+Filename:     benchmark_kernels.py
+Author:       Damien Irving, d.irving@student.unimelb.edu.au
+Description:  Time and record the peak memory usage of the
+              computationally intensive functions (kernels),
+              and compare the results with a baseline
+
+Input data are created with create_synthetic_reanalysis.py
+
+"""
+
+# Import general Python modules
+
+import sys, os, pdb
+import argparse
+import json
+import tempfile
+import platform
+import resource
+import multiprocessing
+import Queue
+import traceback
+import timeit
+import datetime
+
+import numpy
+
+# Import my modules #
+
+cwd = os.getcwd()
+repo_dir = '/'
+for directory in cwd.split('/')[1:]:
+    repo_dir = os.path.join(repo_dir, directory)
+    if directory == 'phd':
+        break
+
+for subdir in ['modules', 'data_processing']:
+    sys.path.append(os.path.join(repo_dir, subdir))
+
+try:
+    import netcdf_io as nio
+    import coordinate_rotation as crot
+    import calc_envelope
+    import calc_fourier_transform
+    import calc_wave_stats
+except ImportError:
+    raise ImportError('Must run this script from anywhere within the phd git repo')
+
+
+# Define functions #
+
+def extent_stats_loop(hovmoller, lons, threshold, lons_spacing):
+    """Apply calc_wave_stats.extent_stats to each time step in turn."""
+
+    lons_double = numpy.append(lons, lons)
+
+    return [calc_wave_stats.extent_stats(numpy.append(row, row), lons_double, threshold, lons_spacing) for row in hovmoller]
+
+
+def write_netcdf(data, atts, axes, global_atts):
+    """Write (and then delete) a temporary output file."""
+
+    fd, outfile = tempfile.mkstemp(suffix='.nc')
+    os.close(fd)
+    try:
+        nio.write_netcdf(outfile, 'benchmark_kernels.py', global_atts, [data], [atts], [axes])
+    finally:
+        if os.path.isfile(outfile):
+            os.remove(outfile)
+
+
+def define_kernels(inargs):
+    """Read the input data and define the kernels.
+
+    Returns a list of (name, function, args, kwargs).
+
+    """
+
+    latitude = tuple(inargs.latitude)
+    band = nio.InputData(inargs.infile, inargs.var, latitude=latitude)
+    band_data = numpy.ma.filled(band.data).astype(numpy.float64)
+    lons, lons_spacing = calc_wave_stats.get_lons(band.data)
+
+    hovmoller = numpy.max(calc_envelope.envelope(band_data, 3, 7), axis=1)
+    threshold = calc_wave_stats.calc_threshold(hovmoller, '75pct')
+
+    time_axis = map(str, band.data.getTime().asComponentTime())
+    numpy.random.seed(0)
+    dates = [time_axis[index].split()[0] for index in numpy.random.randint(0, len(time_axis), len(time_axis) / 5)]
+
+    first_date, last_date = time_axis[0].split()[0], time_axis[inargs.rotation_tsteps - 1].split()[0]
+    globe = nio.InputData(inargs.infile, inargs.var, time=(first_date, last_date, 'none'))
+    lat_axis, lon_axis = globe.data.getLatitude()[:], globe.data.getLongitude()[:]
+    lats_in, lons_in = nio.coordinate_pairs(lat_axis, lon_axis)
+
+    atts = {'id': inargs.var, 'long_name': 'benchmark output', 'units': band.data.units, 'missing_value': 1.0e20}
+
+    kernels = [('InputData', nio.InputData, (inargs.infile, inargs.var), {'latitude': latitude, 'time': (first_date, time_axis[-1].split()[0], 'DJF')}),
+               ('envelope', calc_envelope.envelope, (band_data, 3, 7), {}),
+               ('get_coefficients', calc_fourier_transform.get_coefficients, (band_data, lons, 1, 10), {}),
+               ('extent_stats', extent_stats_loop, (hovmoller, lons, threshold, lons_spacing), {}),
+               ('extent_stats_all', calc_wave_stats.extent_stats_all, (hovmoller, lons, threshold, lons_spacing), {}),
+               ('match_dates', nio.match_dates, (dates, time_axis), {}),
+               ('switch_regular_axes', crot.switch_regular_axes, (numpy.ma.filled(globe.data), lats_in, lons_in, lat_axis, lon_axis, inargs.new_np), {}),
+               ('write_netcdf', write_netcdf, (band.data, atts, band.data.getAxisList(), band.global_atts), {})]
+
+    if inargs.kernels:
+        kernels = [kernel for kernel in kernels if kernel[0] in inargs.kernels]
+
+    return kernels
+
+
+def peak_memory_mb():
+    """Return the peak resident memory of the current process (MB)."""
+
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    scale = 1024.0**2 if sys.platform == 'darwin' else 1024.0  # bytes on OS X, kilobytes on Linux
+
+    return maxrss / scale
+
+
+def _run_kernel(func, args, kwargs, repeats, queue):
+    """Time func (repeats times) and record the increase in peak memory.
+
+    Runs in a freshly forked process, which means the peak memory
+    starts at the memory usage inherited from the parent.
+
+    If func raises an exception, the traceback is put on the queue
+    instead (as the error of the result).
+
+    """
+
+    try:
+        start_memory = peak_memory_mb()
+        times = []
+        for repeat in range(repeats):
+            start_time = timeit.default_timer()
+            func(*args, **kwargs)
+            times.append(timeit.default_timer() - start_time)
+
+        queue.put({'time': min(times), 'times': times,
+                   'peak_memory': peak_memory_mb() - start_memory})
+    except Exception:
+        queue.put({'error': traceback.format_exc()})
+
+
+def benchmark(func, args, kwargs, repeats, timeout=None, poll_interval=1.0):
+    """Benchmark a kernel in a separate process (see _run_kernel).
+
+    Returns a dictionary with an error (and no results) if the kernel 
+    raised an exception, its process died (e.g. it was killed for using
+    too much memory) or it ran for longer than timeout seconds.
+
+    """
+
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_run_kernel, args=(func, args, kwargs, repeats, queue))
+    process.start()
+    start_time = timeit.default_timer()
+
+    result = None
+    while result is None:
+        try:
+            result = queue.get(timeout=poll_interval)
+        except Queue.Empty:
+            if not process.is_alive():
+                try:
+                    result = queue.get(timeout=poll_interval)  # in case the result arrived as the process exited
+                except Queue.Empty:
+                    result = {'error': 'process exited (exit code %s) without a result' %(str(process.exitcode))}
+            elif timeout and timeit.default_timer() - start_time > timeout:
+                process.terminate()
+                result = {'error': 'timed out after %.0f seconds' %(timeout)}
+
+    process.join()
+
+    return result
+
+
+def compare(results, baseline, tolerance, min_memory=10.0):
+    """Compare the results with a baseline.
+
+    A kernel has regressed if its time or peak memory exceeds the
+    baseline by more than the tolerance (a fraction of the baseline).
+    Memory differences smaller than min_memory (MB) are ignored.
+
+    Returns the report (a list of lines) and a list of regressed kernels.
+
+    """
+
+    report = ['%-20s %12s %12s %8s %14s %14s %8s' %('kernel', 'time (s)', 'baseline', 'change',
+                                                    'memory (MB)', 'baseline', 'change')]
+    regressions = []
+    for name in sorted(results.keys()):
+        result = results[name]
+        if not name in baseline:
+            report.append('%-20s %12.4f %12s %8s %14.1f %14s %8s' %(name, result['time'], '-', '-', result['peak_memory'], '-', '-'))
+            continue
+
+        base = baseline[name]
+        time_change = (result['time'] - base['time']) / base['time']
+        memory_diff = result['peak_memory'] - base['peak_memory']
+        memory_change = memory_diff / max(base['peak_memory'], min_memory)
+
+        flags = ''
+        if time_change > tolerance:
+            flags = flags + ' TIME'
+        if memory_diff > min_memory and memory_change > tolerance:
+            flags = flags + ' MEMORY'
+        if flags:
+            regressions.append(name)
+
+        report.append('%-20s %12.4f %12.4f %+7.0f%% %14.1f %14.1f %+7.0f%%%s' %(name, result['time'], base['time'], 100 * time_change,
+                                                                            result['peak_memory'], base['peak_memory'], 100 * memory_change,
+                                                                            ' <-- REGRESSION:' + flags if flags else ''))
+
+    return report, regressions
+
+
+def main(inargs):
+    """Run the program."""
+
+    kernels = define_kernels(inargs)
+
+    results = {}
+    failures = {}
+    for name, func, args, kwargs in kernels:
+        print 'Running', name
+        result = benchmark(func, args, kwargs, inargs.repeats, timeout=inargs.timeout)
+        if 'error' in result:
+            print result['error']
+            failures[name] = result['error']
+        else:
+            results[name] = result
+
+    metadata = {'infile': os.path.abspath(inargs.infile),
+                'infile_size': os.path.getsize(inargs.infile),
+                'var': inargs.var,
+                'latitude': inargs.latitude,
+                'repeats': inargs.repeats,
+                'timestamp': datetime.datetime.now().isoformat(),
+                'host': platform.node(),
+                'python': platform.python_version(),
+                'numpy': numpy.__version__}
+
+    with open(inargs.outfile, 'w') as outfile:
+        json.dump({'metadata': metadata, 'results': results, 'failures': failures}, outfile, indent=2, sort_keys=True)
+
+    if inargs.baseline:
+        with open(inargs.baseline) as infile:
+            baseline = json.load(infile)['results']
+        report, regressions = compare(results, baseline, inargs.tolerance)
+    else:
+        report, regressions = compare(results, {}, inargs.tolerance)
+
+    for name in sorted(failures.keys()):
+        report.append('%-20s FAILED: %s' %(name, failures[name].strip().split('\n')[-1]))
+
+    print '\n'.join(report)
+    errors = []
+    if failures:
+        errors.append('Failed: ' + ', '.join(sorted(failures.keys())))
+    if regressions:
+        errors.append('Regressions: ' + ', '.join(regressions))
+    if errors:
+        sys.exit('\n'.join(errors))
+
+
+if __name__ == '__main__':
+
+    extra_info ="""
+example:
+    /usr/local/uvcdat/1.5.1/bin/cdat create_synthetic_reanalysis.py
+    va_synthetic_daily_r360x181.nc --resolution 1.0 --years 10
+
+    /usr/local/uvcdat/1.5.1/bin/cdat benchmark_kernels.py
+    va_synthetic_daily_r360x181.nc va benchmark_new.json
+    --baseline benchmark_baseline.json
+
+notes:
+    Each kernel is run in its own (forked) process, so that its peak
+    memory usage can be recorded. The time is the best of --repeats runs.
+    The output file can be used as the baseline for subsequent runs.
+    The script exits with an error if any kernel has regressed or
+    failed (i.e. raised an exception, died or exceeded --timeout).
+
+"""
+
+    kernel_names = ['InputData', 'envelope', 'get_coefficients', 'extent_stats', 'extent_stats_all',
+                    'match_dates', 'switch_regular_axes', 'write_netcdf']
+
+    description='Benchmark the computationally intensive functions'
+    parser = argparse.ArgumentParser(description=description,
+                                     epilog=extra_info,
+                                     argument_default=argparse.SUPPRESS,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    parser.add_argument("infile", type=str, help="Input file (from create_synthetic_reanalysis.py)")
+    parser.add_argument("var", type=str, help="Input file variable")
+    parser.add_argument("outfile", type=str, help="Output JSON file name")
+
+    parser.add_argument("--baseline", type=str, default=None,
+                        help="JSON file (output from a previous run) to compare the results against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Fractional increase in time or memory that counts as a regression [default = 0.2]")
+    parser.add_argument("--repeats", type=int, default=3,
+                        help="Number of times each kernel is run [default = 3]")
+    parser.add_argument("--timeout", type=float, default=None,
+                        help="Time limit (seconds) for each kernel, including all repeats [default = no limit]")
+    parser.add_argument("--kernels", type=str, nargs='*', choices=kernel_names, default=None,
+                        help="Kernels to run [default = all]")
+    parser.add_argument("--latitude", type=float, nargs=2, metavar=('START', 'END'), default=[-70, -40],
+                        help="Latitude band used for the wave kernels [default = -70 -40]")
+    parser.add_argument("--rotation_tsteps", type=int, default=5,
+                        help="Number of (global) time steps used for switch_regular_axes [default = 5]")
+    parser.add_argument("--new_np", type=float, nargs=2, metavar=('LAT', 'LON'), default=[20.0, 260.0],
+                        help="North pole used for switch_regular_axes [default = 20 260]")
+
+    args = parser.parse_args()
+
+    main(args)
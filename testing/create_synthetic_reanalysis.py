@@ -0,0 +1,165 @@
+"""
+Filename:     create_synthetic_reanalysis.py
+Author:       Damien Irving, d.irving@student.unimelb.edu.au
+Description:  Create a synthetic daily (time, latitude, longitude)
+              reanalysis file, for benchmarking and testing code
+
+"""
+
+# Import general Python modules
+
+import sys, os, pdb
+import argparse
+import numpy
+
+import cdms2
+
+# Import my modules #
+
+cwd = os.getcwd()
+repo_dir = '/'
+for directory in cwd.split('/')[1:]:
+    repo_dir = os.path.join(repo_dir, directory)
+    if directory == 'phd':
+        break
+
+modules_dir = os.path.join(repo_dir, 'modules')
+sys.path.append(modules_dir)
+
+try:
+    import netcdf_io as nio
+except ImportError:
+    raise ImportError('Must run this script from anywhere within the phd git repo')
+
+
+# Define functions #
+
+def create_axes(resolution, start_year, end_year):
+    """Create the time (daily, standard calendar), latitude and longitude axes."""
+
+    ndays = (numpy.datetime64('%04i-01-01' %(end_year + 1)) - numpy.datetime64('%04i-01-01' %(start_year))).astype(int)
+    time_axis = cdms2.createAxis(numpy.arange(0, ndays, dtype=numpy.float64), id='time')
+    time_axis.designateTime()
+    time_axis.units = 'days since %04i-01-01 00:00:00' %(start_year)
+    time_axis.calendar = 'standard'
+    time_axis.standard_name = 'time'
+    time_axis.long_name = 'time'
+    time_axis.axis = 'T'
+
+    nlat = int(round(180.0 / resolution)) + 1
+    lat_axis = cdms2.createAxis(numpy.linspace(-90.0, 90.0, nlat), id='latitude')
+    lat_axis.designateLatitude()
+    lat_axis.units = 'degrees_north'
+    lat_axis.standard_name = 'latitude'
+    lat_axis.long_name = 'latitude'
+    lat_axis.axis = 'Y'
+
+    nlon = int(round(360.0 / resolution))
+    lon_axis = cdms2.createAxis(numpy.arange(0, nlon) * (360.0 / nlon), id='longitude')
+    lon_axis.designateLongitude()
+    lon_axis.units = 'degrees_east'
+    lon_axis.standard_name = 'longitude'
+    lon_axis.long_name = 'longitude'
+    lon_axis.axis = 'X'
+
+    return time_axis, lat_axis, lon_axis
+
+
+def synthetic_chunks(ntime, lats, lons, chunk_size, seed=0):
+    """Generate the synthetic meridional wind, one time chunk at a time.
+
+    The field is the sum of eastward travelling zonal waves (wavenumbers
+    3 to 7) whose amplitude varies with latitude and season, plus
+    some random noise. Data are float32 (time, latitude, longitude).
+
+    """
+
+    numpy.random.seed(seed)
+    lon_rad = numpy.deg2rad(lons)[numpy.newaxis, numpy.newaxis, :]
+    lat_rad = numpy.deg2rad(lats)[numpy.newaxis, :, numpy.newaxis]
+
+    wavenumbers = numpy.arange(3, 8)
+    phase_speeds = numpy.random.uniform(0.05, 0.3, len(wavenumbers))   # radians per day
+    amplitudes = numpy.random.uniform(2.0, 8.0, len(wavenumbers))       # m s-1
+
+    for start in range(0, ntime, chunk_size):
+        days = numpy.arange(start, min(start + chunk_size, ntime), dtype=numpy.float64)
+        days = days[:, numpy.newaxis, numpy.newaxis]
+        seasonal_cycle = 1.0 + 0.3 * numpy.cos(2 * numpy.pi * days / 365.25)
+
+        data = numpy.zeros((days.shape[0], len(lats), len(lons)), dtype=numpy.float32)
+        for wavenumber, speed, amp in zip(wavenumbers, phase_speeds, amplitudes):
+            wave = amp * seasonal_cycle * numpy.sin(wavenumber * lon_rad - speed * days)
+            data += (wave * numpy.sin(2 * lat_rad)**2).astype(numpy.float32)
+        data += numpy.random.normal(0.0, 1.0, data.shape).astype(numpy.float32)
+
+        yield data
+
+
+def main(inargs):
+    """Run the program."""
+
+    time_axis, lat_axis, lon_axis = create_axes(inargs.resolution, inargs.start_year,
+                                                inargs.start_year + inargs.years - 1)
+
+    var_atts = {'id': inargs.var,
+                'standard_name': 'northward_wind',
+                'long_name': 'northward_wind',
+                'units': 'm s-1',
+                'missing_value': 1.0e20,
+                'notes': 'Synthetic data: travelling zonal waves (wavenumbers 3-7) plus noise'}
+
+    global_atts = {'title': 'Synthetic reanalysis data',
+                   'Conventions': 'CF-1.5',
+                   'history': ''}
+
+    chunks = synthetic_chunks(len(time_axis), lat_axis[:], lon_axis[:], inargs.chunk_size, seed=inargs.seed)
+
+    nio.write_netcdf(inargs.outfile, " ".join(sys.argv),
+                     global_atts,
+                     [chunks],
+                     [var_atts],
+                     [(time_axis, lat_axis, lon_axis)],
+                     compression=inargs.compression)
+
+
+if __name__ == '__main__':
+
+    extra_info ="""
+example:
+    /usr/local/uvcdat/1.5.1/bin/cdat create_synthetic_reanalysis.py
+    va_synthetic_250hPa_daily_r360x181.nc --resolution 1.0 --years 30
+
+notes:
+    Approximate (uncompressed) file sizes for daily data:
+    1 degree, 10 years = 1 GB; 1 degree, 60 years = 5.7 GB;
+    0.5 degree, 10 years = 3.8 GB; 0.5 degree, 60 years = 23 GB
+
+"""
+
+    description='Create a synthetic daily (time, latitude, longitude) reanalysis file'
+    parser = argparse.ArgumentParser(description=description,
+                                     epilog=extra_info,
+                                     argument_default=argparse.SUPPRESS,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    parser.add_argument("outfile", type=str, help="Output file name")
+
+    parser.add_argument("--var", type=str, default='va',
+                        help="Output variable [default = va]")
+    parser.add_argument("--resolution", type=float, default=1.0,
+                        help="Horizontal grid spacing (degrees) [default = 1.0]")
+    parser.add_argument("--years", type=int, default=10,
+                        help="Length of the record (years) [default = 10]")
+    parser.add_argument("--start_year", type=int, default=1979,
+                        help="First year of the record [default = 1979]")
+    parser.add_argument("--chunk_size", type=int, default=365,
+                        help="Number of time steps generated (and written) at a time [default = 365]")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Seed for the random number generator [default = 0]")
+    parser.add_argument("--compression", type=int, default=None,
+                        help="zlib compression level (1-9) [default = no compression]")
+
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,95 @@
+"""
+Filename:     create_waf_reference.py
+Author:       Damien Irving, d.irving@student.unimelb.edu.au
+Description:  Create the wave activity flux regression reference
+              (data/waf_reference.npz) used by unittest_waf.py
+
+The reference is calc_waf.calc_waf applied to the synthetic fields
+defined in synthetic_fields, so it guards against unintended changes
+to the calculation. Its correctness is checked separately, against
+the analytic solution in unittest_waf.testWaf.test_analytic.
+
+"""
+
+# Import general Python modules
+
+import sys, os, pdb
+import argparse
+import numpy
+
+# Import my modules #
+
+cwd = os.getcwd()
+repo_dir = '/'
+for directory in cwd.split('/')[1:]:
+    repo_dir = os.path.join(repo_dir, directory)
+    if directory == 'phd':
+        break
+
+module_dir = os.path.join(repo_dir, 'data_processing')
+sys.path.append(module_dir)
+
+try:
+    import calc_waf
+except ImportError:
+    raise ImportError('Must run this script from anywhere within the phd git repo')
+
+
+# Define functions #
+
+def synthetic_fields():
+    """Define the synthetic input fields (two time steps of a
+    zonal wave 3 and 5 geopotential height anomaly, in zonally
+    varying climatological flow).
+
+    Returns zg_anom, u_clim, v_clim, lats, lons
+
+    """
+
+    lats = numpy.arange(-80, -15, 5.0)
+    lons = numpy.arange(0, 360, 10.0)
+    lon_mesh, lat_mesh = numpy.meshgrid(numpy.deg2rad(lons), numpy.deg2rad(lats))
+
+    zg_anom = []
+    for t in [0.0, 1.0]:
+        zg_anom.append(100 * numpy.cos(3 * lon_mesh + t) * numpy.cos(lat_mesh)**2 +
+                       40 * numpy.sin(5 * lon_mesh - 2 * t) * numpy.sin(2 * lat_mesh))
+    zg_anom = numpy.array(zg_anom)
+    u_clim = 20 + 10 * numpy.cos(2 * lat_mesh) + 2 * numpy.cos(lon_mesh)
+    v_clim = 3 * numpy.sin(2 * lon_mesh) * numpy.cos(lat_mesh)
+
+    return zg_anom, u_clim, v_clim, lats, lons
+
+
+def main(inargs):
+    """Run the program."""
+
+    zg_anom, u_clim, v_clim, lats, lons = synthetic_fields()
+    wafx, wafy = calc_waf.calc_waf(zg_anom, u_clim, v_clim, lats, lons, 250.0)
+
+    numpy.savez(inargs.outfile, wafx=wafx, wafy=wafy)
+
+
+if __name__ == '__main__':
+
+    extra_info ="""
+example:
+    python create_waf_reference.py data/waf_reference.npz
+
+notes:
+    Only regenerate the reference for an intentional change to the
+    calculation (after checking unittest_waf.py test_analytic passes).
+
+"""
+
+    description='Create the wave activity flux regression reference'
+    parser = argparse.ArgumentParser(description=description,
+                                     epilog=extra_info,
+                                     argument_default=argparse.SUPPRESS,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    parser.add_argument("outfile", type=str, help="Output .npz file name")
+
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,204 @@
+"""
+A unit testing module for convenient_universal.
+
+Functions/methods tested:
+  convenient_universal.calc_field_mean
+  convenient_universal.calc_group_anomaly
+  convenient_universal.calc_group_climatology
+  convenient_universal.get_time_groups
+  convenient_universal.select_lonlat_box
+  convenient_universal.RunningStats
+  convenient_universal.ttest_ind_from_stats
+
+"""
+
+# Import general Python modules
+
+import sys, os
+import unittest
+import pdb
+
+import numpy
+from scipy import stats
+import cdms2
+
+# Import my modules #
+
+cwd = os.getcwd()
+repo_dir = '/'
+for directory in cwd.split('/')[1:]:
+    repo_dir = os.path.join(repo_dir, directory)
+    if directory == 'phd':
+        break
+
+module_dir = os.path.join(repo_dir, 'modules')
+sys.path.append(module_dir)
+
+try:
+    import convenient_universal as uconv
+except ImportError:
+    raise ImportError('Must run this script from anywhere within the phd git repo')
+
+
+##########################
+## unittest test clases ##
+##########################
+
+class testRunningStats(unittest.TestCase):
+    """Test class for the chunk by chunk significance test"""
+
+    def setUp(self):
+        """Define the test data"""
+
+        numpy.random.seed(0)
+        self.data_all = numpy.random.randn(300, 3, 4) * 2.0 + 10.0
+        self.data_subset = self.data_all[0:80, :, :] * 1.5 + 0.3
+
+
+    def accumulate(self, data, chunk_size):
+        """Accumulate the running statistics chunk by chunk"""
+
+        running_stats = uconv.RunningStats()
+        for start in range(0, data.shape[0], chunk_size):
+            running_stats.update(data[start:start + chunk_size, ...])
+
+        return running_stats
+
+
+    def test_mean_variance(self):
+        """Chunked mean and variance match numpy [test for success]"""
+
+        running_stats = self.accumulate(self.data_all, 70)
+        numpy.testing.assert_allclose(running_stats.get_mean(), self.data_all.mean(axis=0), rtol=1e-10)
+        numpy.testing.assert_allclose(running_stats.get_variance(), self.data_all.var(axis=0, ddof=1), rtol=1e-10)
+        self.assertEqual(running_stats.size, 300)
+
+
+    def test_ttest(self):
+        """Standard t-test matches scipy [test for success]"""
+
+        t, pvals = uconv.ttest_ind_from_stats(self.accumulate(self.data_subset, 33), 
+                                              self.accumulate(self.data_all, 70))
+        t_scipy, pvals_scipy = stats.ttest_ind(self.data_subset, self.data_all, axis=0)
+        numpy.testing.assert_allclose(t, t_scipy, rtol=1e-08)
+        numpy.testing.assert_allclose(pvals, pvals_scipy, rtol=1e-08, atol=1e-15)
+
+
+    def test_welch(self):
+        """Welch's t-test matches scipy [test for success]"""
+
+        t, pvals = uconv.ttest_ind_from_stats(self.accumulate(self.data_subset, 33), 
+                                              self.accumulate(self.data_all, 70), equal_var=False)
+        t_scipy, pvals_scipy = stats.ttest_ind(self.data_subset, self.data_all, axis=0, equal_var=False)
+        numpy.testing.assert_allclose(t, t_scipy, rtol=1e-08)
+        numpy.testing.assert_allclose(pvals, pvals_scipy, rtol=1e-08, atol=1e-15)
+
+
+    def test_weights(self):
+        """Point by point weights select a subset [test for success]"""
+
+        timeseries = self.data_all[:, 0, 0]
+        include = self.data_all[:, 1:, :] > 10.0
+        running_stats = uconv.RunningStats()
+        running_stats.update(timeseries[:, numpy.newaxis, numpy.newaxis], weights=include)
+        answer = numpy.ma.masked_array(numpy.tile(timeseries[:, numpy.newaxis, numpy.newaxis], (1, 2, 4)), mask=~include)
+        numpy.testing.assert_allclose(running_stats.get_mean(), answer.mean(axis=0), rtol=1e-10)
+
+
+class testClimatology(unittest.TestCase):
+    """Test class for the grouped (e.g. monthly) climatology"""
+
+    def setUp(self):
+        """Define the test data (monthly data starting in April)"""
+
+        numpy.random.seed(0)
+        self.months = (numpy.arange(3, 3 + 100) % 12) + 1
+        self.data = numpy.ma.masked_array(numpy.random.randn(100, 2, 3))
+        self.data[4, 0, 0] = numpy.ma.masked
+
+
+    def test_climatology(self):
+        """Mean and std match a loop over each month [test for success]"""
+
+        groups = uconv.get_time_groups(self.months)
+        mean, std = uconv.calc_group_climatology(self.data, groups, 12)
+        for month in range(1, 13):
+            month_data = self.data[self.months == month, ...]
+            numpy.testing.assert_allclose(mean[month - 1], numpy.ma.mean(month_data, axis=0), rtol=1e-10)
+            numpy.testing.assert_allclose(std[month - 1], numpy.ma.std(month_data, axis=0), rtol=1e-10)
+
+
+    def test_anomaly(self):
+        """Anomaly and normalised timeseries match a loop over each time step [test for success]"""
+
+        groups = uconv.get_time_groups(self.months)
+        mean, std = uconv.calc_group_climatology(self.data, groups, 12)
+        anomaly = uconv.calc_group_anomaly(self.data, groups, mean)
+        normalised = uconv.calc_group_anomaly(self.data, groups, mean, std)
+        for index in [0, 5, 50, 99]:
+            month_index = self.months[index] - 1
+            numpy.testing.assert_allclose(anomaly[index], self.data[index] - mean[month_index], rtol=1e-10)
+            numpy.testing.assert_allclose(normalised[index], (self.data[index] - mean[month_index]) / std[month_index], rtol=1e-10)
+        self.assertTrue(anomaly.mask[4, 0, 0])
+
+
+    def test_day_of_year(self):
+        """Day of year is relative to a 366 day year [test for success]"""
+
+        result = uconv.get_time_groups([1, 2, 3, 12], days=[1, 29, 1, 31])
+        numpy.testing.assert_array_equal(result, [0, 59, 60, 365])
+
+
+class testFieldOperators(unittest.TestCase):
+    """Test class for the spatial selection and averaging operators"""
+
+    def setUp(self):
+        """Define the test data"""
+
+        self.lats = numpy.arange(-80, 90, 10.0)
+        self.lons = numpy.arange(0, 360, 30.0)
+        lon_mesh, lat_mesh = numpy.meshgrid(self.lons, self.lats)
+        self.data = numpy.array([lon_mesh, lat_mesh])
+
+
+    def test_box(self):
+        """Select a box within the grid [test for success]"""
+
+        subset, lats, lons = uconv.select_lonlat_box(self.data, self.lats, self.lons, -50, -30, 60, 120)
+        numpy.testing.assert_array_equal(lats, [-50, -40, -30])
+        numpy.testing.assert_array_equal(lons, [60, 90, 120])
+        self.assertEqual(subset.shape, (2, 3, 3))
+
+
+    def test_box_wrap(self):
+        """Select a box that crosses the 0/360 boundary [test for success]"""
+
+        subset, lats, lons = uconv.select_lonlat_box(self.data, self.lats, self.lons, -50, -30, 300, 30)
+        numpy.testing.assert_array_equal(sorted(lons), [0, 30, 300, 330])
+        numpy.testing.assert_array_equal(subset[0, 0, :], lons)
+
+
+    def test_box_cdms2(self):
+        """Select a box from a cdms2 variable [test for success]"""
+
+        lat_axis = cdms2.createAxis(self.lats, id='latitude')
+        lon_axis = cdms2.createAxis(self.lons, id='longitude')
+        var = cdms2.createVariable(self.data[0][numpy.newaxis, ...], axes=[cdms2.createAxis([0.0]), lat_axis, lon_axis])
+
+        subset, lats, lons = uconv.select_lonlat_box(var, self.lats, self.lons, -50, -30, 300, 30)
+        answer = uconv.select_lonlat_box(self.data[0:1], self.lats, self.lons, -50, -30, 300, 30)[0]
+        numpy.testing.assert_array_equal(subset, answer)
+        self.assertEqual(subset.shape, (1, 3, 4))
+
+
+    def test_field_mean(self):
+        """Area weighted mean of a field [test for success]"""
+
+        result = uconv.calc_field_mean(self.data, self.lats)
+        weights = numpy.cos(numpy.deg2rad(self.lats))
+        numpy.testing.assert_allclose(result[0], 165.0, rtol=1e-10)
+        numpy.testing.assert_allclose(result[1], numpy.sum(weights * self.lats) / numpy.sum(weights), rtol=1e-10, atol=1e-10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,7 +5,8 @@ Functions/methods tested:
   coordinate_rotation.adjust_lon_range  
   coordinate_rotation.rotation_matrix
   coordinate_rotation.rotate_spherical
-  coordinate_rotation.switch_regular_axes
+  coordinate_rotation.switch_regular_axes (incl. parallel mode)
+  coordinate_rotation.cached_calculation
 
 Improvements/comments:
 1. I'm not sure that tests of no rotation are valid.
@@ -19,6 +20,8 @@ import numpy
 
 import os
 import sys
+import shutil
+import tempfile
 
 module_dir = os.path.join(os.environ['HOME'], 'modules')
 sys.path.insert(0, module_dir)
@@ -299,6 +302,64 @@ class testSwitchAxes(unittest.TestCase):
         numpy.testing.assert_allclose(result, answer, rtol=0.0, atol=0.4)
 
 
+    def test_parallel(self):
+        """Test that the parallel switch matches the serial switch 
+        for (time, lat, lon) data [test for success].
+
+        """
+
+        data = numpy.zeros([5, self.nlats, self.nlons])
+        for tstep in range(0, 5):
+            for index in range(0, self.nlats):
+                data[tstep, index, :] = self.lat_axis[index] * (tstep + 1)
+
+        serial = rot.switch_regular_axes(data, self.lats, self.lons, self.lat_axis, self.lon_axis, [30, 270], invert=False)
+        parallel = rot.switch_regular_axes(data, self.lats, self.lons, self.lat_axis, self.lon_axis, [30, 270], invert=False, nprocs=2)
+
+        numpy.testing.assert_array_equal(parallel, serial)
+
+
+class testCache(unittest.TestCase):
+    """Test the on-disk cache of rotation calculations"""
+
+    def setUp(self):
+        """Create a temporary cache directory"""
+
+        self.cache_dir = tempfile.mkdtemp()
+        self.lat_axis = numpy.arange(-90, 92.5, 2.5)
+        self.lon_axis = numpy.arange(0.0, 360, 2.5)
+        self.lats, self.lons = nio.coordinate_pairs(self.lat_axis, self.lon_axis)
+
+
+    def tearDown(self):
+        """Remove the temporary cache directory"""
+
+        shutil.rmtree(self.cache_dir)
+
+
+    def test_rotation_angle(self):
+        """Cached rotation angles match the calculated ones [test for success]"""
+
+        key_items = ['rotation_angle', self.lat_axis, self.lon_axis, (30, 270)]
+        answer = rot.rotation_angle(90, 0, 30, 270, self.lats, self.lons)
+        first = rot.cached_calculation(self.cache_dir, key_items, rot.rotation_angle, 90, 0, 30, 270, self.lats, self.lons)
+        second = rot.cached_calculation(self.cache_dir, key_items, None)  # not called
+        
+        numpy.testing.assert_array_equal(first, answer)
+        numpy.testing.assert_array_equal(second, answer)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+
+    def test_switch(self):
+        """A cached axis switch matches the uncached switch [test for success]"""
+
+        data = numpy.random.rand(len(self.lat_axis), len(self.lon_axis))
+        answer = rot.switch_regular_axes(data, self.lats, self.lons, self.lat_axis, self.lon_axis, [30, 270])
+        for i in range(0, 2):
+            result = rot.switch_regular_axes(data, self.lats, self.lons, self.lat_axis, self.lon_axis, [30, 270], cache_dir=self.cache_dir)
+            numpy.testing.assert_array_equal(result, answer)
+
+
 if __name__ == '__main__':
     unittest.main()
     
@@ -0,0 +1,78 @@
+"""
+A unit testing module for the wave envelope calculation.
+
+Functions/methods tested:
+  calc_envelope.envelope
+
+"""
+
+# Import general Python modules
+
+import sys, os
+import unittest
+import pdb
+
+import numpy
+
+# Import my modules #
+
+cwd = os.getcwd()
+repo_dir = '/'
+for directory in cwd.split('/')[1:]:
+    repo_dir = os.path.join(repo_dir, directory)
+    if directory == 'phd':
+        break
+
+module_dir = os.path.join(repo_dir, 'data_processing')
+sys.path.append(module_dir)
+
+try:
+    import calc_envelope
+except ImportError:
+    raise ImportError('Must run this script from anywhere within the phd git repo')
+
+
+##########################
+## unittest test clases ##
+##########################
+
+class testEnvelope(unittest.TestCase):
+    """Test class for the FFT based envelope extraction"""
+
+    def setUp(self):
+        """Define the test data"""
+
+        numpy.random.seed(0)
+        self.data = numpy.random.randn(3, 4, 144)
+        self.bounds_list = [(5, 7), (2, 4), (1, 72)]
+
+
+    def test_dft_match(self):
+        """Batched FFT envelope should match the explicit DFT [test for success]"""
+
+        for kmin, kmax in self.bounds_list:
+            result = calc_envelope.envelope(self.data, kmin, kmax)
+            answer = numpy.apply_along_axis(calc_envelope.envelope_dft, 2, self.data, kmin, kmax)
+            numpy.testing.assert_allclose(result, answer, rtol=1e-07, atol=1e-10)
+
+
+    def test_single_wave(self):
+        """The envelope of a pure wave is its amplitude [test for success]"""
+
+        x = numpy.linspace(0, 2 * numpy.pi, 144, endpoint=False)
+        wave = 3.0 * numpy.sin(6 * x)
+        result = calc_envelope.envelope(wave, 5, 7)
+        numpy.testing.assert_allclose(result, numpy.ones(144) * 3.0, rtol=1e-07, atol=1e-10)
+
+
+    def test_odd_length(self):
+        """Odd length waves fall back to the explicit DFT [test for success]"""
+
+        data = self.data[:, :, 0:143]
+        result = calc_envelope.envelope(data, 5, 7)
+        answer = numpy.apply_along_axis(calc_envelope.envelope_dft, 2, data, 5, 7)
+        numpy.testing.assert_allclose(result, answer, rtol=1e-07, atol=1e-10)
+
+
+if __name__ == '__main__':
+    unittest.main()
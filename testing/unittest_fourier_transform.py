@@ -0,0 +1,91 @@
+"""
+A unit testing module for the Fourier transform calculations.
+
+Functions/methods tested:
+  calc_fourier_transform.get_coefficients
+
+"""
+
+# Import general Python modules
+
+import sys, os
+import unittest
+import pdb
+
+import numpy
+
+# Import my modules #
+
+cwd = os.getcwd()
+repo_dir = '/'
+for directory in cwd.split('/')[1:]:
+    repo_dir = os.path.join(repo_dir, directory)
+    if directory == 'phd':
+        break
+
+module_dir = os.path.join(repo_dir, 'data_processing')
+sys.path.append(module_dir)
+
+try:
+    import calc_fourier_transform as cft
+except ImportError:
+    raise ImportError('Must run this script from anywhere within the phd git repo')
+
+
+##########################
+## unittest test clases ##
+##########################
+
+class testCoefficients(unittest.TestCase):
+    """Test class for the magnitude and phase coefficients"""
+
+    def setUp(self):
+        """Define the test data"""
+
+        numpy.random.seed(0)
+        self.data = numpy.random.randn(3, 4, 144)
+        self.lons = numpy.arange(0, 360, 2.5)
+        self.min_freq, self.max_freq = 1, 10
+
+
+    def test_filter_match(self):
+        """Coefficients should match those from filter_signal and
+        first_localmax_index for each frequency [test for success]"""
+
+        result = cft.get_coefficients(self.data, self.lons, self.min_freq, self.max_freq)
+
+        for index, freq in enumerate(range(self.min_freq, self.max_freq + 1)):
+            filtered = numpy.apply_along_axis(cft.filter_signal, -1, self.data, self.lons, freq, freq, None).real
+            localmax_lons = numpy.take(self.lons, numpy.apply_along_axis(cft.first_localmax_index, -1, filtered))
+            numpy.testing.assert_array_equal(result[2 * index + 1], localmax_lons)
+
+            # The grid point maxima can be up to a factor cos(pi k / N) smaller than the magnitude
+            grid_max = numpy.max(filtered, axis=-1)
+            self.assertTrue(numpy.all(result[2 * index] >= grid_max - 1e-10))
+            self.assertTrue(numpy.all(result[2 * index] * numpy.cos(numpy.pi * freq / 144.0) <= grid_max + 1e-10))
+
+
+    def test_single_wave(self):
+        """The magnitude and phase of a pure wave [test for success]"""
+
+        wave = 2.0 * numpy.cos(numpy.deg2rad(4 * (self.lons - 30.0)))
+        result = cft.get_coefficients(wave, self.lons, 4, 4)
+        numpy.testing.assert_allclose(result[0], 2.0)
+        self.assertEqual(result[1], 30.0)
+
+
+    def test_nyquist(self):
+        """The magnitude and phase at the Nyquist frequency match
+        filter_signal and first_localmax_index [test for success]"""
+
+        nyquist = len(self.lons) / 2
+        result = cft.get_coefficients(self.data, self.lons, nyquist, nyquist)
+
+        filtered = numpy.apply_along_axis(cft.filter_signal, -1, self.data, self.lons, nyquist, nyquist, None).real
+        localmax_lons = numpy.take(self.lons, numpy.apply_along_axis(cft.first_localmax_index, -1, filtered))
+        numpy.testing.assert_allclose(result[0], numpy.max(filtered, axis=-1))
+        numpy.testing.assert_array_equal(result[1], localmax_lons)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+"""
+A unit testing module for the monthly anomaly calculation.
+
+Functions/methods tested:
+  calc_monthly_anomaly.main (--append)
+  calc_monthly_anomaly.read_climatology
+
+"""
+
+# Import general Python modules
+
+import sys, os
+import unittest
+import shutil, tempfile
+import argparse
+import datetime
+import pdb
+
+import numpy
+import cdms2
+
+# Import my modules #
+
+cwd = os.getcwd()
+repo_dir = '/'
+for directory in cwd.split('/')[1:]:
+    repo_dir = os.path.join(repo_dir, directory)
+    if directory == 'phd':
+        break
+
+for subdir in ['modules', 'data_processing']:
+    sys.path.append(os.path.join(repo_dir, subdir))
+
+try:
+    import calc_monthly_anomaly as cma
+except ImportError:
+    raise ImportError('Must run this script from anywhere within the phd git repo')
+
+
+def write_monthly_file(fname, values):
+    """Write a monthly (mid-month, starting January 1979) test input
+    file for the variable tas."""
+
+    dates = [datetime.date(1979 + index // 12, index % 12 + 1, 15) for index in range(values.shape[0])]
+    time = cdms2.createAxis(numpy.array([(date - datetime.date(1979, 1, 1)).days for date in dates], dtype=float), id='time')
+    time.designateTime()
+    time.units = 'days since 1979-01-01'
+    lat = cdms2.createAxis(numpy.arange(-60, 61, 30.0), id='latitude')
+    lat.designateLatitude()
+    lon = cdms2.createAxis(numpy.arange(0, 360, 45.0), id='longitude')
+    lon.designateLongitude()
+
+    var = cdms2.createVariable(values, axes=[time, lat, lon], id='tas')
+    var.units = 'K'
+    var.long_name = 'surface temperature'
+    var.missing_value = 1.0e20
+
+    fout = cdms2.open(fname, 'w')
+    fout.history = 'test file'
+    fout.write(var)
+    fout.close()
+
+
+##########################
+## unittest test clases ##
+##########################
+
+class testAppend(unittest.TestCase):
+    """Test class for appending to a monthly anomaly file"""
+
+    def setUp(self):
+        """Write input files with three and four years of data"""
+
+        self.temp_dir = tempfile.mkdtemp()
+        path = lambda name: os.path.join(self.temp_dir, name)
+
+        numpy.random.seed(0)
+        values = numpy.ma.masked_array(numpy.random.rand(48, 5, 8) + 280.0, fill_value=1.0e20)
+        values[40, 2, 1] = numpy.ma.masked
+        write_monthly_file(path('tas_3yr.nc'), values[0:36])
+        write_monthly_file(path('tas_4yr.nc'), values)
+
+        self.args = lambda infile, outfile, append: argparse.Namespace(infile=path(infile), variable='tas', outfile=path(outfile),
+                                                                         base=['1979-01-01', '1980-12-31'], append=append)
+
+
+    def tearDown(self):
+        """Remove the test files"""
+
+        shutil.rmtree(self.temp_dir)
+
+
+    def test_append(self):
+        """Appending the new months matches a full recalculation [test for success]"""
+
+        cma.main(self.args('tas_3yr.nc', 'anomaly_appended.nc', False))
+        cma.main(self.args('tas_4yr.nc', 'anomaly_appended.nc', True))
+        cma.main(self.args('tas_4yr.nc', 'anomaly_full.nc', False))
+
+        result_file = cdms2.open(os.path.join(self.temp_dir, 'anomaly_appended.nc'))
+        answer_file = cdms2.open(os.path.join(self.temp_dir, 'anomaly_full.nc'))
+        result, answer = result_file['tas'], answer_file['tas']
+
+        self.assertEqual(result.shape, (48, 5, 8))
+        numpy.testing.assert_allclose(result[:], answer[:], rtol=0, atol=1e-4)  # the stored climatology is float32
+        numpy.testing.assert_array_equal(numpy.ma.getmaskarray(result[:]), numpy.ma.getmaskarray(answer[:]))
+        numpy.testing.assert_allclose(result.getTime()[:], answer.getTime()[:])
+
+        result_file.close()
+        answer_file.close()
+
+
+    def test_read_climatology(self):
+        """The stored climatology is read as a numpy masked array [test for success]"""
+
+        cma.main(self.args('tas_3yr.nc', 'anomaly.nc', False))
+        result = cma.read_climatology(os.path.join(self.temp_dir, 'anomaly.nc'), 'tas', ['1979-01-01', '1980-12-31'])
+
+        self.assertEqual(type(result), numpy.ma.MaskedArray)
+        self.assertEqual(result.shape, (12, 5, 8))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,671 @@
+"""
+A unit testing module for netcdf_io.
+
+Functions/methods tested:
+  netcdf_io.InputData (cache, profile)
+  netcdf_io.InputDataStream
+  netcdf_io.MappedData (NetCDF3 and NetCDF4)
+  netcdf_io.append_netcdf
+  netcdf_io.date_index
+  netcdf_io.decode_time_axis
+  netcdf_io.match_dates
+  netcdf_io.new_time_period
+  netcdf_io._time_indexes
+  netcdf_io.regrid_uniform
+  netcdf_io.regrid_weights
+  netcdf_io.write_netcdf (profile, time chunks, compression, unlimited time)
+
+"""
+
+# Import general Python modules
+
+import sys, os
+import unittest
+import shutil, tempfile
+import pdb
+
+import numpy
+from scipy.io import netcdf
+import cdms2
+import cdtime
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+# Import my modules #
+
+cwd = os.getcwd()
+repo_dir = '/'
+for directory in cwd.split('/')[1:]:
+    repo_dir = os.path.join(repo_dir, directory)
+    if directory == 'phd':
+        break
+
+module_dir = os.path.join(repo_dir, 'modules')
+sys.path.append(module_dir)
+
+try:
+    import netcdf_io as nio
+except ImportError:
+    raise ImportError('Must run this script from anywhere within the phd git repo')
+
+
+def write_test_file(fname):
+    """Write a test input file: 20 days of random (time, latitude, longitude)
+    data for the variable tas, with one missing value.
+
+    Returns the data values.
+
+    """
+
+    time = cdms2.createAxis(numpy.arange(0, 20.0), id='time')
+    time.designateTime()
+    time.units = 'days since 1979-01-01'
+    lat = cdms2.createAxis(numpy.arange(-60, 61, 30.0), id='latitude')
+    lat.designateLatitude()
+    lon = cdms2.createAxis(numpy.arange(0, 360, 45.0), id='longitude')
+    lon.designateLongitude()
+
+    numpy.random.seed(0)
+    values = numpy.ma.masked_array(numpy.random.rand(20, 5, 8), fill_value=1.0e20)
+    values[3, 2, 1] = numpy.ma.masked
+    var = cdms2.createVariable(values, axes=[time, lat, lon], id='tas')
+    var.units = 'K'
+    var.long_name = 'surface temperature'
+    var.standard_name = 'air_temperature'
+    var.missing_value = 1.0e20
+
+    fout = cdms2.open(fname, 'w')
+    fout.history = 'test file'
+    fout.write(var)
+    fout.close()
+
+    return values
+
+
+##########################
+## unittest test clases ##
+##########################
+
+class testMatchDates(unittest.TestCase):
+    """Test class for matching a list of dates to a time axis"""
+
+    def setUp(self):
+        """Define the test data"""
+
+        self.time_axis = ['1979-01-01 0:0:0.0', '1979-01-01 12:0:0.0',
+                          '1979-01-02 0:0:0.0', '1979-01-02 12:0:0.0',
+                          '1979-01-03 0:0:0.0', '1979-01-03 12:0:0.0']
+        self.dates = ['1979-01-03', '1979-01-01', '1980-01-01', '1979-01-03']
+
+
+    def test_date_index(self):
+        """The first time step of each day is indexed [test for success]"""
+
+        result = nio.date_index(self.time_axis)
+        answer = {(1979, 1, 1): 0, (1979, 1, 2): 2, (1979, 1, 3): 4}
+        self.assertEqual(result, answer)
+
+
+    def test_match_indexes(self):
+        """Matches follow the order of the input dates [test for success]"""
+
+        result = nio.match_dates(self.dates, self.time_axis, return_indexes=True)
+        self.assertEqual(result, [4, 0, 4])
+
+
+    def test_match_dates(self):
+        """Matched time axis values are returned [test for success]"""
+
+        result = nio.match_dates(self.dates, self.time_axis)
+        answer = ['1979-01-03 0:0:0.0', '1979-01-01 0:0:0.0', '1979-01-03 0:0:0.0']
+        self.assertEqual(result, answer)
+
+
+    def test_invert_indexes(self):
+        """Inverse matching returns all other time axis indexes [test for success]"""
+
+        result = nio.match_dates(self.dates, self.time_axis, invert_matching=True, return_indexes=True)
+        self.assertEqual(result, [1, 2, 3, 5])
+
+
+    def test_invert_dates(self):
+        """Inverse matching returns all other time axis values [test for success]"""
+
+        result = nio.match_dates(self.dates, self.time_axis, invert_matching=True)
+        answer = ['1979-01-01 12:0:0.0', '1979-01-02 0:0:0.0',
+                  '1979-01-02 12:0:0.0', '1979-01-03 12:0:0.0']
+        self.assertEqual(result, answer)
+
+
+class testDecodeTime(unittest.TestCase):
+    """Test class for decoding a time axis"""
+
+    def create_axis(self, values, units, calendar):
+        """Create a cdms2 time axis"""
+
+        axis = cdms2.createAxis(numpy.array(values, dtype=numpy.float64))
+        axis.designateTime()
+        axis.units = units
+        axis.setCalendar(calendar)
+
+        return axis
+
+
+    def compare(self, axis):
+        """Compare the decoded axis with asComponentTime()"""
+
+        result = nio.decode_time_axis(axis)
+        for index, ct in enumerate(axis.asComponentTime()):
+            self.assertEqual((result['year'][index], result['month'][index], result['day'][index], result['hour'][index]),
+                             (ct.year, ct.month, ct.day, ct.hour))
+
+        return result
+
+
+    def test_gregorian(self):
+        """Standard calendar, 6 hourly data [test for success]"""
+
+        axis = self.create_axis(numpy.arange(0, 1500 * 24, 6), 'hours since 1979-01-01 00:00:00', cdtime.GregorianCalendar)
+        result = self.compare(axis)
+        self.assertEqual(str(result['datetime64'][5]), '1979-01-02T06:00:00')
+
+
+    def test_mixed_julian_reference(self):
+        """Mixed calendar with a Julian reference date, as for NCEP [test for success]"""
+
+        axis = self.create_axis(numpy.arange(17067072, 17067072 + 400 * 24, 24), 'hours since 1-1-1 00:00:0.0', cdtime.MixedCalendar)
+        result = self.compare(axis)
+        self.assertEqual((result['year'][0], result['month'][0], result['day'][0]), (1948, 1, 1))
+        self.assertEqual(str(result['datetime64'][0]), '1948-01-01T00:00:00')
+
+
+    def test_noleap(self):
+        """No leap calendar, daily data [test for success]"""
+
+        axis = self.create_axis(numpy.arange(0, 1500) + 0.5, 'days since 1999-12-01', cdtime.NoLeapCalendar)
+        result = self.compare(axis)
+        self.assertEqual(result['datetime64'], None)
+
+
+    def test_360day(self):
+        """360 day calendar, daily data [test for success]"""
+
+        axis = self.create_axis(numpy.arange(0, 1500), 'days since 2000-02-25', cdtime.Calendar360)
+        self.compare(axis)
+
+
+    def test_monthly_units(self):
+        """Units of months since (decoded via asComponentTime) [test for success]"""
+
+        axis = self.create_axis(numpy.arange(0, 36), 'months since 1979-01-01', cdtime.GregorianCalendar)
+        self.compare(axis)
+
+
+class testRegrid(unittest.TestCase):
+    """Test class for the area weighted regridding"""
+
+    def setUp(self):
+        """Define the test data"""
+
+        lat = cdms2.createAxis(numpy.arange(-88.75, 90, 2.5))
+        lat.designateLatitude()
+        lon = cdms2.createAxis(numpy.arange(0, 360, 2.5))
+        lon.designateLongitude(persistent=1, modulo=360.0)
+        time = cdms2.createAxis(numpy.arange(0, 3.0))
+        time.designateTime()
+        time.units = 'days since 1979-01-01'
+
+        numpy.random.seed(0)
+        self.data = cdms2.createVariable(numpy.random.rand(3, len(lat), len(lon)), axes=[time, lat, lon], id='test')
+        self.target_grid = [-87.5, 36, 5.0, 0.0, 72, 5.0]
+
+
+    def area_mean(self, data):
+        """Calculate the area weighted mean of each time step"""
+
+        lat_bounds = data.getLatitude().getBounds()
+        weights = numpy.sin(numpy.deg2rad(lat_bounds[:, 1])) - numpy.sin(numpy.deg2rad(lat_bounds[:, 0]))
+        zonal_mean = numpy.ma.mean(data, axis=-1)
+
+        return numpy.ma.sum(zonal_mean * weights, axis=-1) / numpy.sum(weights)
+
+
+    def test_constant(self):
+        """A constant field stays constant [test for success]"""
+
+        data = cdms2.createVariable(numpy.ones(self.data.shape) * 5.0, axes=self.data.getAxisList(), id='test')
+        result = nio.regrid_uniform(data, self.target_grid)
+        self.assertEqual(result.shape, (3, 36, 72))
+        numpy.testing.assert_allclose(result, 5.0, rtol=1e-07)
+
+
+    def test_conservation(self):
+        """The area weighted mean is conserved [test for success]"""
+
+        result = nio.regrid_uniform(self.data, self.target_grid)
+        numpy.testing.assert_allclose(self.area_mean(result), self.area_mean(self.data), rtol=1e-07)
+
+
+    def test_mask(self):
+        """Cells with no valid input data are masked [test for success]"""
+
+        data = numpy.ma.masked_array(self.data, mask=numpy.zeros(self.data.shape, dtype=bool))
+        data.mask[:, 0:8, :] = True
+        data = cdms2.createVariable(data, axes=self.data.getAxisList(), id='test')
+        result = nio.regrid_uniform(data, self.target_grid)
+        self.assertTrue(numpy.ma.getmaskarray(result)[:, 0:4, :].all())
+        self.assertFalse(numpy.ma.getmaskarray(result)[:, 4:, :].any())
+
+
+    def test_weights_cache(self):
+        """Grids with the same values but different bounds get their own
+        weights, and the cache size is limited [test for success]"""
+
+        lat = cdms2.createAxis(numpy.array([-45.0, 45.0]), id='latitude')
+        lat.designateLatitude()
+        lat.setBounds(numpy.array([[-90.0, 0.0], [0.0, 90.0]]))
+        lat_narrow = cdms2.createAxis(numpy.array([-45.0, 45.0]), id='latitude')
+        lat_narrow.designateLatitude()
+        lat_narrow.setBounds(numpy.array([[-60.0, -30.0], [30.0, 60.0]]))
+        lon = cdms2.createAxis(numpy.array([90.0, 270.0]), id='longitude')
+        lon.designateLongitude()
+        lon.setBounds(numpy.array([[0.0, 180.0], [180.0, 360.0]]))
+
+        weights = nio.regrid_weights(lat, lon, lat, lon).toarray()
+        narrow_weights = nio.regrid_weights(lat_narrow, lon, lat, lon).toarray()
+        self.assertFalse(numpy.allclose(weights, narrow_weights))
+        numpy.testing.assert_allclose(narrow_weights.sum(), 2 * numpy.pi * 2 * numpy.sin(numpy.deg2rad(60.0)) - 2 * numpy.pi * 2 * numpy.sin(numpy.deg2rad(30.0)))
+
+        for ncells in range(1, nio.regrid_cache_max_entries + 3):
+            out_lon = cdms2.createAxis(numpy.arange(0, 360, 360.0 / ncells), id='longitude')
+            out_lon.designateLongitude()
+            nio.regrid_weights(lat, lon, lat, out_lon)
+        self.assertEqual(len(nio._regrid_weights_cache), nio.regrid_cache_max_entries)
+
+
+class testInputDataCache(unittest.TestCase):
+    """Test class for the InputData on-disk cache and profiling"""
+
+    def setUp(self):
+        """Write a test input file"""
+
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.temp_dir, 'cache')
+        self.infile = os.path.join(self.temp_dir, 'test.nc')
+        write_test_file(self.infile)
+
+
+    def tearDown(self):
+        """Remove the test files"""
+
+        shutil.rmtree(self.temp_dir)
+
+
+    def test_cache(self):
+        """Cached data match the processed data [test for success]"""
+
+        kwargs = {'time': ('1979-01-03', '1979-01-15'), 'latitude': (-30, 30), 'runave': 3}
+        answer = nio.InputData(self.infile, 'tas', **kwargs)
+        first = nio.InputData(self.infile, 'tas', cache_dir=self.cache_dir, **kwargs)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        second = nio.InputData(self.infile, 'tas', cache_dir=self.cache_dir, **kwargs)
+
+        for result in [first, second]:
+            numpy.testing.assert_allclose(result.data, answer.data)
+            numpy.testing.assert_array_equal(numpy.ma.getmaskarray(result.data), numpy.ma.getmaskarray(answer.data))
+            self.assertEqual(result.data.getOrder(), answer.data.getOrder())
+            numpy.testing.assert_allclose(result.data.getTime()[:], answer.data.getTime()[:])
+            self.assertEqual(result.data.units, 'K')
+            self.assertEqual(str(result.data.getTime().asComponentTime()[0]), str(answer.data.getTime().asComponentTime()[0]))
+
+
+    def test_invalidation(self):
+        """Different arguments or a modified input file create a new entry [test for success]"""
+
+        nio.InputData(self.infile, 'tas', cache_dir=self.cache_dir, latitude=(-30, 30))
+        nio.InputData(self.infile, 'tas', cache_dir=self.cache_dir, latitude=[-30, 30])
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        
+        nio.InputData(self.infile, 'tas', cache_dir=self.cache_dir, latitude=(-60, 30))
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+        os.utime(self.infile, (0, 0))
+        nio.InputData(self.infile, 'tas', cache_dir=self.cache_dir, latitude=(-30, 30))
+        self.assertEqual(len(os.listdir(self.cache_dir)), 3)
+
+
+    def test_profile(self):
+        """Each processing stage is recorded [test for success]"""
+
+        profile = nio.StageProfile('test')
+        result = nio.InputData(self.infile, 'tas', latitude=(-30, 30), runave=3, profile=profile)
+        self.assertTrue(result.profile is profile)
+        self.assertEqual([stage['stage'] for stage in profile.stages], ['subset', 'runave'])
+        self.assertEqual(profile.stages[-1]['array_shape'], list(result.data.shape))
+        self.assertTrue(profile.stages[0]['wall_time'] > 0)
+
+        outfile = os.path.join(self.temp_dir, 'output.nc')
+        nio.write_netcdf(outfile, 'test', result.global_atts, [result.data], [{'id': 'tas'}], 
+                         [result.data.getAxisList()], profile=profile)
+        self.assertEqual(profile.stages[-1]['stage'], 'write_tas')
+        self.assertEqual(profile.stages[-1]['array_shape'], list(result.data.shape))
+
+        self.assertEqual(nio.InputData(self.infile, 'tas').profile, None)
+
+
+class testAppendNetcdf(unittest.TestCase):
+    """Test class for appending time steps to an output file"""
+
+    def setUp(self):
+        """Write a test input file and an output file with the first 12 days"""
+
+        self.temp_dir = tempfile.mkdtemp()
+        self.infile = os.path.join(self.temp_dir, 'test.nc')
+        self.outfile = os.path.join(self.temp_dir, 'output.nc')
+        write_test_file(self.infile)
+        self.first = nio.InputData(self.infile, 'tas', time=('1979-01-01', '1979-01-12'))
+        self.atts = [{'id': 'tas', 'missing_value': 1.0e20}]
+
+
+    def tearDown(self):
+        """Remove the test files"""
+
+        shutil.rmtree(self.temp_dir)
+
+
+    def test_append(self):
+        """Appending the new time steps reproduces the complete record [test for success]"""
+
+        nio.write_netcdf(self.outfile, 'test', self.first.global_atts, [self.first.data], self.atts, 
+                         [self.first.data.getAxisList()], unlimited_time=True)
+
+        time_period = nio.new_time_period(self.infile, 'tas', self.outfile)
+        self.assertEqual(time_period, ('1979-01-13', '1979-01-20'))
+        new = nio.InputData(self.infile, 'tas', time=time_period)
+        nio.append_netcdf(self.outfile, [new.data], ['tas'], [new.data.getAxisList()])
+        self.assertEqual(nio.new_time_period(self.infile, 'tas', self.outfile), None)
+
+        answer = nio.InputData(self.infile, 'tas')
+        result = nio.InputData(self.outfile, 'tas')
+        numpy.testing.assert_allclose(result.data, answer.data, rtol=1e-6)
+        numpy.testing.assert_array_equal(numpy.ma.getmaskarray(result.data), numpy.ma.getmaskarray(answer.data))
+        numpy.testing.assert_allclose(result.data.getTime()[:], answer.data.getTime()[:])
+
+
+    def test_fixed_time(self):
+        """Files without an unlimited time axis cannot be appended to [test for failure]"""
+
+        nio.write_netcdf(self.outfile, 'test', self.first.global_atts, [self.first.data], self.atts, 
+                         [self.first.data.getAxisList()])
+
+        new = nio.InputData(self.infile, 'tas', time=('1979-01-13', '1979-01-20'))
+        self.assertRaises(AssertionError, nio.append_netcdf, self.outfile, [new.data], ['tas'], [new.data.getAxisList()])
+
+
+class testWriteNetcdf(unittest.TestCase):
+    """Test class for writing an output file from generators,
+    time chunks and with compression"""
+
+    def setUp(self):
+        """Write a test input file"""
+
+        self.temp_dir = tempfile.mkdtemp()
+        self.infile = os.path.join(self.temp_dir, 'test.nc')
+        self.outfile = os.path.join(self.temp_dir, 'output.nc')
+        write_test_file(self.infile)
+        self.answer = nio.InputData(self.infile, 'tas')
+        self.axes = self.answer.data.getAxisList()
+
+
+    def tearDown(self):
+        """Remove the test files"""
+
+        shutil.rmtree(self.temp_dir)
+
+
+    def check_output(self, var_id):
+        """Check that the output variable matches the input data"""
+
+        result = nio.InputData(self.outfile, var_id)
+        numpy.testing.assert_allclose(result.data, self.answer.data, rtol=1e-6)
+        numpy.testing.assert_array_equal(numpy.ma.getmaskarray(result.data), numpy.ma.getmaskarray(self.answer.data))
+        numpy.testing.assert_allclose(result.data.getTime()[:], self.answer.data.getTime()[:])
+
+
+    def test_time_chunks(self):
+        """A generator of variables, including variables given as
+        time chunks, is written in full [test for success]"""
+
+        def outdata():
+            yield nio.InputDataStream(self.infile, 'tas', chunk_size=6)
+            yield (self.answer.data[i:i + 7] for i in range(0, 20, 7))
+            yield self.answer.data
+
+        atts = [{'id': var_id, 'missing_value': 1.0e20} for var_id in ['tas_stream', 'tas_chunks', 'tas']]
+        nio.write_netcdf(self.outfile, 'test', self.answer.global_atts, outdata(), atts, [self.axes] * 3)
+
+        for var_id in ['tas_stream', 'tas_chunks', 'tas']:
+            self.check_output(var_id)
+
+
+    def test_compression(self):
+        """Compressed output is NetCDF4 with the same data, 
+        and the compression flags are reset [test for success]"""
+
+        nio.write_netcdf(self.outfile, 'test', self.answer.global_atts, [self.answer.data], 
+                         [{'id': 'tas', 'missing_value': 1.0e20}], [self.axes], compression=4)
+
+        self.assertEqual(open(self.outfile, 'rb').read(4), '\x89HDF')
+        self.assertTrue('zlib compression level 4' in cdms2.open(self.outfile).history)
+        self.check_output('tas')
+        self.assertEqual(cdms2.getNetcdfDeflateFlag(), 0)
+
+
+    def test_length_mismatch(self):
+        """More variables than attributes [test for failure]"""
+
+        outdata = (self.answer.data for i in range(2))
+        self.assertRaises(AssertionError, nio.write_netcdf, self.outfile, 'test', self.answer.global_atts, 
+                          outdata, [{'id': 'tas'}], [self.axes], compression=4)
+        self.assertEqual(cdms2.getNetcdfDeflateFlag(), 0)
+
+        self.assertRaises(AssertionError, nio.write_netcdf, self.outfile, 'test', self.answer.global_atts, 
+                          [self.answer.data], [{'id': 'tas'}], [self.axes, self.axes])
+
+
+class testInputDataStream(unittest.TestCase):
+    """Test class for reading the input data in time chunks"""
+
+    def setUp(self):
+        """Write a test input file"""
+
+        self.temp_dir = tempfile.mkdtemp()
+        self.infile = os.path.join(self.temp_dir, 'test.nc')
+        self.values = write_test_file(self.infile)
+
+
+    def tearDown(self):
+        """Remove the test files"""
+
+        shutil.rmtree(self.temp_dir)
+
+
+    def test_chunks(self):
+        """The chunks are at most chunk_size long and together
+        match the InputData result [test for success]"""
+
+        kwargs = {'time': ('1979-01-03', '1979-01-19'), 'latitude': (-30, 30)}
+        stream = nio.InputDataStream(self.infile, 'tas', chunk_size=6, **kwargs)
+        chunks = list(stream)
+        self.assertEqual([chunk.shape[0] for chunk in chunks], [6, 6, 5])
+        self.assertEqual(len(stream), 3)
+
+        answer = nio.InputData(self.infile, 'tas', **kwargs)
+        result = numpy.ma.concatenate(chunks, axis=0)
+        numpy.testing.assert_allclose(result, answer.data)
+        numpy.testing.assert_array_equal(numpy.ma.getmaskarray(result), numpy.ma.getmaskarray(answer.data))
+        numpy.testing.assert_allclose(numpy.concatenate([chunk.getTime()[:] for chunk in chunks]), answer.data.getTime()[:])
+
+
+    def test_normalise(self):
+        """Normalisation is relative to the entire record [test for success]"""
+
+        stream = nio.InputDataStream(self.infile, 'tas', chunk_size=8, normalise=True)
+        result = numpy.ma.concatenate(list(stream), axis=0)
+
+        answer = (self.values - self.values.mean(axis=0)) / self.values.std(axis=0)
+        numpy.testing.assert_allclose(result, answer, rtol=1e-5)
+
+
+    def test_time_indexes(self):
+        """Time indexes for date range and season selections [test for success]"""
+
+        time = cdms2.createAxis(numpy.arange(0, 400.0), id='time')
+        time.designateTime()
+        time.units = 'days since 1979-01-01'
+        time.setCalendar(cdtime.MixedCalendar)
+
+        numpy.testing.assert_array_equal(nio._time_indexes(time), numpy.arange(400))
+        numpy.testing.assert_array_equal(nio._time_indexes(time, ('1979-01-03', '1979-01-05')), [2, 3, 4])
+        numpy.testing.assert_array_equal(nio._time_indexes(time, ('1979-01-01', '1979-12-31', 'DJF')), 
+                                         numpy.r_[0:59, 334:365])
+        numpy.testing.assert_array_equal(nio._time_indexes(time, ('none', 'none', 'JUL')), numpy.r_[181:212])
+
+
+class testMappedData(unittest.TestCase):
+    """Test class for memory mapping a NetCDF3 file"""
+
+    def setUp(self):
+        """Write a test input file"""
+
+        self.temp_dir = tempfile.mkdtemp()
+        self.infile = os.path.join(self.temp_dir, 'test.nc')
+
+        numpy.random.seed(0)
+        self.values = numpy.random.rand(400, 5, 8).astype(numpy.float32)
+        self.values[3, 2, 1] = 1.0e20
+
+        fout = netcdf.netcdf_file(self.infile, 'w')
+        fout.history = 'test file'
+        fout.createDimension('time', None)
+        fout.createDimension('latitude', 5)
+        fout.createDimension('longitude', 8)
+        time = fout.createVariable('time', 'f8', ('time',))
+        time.units = 'days since 1979-01-01'
+        time.calendar = 'standard'
+        time.axis = 'T'
+        time[:] = numpy.arange(0, 400.0)
+        lat = fout.createVariable('latitude', 'f4', ('latitude',))
+        lat.units = 'degrees_north'
+        lat.axis = 'Y'
+        lat[:] = numpy.arange(-60, 61, 30.0)
+        lon = fout.createVariable('longitude', 'f4', ('longitude',))
+        lon.units = 'degrees_east'
+        lon.axis = 'X'
+        lon[:] = numpy.arange(0, 360, 45.0)
+        var = fout.createVariable('tas', 'f4', ('time', 'latitude', 'longitude'))
+        var.units = 'K'
+        var.long_name = 'surface temperature'
+        var.missing_value = numpy.float32(1.0e20)
+        var[:] = self.values
+        fout.close()
+
+
+    def tearDown(self):
+        """Remove the test files"""
+
+        shutil.rmtree(self.temp_dir)
+
+
+    def test_match(self):
+        """Mapped data match InputData [test for success]"""
+
+        kwargs = {'time': ('1979-01-03', '1979-01-15'), 'latitude': (-30, 30)}
+        result = nio.MappedData(self.infile, 'tas', **kwargs)
+        answer = nio.InputData(self.infile, 'tas', **kwargs)
+        
+        numpy.testing.assert_allclose(result.masked(), answer.data)
+        numpy.testing.assert_array_equal(numpy.ma.getmaskarray(result.masked()), numpy.ma.getmaskarray(answer.data))
+        self.assertEqual(result.getOrder(), answer.data.getOrder())
+        numpy.testing.assert_allclose(result.getTime()[:], answer.data.getTime()[:])
+        numpy.testing.assert_allclose(result.getLatitude()[:], answer.data.getLatitude()[:])
+
+
+    def test_view(self):
+        """Contiguous selections are read-only views, 
+        other selections are copies [test for success]"""
+
+        result = nio.MappedData(self.infile, 'tas', region='aus')
+        self.assertFalse(result.data.flags.writeable)
+        self.assertFalse(result.data.flags.owndata)
+        numpy.testing.assert_array_equal(result.data, self.values[:, 1:2, 3:4])
+
+        result = nio.MappedData(self.infile, 'tas', time=('1979-01-01', '1979-12-31', 'DJF'))
+        self.assertFalse(result.data.flags.writeable)
+        numpy.testing.assert_array_equal(result.data, self.values[numpy.r_[0:59, 334:365], :, :])
+        numpy.testing.assert_array_equal(result.getTime()[:], numpy.r_[0:59, 334:365])
+
+
+@unittest.skipIf(h5py is None, 'h5py is required to memory map NetCDF4 files')
+class testMappedNetcdf4(unittest.TestCase):
+    """Test class for memory mapping a contiguous variable in a NetCDF4 file"""
+
+    def setUp(self):
+        """Write a test input file (an HDF5 file with netCDF4 dimension scales)"""
+
+        self.temp_dir = tempfile.mkdtemp()
+        self.infile = os.path.join(self.temp_dir, 'test.nc')
+
+        numpy.random.seed(0)
+        self.values = numpy.random.rand(400, 5, 8).astype(numpy.float32)
+        self.values[3, 2, 1] = 1.0e20
+
+        fout = h5py.File(self.infile, 'w')
+        fout.attrs['history'] = 'test file'
+        coords = [('time', numpy.arange(0, 400.0), {'units': 'days since 1979-01-01', 'calendar': 'standard'}),
+                  ('latitude', numpy.arange(-60, 61, 30.0), {'units': 'degrees_north'}),
+                  ('longitude', numpy.arange(0, 360, 45.0), {'units': 'degrees_east'})]
+        var = fout.create_dataset('tas', data=self.values)
+        chunked_var = fout.create_dataset('tas_chunked', data=self.values, chunks=(100, 5, 8))
+        for dim, (name, values, atts) in enumerate(coords):
+            coord = fout.create_dataset(name, data=values)
+            for key, value in atts.iteritems():
+                coord.attrs[key] = value
+            coord.dims.create_scale(coord, name)
+            var.dims[dim].attach_scale(coord)
+            chunked_var.dims[dim].attach_scale(coord)
+        var.attrs['units'] = 'K'
+        var.attrs['missing_value'] = numpy.float32(1.0e20)
+        fout.close()
+
+
+    def tearDown(self):
+        """Remove the test files"""
+
+        shutil.rmtree(self.temp_dir)
+
+
+    def test_match(self):
+        """Mapped data match the file contents [test for success]"""
+
+        result = nio.MappedData(self.infile, 'tas', time=('1979-01-03', '1979-01-15'), latitude=(-30, 30))
+        self.assertFalse(result.data.flags.writeable)
+        numpy.testing.assert_array_equal(result.data, self.values[2:15, 1:4, :])
+        self.assertEqual(result.getOrder(), 'tyx')
+        numpy.testing.assert_allclose(result.getTime()[:], numpy.arange(2, 15.0))
+        self.assertEqual(str(result.getTime().asComponentTime()[0]), '1979-1-3 0:0:0.0')
+        numpy.testing.assert_allclose(result.getLatitude()[:], [-30, 0, 30])
+        self.assertEqual(result.attributes['units'], 'K')
+        self.assertTrue(result.masked().mask[1, 1, 1])
+
+
+    def test_chunked(self):
+        """Chunked variables cannot be mapped [test for failure]"""
+
+        self.assertRaises(ValueError, nio.MappedData, self.infile, 'tas_chunked')
+
+if __name__ == '__main__':
+    unittest.main()
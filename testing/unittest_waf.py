@@ -0,0 +1,116 @@
+"""
+A unit testing module for the wave activity flux calculation.
+
+Functions/methods tested:
+  calc_waf.calc_waf
+  calc_waf.derivative
+
+The correctness of the flux is checked against an analytic solution
+(test_analytic). The regression test compares against data/waf_reference.npz, 
+which is created by create_waf_reference.py from its synthetic input fields.
+
+"""
+
+# Import general Python modules
+
+import sys, os
+import unittest
+import pdb
+
+import numpy
+
+# Import my modules #
+
+cwd = os.getcwd()
+repo_dir = '/'
+for directory in cwd.split('/')[1:]:
+    repo_dir = os.path.join(repo_dir, directory)
+    if directory == 'phd':
+        break
+
+for subdir in ['data_processing', 'testing']:
+    sys.path.append(os.path.join(repo_dir, subdir))
+
+try:
+    import calc_waf
+    import create_waf_reference
+except ImportError:
+    raise ImportError('Must run this script from anywhere within the phd git repo')
+
+
+##########################
+## unittest test clases ##
+##########################
+
+class testWaf(unittest.TestCase):
+    """Test class for the Takaya & Nakamura (2001) wave activity flux"""
+
+    def setUp(self):
+        """Define the synthetic input fields"""
+
+        self.zg_anom, self.u_clim, self.v_clim, self.lats, self.lons = create_waf_reference.synthetic_fields()
+        self.lon_mesh, self.lat_mesh = numpy.meshgrid(numpy.deg2rad(self.lons), numpy.deg2rad(self.lats))
+
+        self.reference = numpy.load(os.path.join(repo_dir, 'testing', 'data', 'waf_reference.npz'))
+
+
+    def test_reference(self):
+        """Compare with the stored reference output [test for success]"""
+
+        wafx, wafy = calc_waf.calc_waf(self.zg_anom, self.u_clim, self.v_clim, self.lats, self.lons, 250.0)
+        numpy.testing.assert_allclose(wafx, self.reference['wafx'], rtol=1e-07, atol=1e-10)
+        numpy.testing.assert_allclose(wafy, self.reference['wafy'], rtol=1e-07, atol=1e-10)
+
+
+    def test_levels(self):
+        """The flux scales with pressure across levels [test for success]"""
+
+        zg_anom = numpy.array([self.zg_anom, self.zg_anom]).transpose(1, 0, 2, 3)
+        pressure = numpy.array([250.0, 500.0])[:, numpy.newaxis, numpy.newaxis]
+        wafx, wafy = calc_waf.calc_waf(zg_anom, self.u_clim, self.v_clim, self.lats, self.lons, pressure)
+        numpy.testing.assert_allclose(wafx[:, 0, :, :], self.reference['wafx'], rtol=1e-07, atol=1e-10)
+        numpy.testing.assert_allclose(wafx[:, 1, :, :], 2 * self.reference['wafx'], rtol=1e-07, atol=1e-10)
+
+
+    def test_analytic(self):
+        """For a single zonal wave streamfunction A cos(k lon) in uniform 
+        westerly flow U, Wx = (p/1000) A^2 k^2 / (2 a^2 cos(lat)) and 
+        Wy = 0 [test for success]"""
+
+        lons = numpy.arange(0, 360, 1.0)
+        lon_mesh, lat_mesh = numpy.meshgrid(numpy.deg2rad(lons), numpy.deg2rad(self.lats))
+        amp, k, pressure = 1.0e7, 4, 250.0
+
+        f = 2 * calc_waf.omega * numpy.sin(lat_mesh)
+        zg_anom = f * amp * numpy.cos(k * lon_mesh) / calc_waf.g
+        u_clim = numpy.ones(zg_anom.shape) * 15.0
+        v_clim = numpy.zeros(zg_anom.shape)
+        wafx, wafy = calc_waf.calc_waf(zg_anom, u_clim, v_clim, self.lats, lons, pressure)
+
+        answer = (pressure / 1000.0) * amp**2 * k**2 / (2 * calc_waf.a**2 * numpy.cos(lat_mesh))
+        numpy.testing.assert_allclose(wafx, answer, rtol=2e-03)    # centred differences on a 1 degree grid
+        numpy.testing.assert_allclose(wafy, 0.0, atol=1e-10)
+
+
+    def test_phase_independence(self):
+        """For a single zonal wave in uniform westerly flow, the
+        zonal flux is independent of longitude [test for sanity]"""
+
+        zg_anom = 100 * numpy.cos(4 * self.lon_mesh) * numpy.cos(self.lat_mesh)
+        u_clim = numpy.ones(zg_anom.shape) * 10.0
+        v_clim = numpy.zeros(zg_anom.shape)
+        wafx, wafy = calc_waf.calc_waf(zg_anom, u_clim, v_clim, self.lats, self.lons, 250.0)
+        answer = numpy.tile(wafx[:, 0:1], (1, len(self.lons)))
+        numpy.testing.assert_allclose(wafx, answer, rtol=1e-07, atol=1e-10)
+
+
+    def test_cyclic_derivative(self):
+        """Derivative of sin(lon) on a global grid is cos(lon) [test for success]"""
+
+        lon_rad = numpy.deg2rad(numpy.arange(0, 360, 1.0))
+        result = calc_waf.derivative(numpy.sin(lon_rad), lon_rad, 0, cyclic=True)
+        numpy.testing.assert_allclose(result, numpy.cos(lon_rad), rtol=0, atol=1e-04)
+
+
+if __name__ == '__main__':
+    unittest.main()
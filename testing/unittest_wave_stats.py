@@ -0,0 +1,137 @@
+"""
+A unit testing module for the wave envelope statistics.
+
+Functions/methods tested:
+  calc_wave_stats.amp_stats_all
+  calc_wave_stats.extent_stats_all
+  parse_wave_stats.event_duration
+
+"""
+
+# Import general Python modules
+
+import sys, os
+import unittest
+import pdb
+
+import numpy
+from itertools import groupby
+
+# Import my modules #
+
+cwd = os.getcwd()
+repo_dir = '/'
+for directory in cwd.split('/')[1:]:
+    repo_dir = os.path.join(repo_dir, directory)
+    if directory == 'phd':
+        break
+
+module_dir = os.path.join(repo_dir, 'data_processing')
+sys.path.append(module_dir)
+
+try:
+    import calc_wave_stats
+    import parse_wave_stats
+except ImportError:
+    raise ImportError('Must run this script from anywhere within the phd git repo')
+
+
+def groupby_duration(values, threshold):
+    """The original (itertools.groupby) event duration calculation"""
+
+    event_list = [x > threshold for x in values]
+    grouped_events = [(k, sum(1 for i in g)) for k,g in groupby(event_list)]
+
+    duration = []
+    for event in grouped_events:
+        if event[0]:
+            duration.extend([event[1]] * event[1])
+        else:
+            duration.extend([0] * event[1])
+
+    return event_list, duration
+
+
+##########################
+## unittest test clases ##
+##########################
+
+class testExtent(unittest.TestCase):
+    """Test class for the vectorised Hovmoller statistics"""
+
+    def setUp(self):
+        """Define the test data"""
+
+        numpy.random.seed(0)
+        self.lons = numpy.arange(0, 360, 2.5)
+        self.lons_spacing = numpy.array([2.5])
+        
+        data = numpy.random.rand(200, len(self.lons))
+        kernel = numpy.ones(15) / 15.0
+        for i in range(0, 100):
+            wrapped = numpy.append(data[i, -7:], numpy.append(data[i, :], data[i, 0:7]))
+            data[i, :] = numpy.convolve(wrapped, kernel, mode='valid')   # smoothing creates longer runs
+        
+        self.threshold = numpy.percentile(data, 75)
+        data[0, :] = 0.0                          # no exceedance
+        data[1, :] = 1.0                          # exceedance everywhere
+        data[2, :] = 0.0; data[2, 5] = 1.0        # single grid cell
+        data[3, :] = 0.0; data[3, [-1, 0, 1]] = 1.0  # straddles the Greenwich meridian
+        self.data = data
+
+
+    def test_extent(self):
+        """Vectorised extent statistics match extent_stats [test for success]"""
+
+        result = calc_wave_stats.extent_stats_all(self.data, self.lons, self.threshold, self.lons_spacing)
+        
+        data_double = numpy.append(self.data, self.data, axis=1)
+        lons_double = numpy.append(self.lons, self.lons)
+        answer = [calc_wave_stats.extent_stats(data_double[i, :], lons_double, self.threshold, self.lons_spacing) for i in range(0, self.data.shape[0])]
+        
+        numpy.testing.assert_allclose(numpy.array(result).T, numpy.array(answer), rtol=0, atol=1e-10)
+        self.assertEqual((result[0][3], result[1][3], result[2][3]), (357.5, 2.5, 7.5))
+
+
+    def test_amp(self):
+        """Vectorised amplitude statistics match amp_stats [test for success]"""
+
+        result = calc_wave_stats.amp_stats_all(self.data)
+        answer = [calc_wave_stats.amp_stats(self.data[i, :]) for i in range(0, self.data.shape[0])]
+        numpy.testing.assert_allclose(numpy.array(result).T, numpy.array(answer), rtol=1e-10)
+
+
+class testDuration(unittest.TestCase):
+    """Test class for the event duration calculation"""
+
+    def setUp(self):
+        """Define the test data"""
+
+        numpy.random.seed(0)
+        self.values = numpy.convolve(numpy.random.rand(500), numpy.ones(5) / 5.0, mode='valid')
+        self.threshold = numpy.percentile(self.values, 70)
+
+
+    def test_groupby_match(self):
+        """Run-length durations match the groupby implementation [test for success]"""
+
+        events, duration = parse_wave_stats.event_duration(self.values, self.threshold)
+        answer_events, answer_duration = groupby_duration(self.values, self.threshold)
+
+        numpy.testing.assert_array_equal(events, answer_events)
+        numpy.testing.assert_array_equal(duration, answer_duration)
+
+
+    def test_edges(self):
+        """Events at the start and end of the record [test for success]"""
+
+        values = numpy.array([5, 5, 0, 5, 0, 0, 5, 5, 5])
+        events, duration = parse_wave_stats.event_duration(values, 1)
+        numpy.testing.assert_array_equal(duration, [2, 2, 0, 1, 0, 0, 3, 3, 3])
+
+        events, duration = parse_wave_stats.event_duration(numpy.zeros(4), 1)
+        numpy.testing.assert_array_equal(duration, [0, 0, 0, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
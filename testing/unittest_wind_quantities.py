@@ -0,0 +1,113 @@
+"""
+A unit testing module for the wind quantity calculations.
+
+Functions/methods tested:
+  calc_wind_quantities.calc_quantities
+  calc_wind_quantities.has_time_axis
+
+"""
+
+# Import general Python modules
+
+import sys, os
+import unittest
+import shutil, tempfile
+import pdb
+
+import numpy
+import cdms2
+from windspharm.cdms import VectorWind
+
+# Import my modules #
+
+cwd = os.getcwd()
+repo_dir = '/'
+for directory in cwd.split('/')[1:]:
+    repo_dir = os.path.join(repo_dir, directory)
+    if directory == 'phd':
+        break
+
+module_dir = os.path.join(repo_dir, 'data_processing')
+sys.path.append(module_dir)
+
+try:
+    import calc_wind_quantities as cwq
+except ImportError:
+    raise ImportError('Must run this script from anywhere within the phd git repo')
+
+
+##########################
+## unittest test clases ##
+##########################
+
+class testQuantities(unittest.TestCase):
+    """Test class for calculating several wind quantities at once"""
+
+    def setUp(self):
+        """Define the test data (two time steps of a smooth global wind field)"""
+
+        time = cdms2.createAxis(numpy.arange(0, 2.0), id='time')
+        time.designateTime()
+        time.units = 'days since 1979-01-01'
+        lat = cdms2.createAxis(numpy.arange(90, -90.1, -2.5), id='latitude')
+        lat.designateLatitude()
+        lat.units = 'degrees_north'
+        lon = cdms2.createAxis(numpy.arange(0, 360, 2.5), id='longitude')
+        lon.designateLongitude()
+        lon.units = 'degrees_east'
+        self.axes = [time, lat, lon]
+
+        lon_mesh, lat_mesh = numpy.meshgrid(numpy.deg2rad(lon[:]), numpy.deg2rad(lat[:]))
+        uwnd = [20 * numpy.cos(lat_mesh) + 5 * numpy.sin(3 * lon_mesh + t) * numpy.cos(lat_mesh)**2 for t in [0.0, 1.0]]
+        vwnd = [4 * numpy.cos(2 * lon_mesh - t) * numpy.cos(lat_mesh) * numpy.sin(lat_mesh) for t in [0.0, 1.0]]
+
+        self.uwnd = cdms2.createVariable(numpy.array(uwnd), axes=self.axes, id='ua')
+        self.vwnd = cdms2.createVariable(numpy.array(vwnd), axes=self.axes, id='va')
+
+        self.temp_dir = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        """Remove the test files"""
+
+        shutil.rmtree(self.temp_dir)
+
+
+    def test_single_analysis(self):
+        """Quantities calculated together match those calculated
+        one at a time [test for success]"""
+
+        quantities = ['streamfunction', 'irrotationalcomponent', 'rossbywavesource', 'divergence']
+        result, result_atts = cwq.calc_quantities(self.uwnd, self.vwnd, quantities)
+
+        answer = []
+        for quantity in quantities:
+            data_out = cwq.calc_quantity(VectorWind(self.uwnd, self.vwnd), quantity)
+            if quantity == 'irrotationalcomponent':
+                answer.extend([data_out['u'], data_out['v']])
+            elif quantity == 'rossbywavesource':
+                answer.extend([data_out['rws'], data_out['rws1'], data_out['rws2']])
+            else:
+                answer.append(data_out)
+
+        self.assertEqual([atts['id'] for atts in result_atts], ['sf', 'uchi', 'vchi', 'rws', 'rws1', 'rws2', 'div'])
+        self.assertEqual(len(result), len(answer))
+        for result_data, answer_data in zip(result, answer):
+            numpy.testing.assert_allclose(numpy.array(result_data), numpy.array(answer_data))
+
+
+    def test_time_axis(self):
+        """Input data with and without a time axis [test for success]"""
+
+        infile = os.path.join(self.temp_dir, 'ua.nc')
+        fout = cdms2.open(infile, 'w')
+        fout.write(self.uwnd)
+        fout.write(cdms2.createVariable(numpy.array(self.uwnd[0]), axes=self.axes[1:], id='ua_clim'))
+        fout.close()
+
+        self.assertTrue(cwq.has_time_axis(infile, 'ua'))
+        self.assertFalse(cwq.has_time_axis(infile, 'ua_clim'))
+
+
+if __name__ == '__main__':
+    unittest.main()
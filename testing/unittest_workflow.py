@@ -0,0 +1,98 @@
+"""
+A unit testing module for the workflow runner.
+
+Functions/methods tested:
+  workflow.Workflow.dependencies
+  workflow.read_provenance
+  workflow.step_status
+
+"""
+
+# Import general Python modules
+
+import sys, os
+import unittest
+import shutil, tempfile
+import pdb
+
+# Import my modules #
+
+cwd = os.getcwd()
+repo_dir = '/'
+for directory in cwd.split('/')[1:]:
+    repo_dir = os.path.join(repo_dir, directory)
+    if directory == 'phd':
+        break
+
+module_dir = os.path.join(repo_dir, 'modules')
+sys.path.append(module_dir)
+
+try:
+    import workflow
+except ImportError:
+    raise ImportError('Must run this script from anywhere within the phd git repo')
+
+
+##########################
+## unittest test clases ##
+##########################
+
+class testWorkflow(unittest.TestCase):
+    """Test class for the workflow runner"""
+
+    def setUp(self):
+        """Define a simple workflow: a -> b -> c, a -> d"""
+
+        self.temp_dir = tempfile.mkdtemp()
+        path = lambda name: os.path.join(self.temp_dir, name)
+
+        self.workflow = workflow.Workflow()
+        self.step_b = self.workflow.add(workflow.Step('calc_b.py', ['--option', 1], [path('a.txt')], [path('b.txt')]))
+        self.step_c = self.workflow.add(workflow.Step('calc_c.py', [], [path('b.txt')], [path('c.txt')]))
+        self.step_d = self.workflow.add(workflow.Step('calc_d.py', [], [path('a.txt')], [path('d.txt')]))
+
+        for name in ['a.txt', 'b.txt']:
+            open(path(name), 'w').close()
+        os.utime(path('a.txt'), (0, 0))
+        with open(path('b.met'), 'w') as metfile:
+            metfile.write('Tue Oct 14 10:01:22 2014: /usr/bin/python /home/phd/calc_b.py --option 2 (Git hash: 1a2b3c4)\n')
+
+
+    def tearDown(self):
+        """Remove the test files"""
+
+        shutil.rmtree(self.temp_dir)
+
+
+    def test_dependencies(self):
+        """Steps depend on the steps that produce their inputs [test for success]"""
+
+        self.assertEqual(self.workflow.dependencies(), [set(), set([0]), set()])
+
+
+    def test_provenance(self):
+        """The provenance is read from the .met file (including for
+        file names with extra dots) [test for success]"""
+
+        result = workflow.read_provenance(self.step_b.outputs[0])
+        self.assertEqual(result, {'script': '/home/phd/calc_b.py', 'args': '--option 2', 'git_hash': '1a2b3c4'})
+
+        dotted_file = os.path.join(self.temp_dir, 'dates-threshold7.5_b.txt')
+        shutil.copy(os.path.join(self.temp_dir, 'b.met'), os.path.join(self.temp_dir, 'dates-threshold7.5_b.met'))
+        self.assertEqual(workflow.read_provenance(dotted_file), result)
+
+
+    def test_status(self):
+        """Missing outputs, newer inputs and new arguments mean a step is run [test for success]"""
+
+        self.assertEqual(workflow.step_status(self.step_d), (True, 'missing output %s' %(self.step_d.outputs[0])))
+        self.assertEqual(workflow.step_status(self.step_b), (True, 'arguments have changed'))
+        self.assertEqual(workflow.step_status(self.step_b, upstream_rerun=True)[0], True)
+
+        os.utime(self.step_b.outputs[0], (0, 0))
+        os.utime(self.step_b.inputs[0], None)
+        self.assertEqual(workflow.step_status(self.step_b), (True, 'inputs have changed'))
+
+
+if __name__ == '__main__':
+    unittest.main()